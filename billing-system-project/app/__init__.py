@@ -35,6 +35,14 @@ from flask import Flask
 from werkzeug.middleware.proxy_fix import ProxyFix # 👈 1. Import ProxyFix
 from .config import Config
 from .extensions import db, bcrypt, login_manager
+from .signatures import signature_store
+from .audit import audit_logger
+from .pool_metrics import pool_metrics
+from .request_metrics import request_metrics
+from .compression import compressor
+from .replica import replica_router
+from .passwords import password_hasher
+from .json_provider import FastJSONProvider
 from .routes import main_bp
 from .auth_routes import auth_bp
 from .api_routes import api_bp
@@ -43,15 +51,25 @@ def create_app(config_class=Config):
     """Application Factory Function"""
     app = Flask(__name__)
     app.config.from_object(config_class)
+    app.json = FastJSONProvider(app)
 
     # 👈 2. Apply the middleware to the app
     # This tells Flask to trust the headers sent by our Nginx proxy.
     app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
 
     # Initialize extensions
+    # pool_metrics ต้องตั้ง poolclass ก่อนที่ db จะสร้าง engine
+    pool_metrics.init_app(app)
     db.init_app(app)
     bcrypt.init_app(app)
+    password_hasher.init_app(app)
     login_manager.init_app(app)
+    signature_store.init_app(app)
+    audit_logger.init_app(app)
+    request_metrics.init_app(app)
+    replica_router.init_app(app)
+    # ลงทะเบียนหลัง request_metrics เพื่อให้บีบอัดก่อน (after_request ทำงานย้อนลำดับ) และวัดขนาดที่ส่งจริง
+    compressor.init_app(app)
 
     # Register Blueprints
     app.register_blueprint(main_bp)
@@ -61,6 +79,12 @@ def create_app(config_class=Config):
     with app.app_context():
         # You can uncomment this after the first successful run
         # db.create_all()
-        pass
+        # db.engines มี engine ของ read replica ด้วยถ้าตั้ง SQLALCHEMY_BINDS['replica'] ไว้
+        for engine in db.engines.values():
+            if app.config.get('DB_POOL_METRICS', True):
+                pool_metrics.attach(engine)
+            if app.config.get('METRICS_ENABLED', True):
+                request_metrics.attach(engine)
+        replica_router.attach(db.engines.get('replica'))
 
     return app
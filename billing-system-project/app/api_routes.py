@@ -1,16 +1,35 @@
 # /app/api_routes.py
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, Response, jsonify, request, current_app, stream_with_context
 from flask_login import login_required, current_user
 from sqlalchemy.exc import IntegrityError
 # from datetime import datetime
-from datetime import datetime, timedelta
-import jwt 
+from datetime import datetime, date
 
 # --- START: UPDATED CODE ---
 # สมมติว่า bcrypt ถูกกำหนดไว้ใน extensions และ import เข้ามา
 from .extensions import db, bcrypt 
-from .models import db, Item, Staff, User, Transaction, TransactionItem, Role, LogEntry,TransactionVersion
+from .models import db, Item, Staff, User, Transaction, TransactionItem, Role, LogEntry,TransactionVersion, LOCAL_TZ
+from .models import (TRANSACTION_TO_DICT_LOADERS, TRANSACTION_CRUD_LOADERS, USER_CRUD_LOADERS,
+                     LOG_ENTRY_CRUD_LOADERS, TRANSACTION_VERSION_LOADERS)
+from .catalog import catalog_cache, CATALOG_TABLES
+from .audit import audit_logger
+from .user_cache import user_cache
+from .pool_metrics import pool_metrics
+from .request_metrics import request_metrics
+from .pricing import check_bill, describe_mismatches, price_check_mode
+from .revenue import apply_revenue_change, revenue_state, revenue_report, utc_bounds, REPORT_KINDS
+from .exporter import (EXPORT_FORMATS, TRANSACTION_HEADERS, ITEM_HEADERS, LOG_HEADERS, export_chunks,
+                       log_export_query, stream_rows, transaction_export_query, transaction_row)
+from .snapshots import encode_snapshot, latest_snapshot, resolve_snapshots, reconstruct_version
+from .pagination import PaginationError, apply_filters, parse_sort, keyset_page, encode_cursor, decode_cursor, coerce_value
+from .projection import Projection, parse_fields
+from .replica import read_replica
+from .log_archive import log_archive, parse_month
+from .auth_tokens import TokenError, decode_token, issue_tokens, refresh_access_token, token_revocations
+from .passwords import PasswordHasherBusy, password_hasher
+from .signatures import SignatureStoreBusy
 import json
+import hmac
 from functools import wraps
 # --- END: UPDATED CODE ---
 
@@ -18,12 +37,43 @@ api_bp = Blueprint('api', __name__, url_prefix='/api')
 
 # --- START: UPDATED CODE ---
 # เพิ่ม 'users' กลับเข้ามาใน MODEL_MAP
+# 'sortable' = column ที่อนุญาตให้ใช้กับ ?sort= (ต้องเป็น column ที่ไม่เป็น NULL เพื่อให้ keyset ถูกต้อง)
+# 'default_sort' = ลำดับเริ่มต้น ('-' นำหน้า = มากไปน้อย)
+# 'filters' = column ที่กรองได้ผ่าน query string และชนิดของ filter (ดู app/pagination.py)
+# 'loaders' = eager-load options ที่ to_dict_for_crud() ต้องใช้ (ป้องกัน N+1)
+# ?fields=a,b,c ใช้ชื่อ field เดียวกับ to_dict_for_crud() (ประกาศไว้ใน app/projection.py)
 MODEL_MAP = {
-    'items': {'model': Item, 'pk': 'item_code'},
-    'staff': {'model': Staff, 'pk': 'staff_id'},
-    'users': {'model': User, 'pk': 'user_id'},
-    'transactions': {'model': Transaction, 'pk': 'transaction_id'},
-    'logs': {'model': LogEntry, 'pk': 'log_id'}
+    'items': {
+        'model': Item, 'pk': 'item_code',
+        'sortable': ['item_code', 'name_th'], 'default_sort': 'item_code',
+        'filters': {'item_code': 'prefix', 'name_th': 'prefix'}
+    },
+    'staff': {
+        'model': Staff, 'pk': 'staff_id',
+        'sortable': ['staff_id', 'name_th'], 'default_sort': 'staff_id',
+        'filters': {'staff_role': 'eq', 'name_th': 'prefix'}
+    },
+    'users': {
+        'model': User, 'pk': 'user_id',
+        'loaders': USER_CRUD_LOADERS,
+        'sortable': ['user_id', 'username'], 'default_sort': 'user_id',
+        'filters': {'role_id': 'eq', 'is_active': 'eq', 'username': 'prefix'}
+    },
+    'transactions': {
+        'model': Transaction, 'pk': 'transaction_id',
+        'loaders': TRANSACTION_CRUD_LOADERS,
+        'sortable': ['transaction_date', 'transaction_id'], 'default_sort': '-transaction_date',
+        'filters': {
+            'hn': 'eq', 'patient_type': 'eq', 'payment_method': 'eq', 'review_status': 'eq',
+            'doctor_id': 'eq', 'consultant_id': 'eq', 'transaction_date': 'range'
+        }
+    },
+    'logs': {
+        'model': LogEntry, 'pk': 'log_id',
+        'loaders': LOG_ENTRY_CRUD_LOADERS,
+        'sortable': ['log_id', 'timestamp'], 'default_sort': '-log_id',
+        'filters': {'user_id': 'eq', 'timestamp': 'range', 'action': 'contains'}
+    }
 }
 # --- END: UPDATED CODE ---
 
@@ -32,6 +82,7 @@ MODEL_MAP = {
 def superadmin_login():
     """
     Endpoint สำหรับ File App เพื่อยืนยันตัวตน Superadmin และขอ JWT
+    คืน access token ('token') และ refresh token สำหรับต่ออายุผ่าน /api/auth/refresh โดยไม่ต้องตรวจรหัสผ่านซ้ำ
     """
     data = request.get_json()
     if not data or not data.get('username') or not data.get('password'):
@@ -40,9 +91,12 @@ def superadmin_login():
     # 1. ค้นหาผู้ใช้
     user = User.query.filter_by(username=data['username']).first()
 
-    # 2. ตรวจสอบรหัสผ่าน
-    if not user or not bcrypt.check_password_hash(user.password_hash, data['password']):
-        return jsonify({'message': 'Invalid credentials'}), 401
+    # 2. ตรวจสอบรหัสผ่าน (bcrypt ทำใน thread pool ของ password_hasher)
+    try:
+        if not user or not password_hasher.check(user.password_hash, data['password']):
+            return jsonify({'message': 'Invalid credentials'}), 401
+    except PasswordHasherBusy as e:
+        return jsonify({'message': str(e)}), 503, {'Retry-After': '1'}
 
     # 3. ตรวจสอบสถานะการใช้งาน
     if not user.is_active:
@@ -52,25 +106,70 @@ def superadmin_login():
     if not user.role or user.role.role_name != 'super admin':
         return jsonify({'message': 'Permission denied. Superadmin access required.'}), 403
 
-    # 5. ถ้าทุกอย่างถูกต้อง สร้าง JWT
+    # 5. ถ้าทุกอย่างถูกต้อง สร้าง JWT (ใช้ Secret Key เดียวกันกับ Flask App, ดู app/auth_tokens.py)
     try:
-        payload = {
-            'exp': datetime.utcnow() + timedelta(hours=2), # Token หมดอายุใน 2 ชั่วโมง
-            'iat': datetime.utcnow(), # เวลาที่สร้าง Token
-            'sub': user.user_id,      # Subject คือ user ID
-            'role': user.role.role_name # ใส่ Role ใน Token เพื่อให้ File App ตรวจสอบได้
-        }
-        token = jwt.encode(
-            payload,
-            current_app.config['SECRET_KEY'], # ใช้ Secret Key เดียวกันกับ Flask App
-            algorithm='HS256'
-        )
-        return jsonify({'token': token})
-
+        return jsonify(issue_tokens(user))
     except Exception as e:
         return jsonify({'message': f'Error generating token: {str(e)}'}), 500
 
 
+@api_bp.route('/auth/refresh', methods=['POST'])
+def refresh_token():
+    """แลก refresh token เป็น access token ใหม่ (ตรวจลายเซ็นและ revocation set ใน memory ไม่มี bcrypt)"""
+    data = request.get_json(silent=True) or {}
+    if not data.get('refresh_token'):
+        return jsonify({'message': 'Missing refresh_token'}), 400
+    try:
+        return jsonify(refresh_access_token(data['refresh_token']))
+    except TokenError as e:
+        return jsonify({'message': str(e)}), 401
+
+
+def client_secret_required(f):
+    """endpoint สำหรับ service ด้วยกัน: ต้องส่ง X-Client-Secret ตรงกับ AUTH_CLIENT_SECRET"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        secret = current_app.config.get('AUTH_CLIENT_SECRET')
+        if not secret:
+            return jsonify({'message': 'Client authentication is not configured.'}), 403
+        if not hmac.compare_digest(request.headers.get('X-Client-Secret', '').encode(), secret.encode()):
+            return jsonify({'message': 'Invalid client credentials.'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+@api_bp.route('/auth/introspect', methods=['POST'])
+@client_secret_required
+def introspect_token():
+    """สถานะของ token (แบบ RFC 7662): {'active': false} ถ้าหมดอายุ ถูกยกเลิก หรือผู้ใช้ไม่มีสิทธิ์แล้ว"""
+    data = request.get_json(silent=True) or {}
+    if not data.get('token'):
+        return jsonify({'message': 'Missing token'}), 400
+    try:
+        payload = decode_token(data['token'])
+    except TokenError:
+        return jsonify({'active': False})
+    return jsonify({'active': True, 'sub': payload['sub'], 'role': payload.get('role'), 'token_type': payload.get('typ'),
+                    'exp': payload['exp'], 'iat': payload['iat']})
+
+
+@api_bp.route('/auth/revoke', methods=['POST'])
+@client_secret_required
+def revoke_token():
+    """ยกเลิก token (เช่น refresh token ตอน logout ของ File App) token ที่ใช้ไม่ได้อยู่แล้วก็ตอบ 200 (RFC 7009)"""
+    data = request.get_json(silent=True) or {}
+    if not data.get('token'):
+        return jsonify({'message': 'Missing token'}), 400
+    try:
+        token_revocations.revoke(decode_token(data['token']))
+    except TokenError:
+        pass
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'Error revoking token: {str(e)}'}), 500
+    return jsonify({'message': 'Token revoked.'})
+
+
 @api_bp.route('/roles', methods=['GET'])
 @login_required
 def get_roles():
@@ -86,8 +185,32 @@ def get_roles():
         return jsonify({'message': f'Error fetching roles: {str(e)}'}), 500
 
 
+@api_bp.route('/metrics/pool', methods=['GET'])
+@login_required
+def get_pool_metrics():
+    """สถิติของ DB connection pool ใน worker process ที่ตอบ request นี้ (เฉพาะ Super Admin)"""
+    if not current_user.role or current_user.role.role_name != 'super admin':
+        return jsonify({'message': 'Permission denied.'}), 403
+    return jsonify(pool_metrics.snapshot())
+
+
+@api_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    สถิติต่อ endpoint ของทุก worker ในรูปแบบ Prometheus text
+    ใช้ METRICS_TOKEN (Bearer) สำหรับ scraper หรือ session ของ Super Admin
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    token_ok = bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}")
+    is_super_admin = current_user.is_authenticated and current_user.role and current_user.role.role_name == 'super admin'
+    if not token_ok and not is_super_admin:
+        return jsonify({'message': 'Permission denied.'}), 403
+    return current_app.response_class(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
 @api_bp.route('/<table>', methods=['GET'])
 @login_required
+@read_replica
 def get_all_records(table):
     if table not in MODEL_MAP:
         return jsonify({'message': f"Table '{table}' not found."}), 404
@@ -98,15 +221,70 @@ def get_all_records(table):
 
     model_info = MODEL_MAP[table]
     Model = model_info['model']
-    
+
+    # --- Keyset pagination mode: ?limit=&after=&sort=&<filter>= ---
+    # ถ้าไม่ส่ง limit มา จะคืนข้อมูลทั้งหมดเหมือนเดิม (list) เพื่อไม่ให้หน้าเดิมพัง
+    if 'limit' in request.args:
+        return get_records_page(table, model_info)
+
     try:
+        # ?fields=a,b,c → select เฉพาะ column ที่ขอ (ดู app/projection.py)
+        if request.args.get('fields'):
+            projection = Projection(table, Model, parse_fields(table, request.args['fields']))
+            stmt = projection.select
+            if table == 'transactions':
+                stmt = stmt.order_by(Model.transaction_date.desc())
+            return jsonify(projection.serialize(db.session.execute(stmt)))
+
+        query = Model.query.options(*model_info.get('loaders', ()))
         if table == 'transactions':
-            records = Model.query.order_by(Model.transaction_date.desc()).all()
+            records = query.order_by(Model.transaction_date.desc()).all()
         else:
-            records = Model.query.all()
+            records = query.all()
         return jsonify([record.to_dict_for_crud() for record in records])
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': f'Error fetching data for {table}: {str(e)}'}), 500
+
+def get_records_page(table, model_info):
+    """คืนข้อมูลหนึ่งหน้าพร้อม next_cursor สำหรับดึงหน้าถัดไป"""
+    Model = model_info['model']
+    try:
+        limit = page_limit_from_request()
+        sort_name, descending = parse_sort(request.args.get('sort'), model_info['sortable'], model_info['default_sort'])
+        projection = None
+        if request.args.get('fields'):
+            projection = Projection(table, Model, parse_fields(table, request.args['fields']),
+                                    key_columns=(sort_name, model_info['pk']))
+            query = projection.select
+        else:
+            query = Model.query.options(*model_info.get('loaders', ()))
+        query = apply_filters(query, Model, model_info['filters'], request.args)
+        records, next_cursor = keyset_page(
+            query, Model, sort_name, model_info['pk'], descending, limit, after=request.args.get('after')
+        )
+        return jsonify({
+            'data': projection.serialize(records) if projection else [record.to_dict_for_crud() for record in records],
+            'next_cursor': next_cursor,
+            'limit': limit,
+            'sort': f"{'-' if descending else ''}{sort_name}"
+        })
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
     except Exception as e:
         return jsonify({'message': f'Error fetching data for {table}: {str(e)}'}), 500
+
+def page_limit_from_request():
+    """อ่าน ?limit= (ใช้ค่า default ถ้าไม่ส่ง และไม่เกิน API_PAGE_MAX_LIMIT)"""
+    try:
+        limit = int(request.args.get('limit') or current_app.config.get('API_PAGE_DEFAULT_LIMIT', 100))
+    except ValueError:
+        raise PaginationError('limit must be an integer.')
+    if limit < 1:
+        raise PaginationError('limit must be greater than 0.')
+    return min(limit, current_app.config.get('API_PAGE_MAX_LIMIT', 500))
+
 @api_bp.route('/<table>', methods=['POST'])
 @login_required
 def create_record(table):
@@ -136,7 +314,10 @@ def create_record(table):
     
     if table == 'users':
         if 'password' in data and data['password']:
-            data['password_hash'] = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+            try:
+                data['password_hash'] = password_hasher.generate(data['password'])
+            except PasswordHasherBusy as e:
+                return jsonify({'message': str(e)}), 503, {'Retry-After': '1'}
             del data['password']
         else:
             return jsonify({'message': 'Password is required.'}), 400
@@ -158,9 +339,11 @@ def create_record(table):
         
         # ตอนนี้ pk_field ถูกต้องแล้ว และ new_record ก็มีค่า PK แล้ว
         pk_value = getattr(new_record, pk_field)
-        add_log_entry(f"Created record with ID '{pk_value}' in table '{table}'.")
         
         db.session.commit()
+        add_log_entry(f"Created record with ID '{pk_value}' in table '{table}'.")
+        if table in CATALOG_TABLES:
+            catalog_cache.invalidate()
         return jsonify(new_record.to_dict_for_crud()), 201
         
     except IntegrityError as e:
@@ -207,7 +390,10 @@ def update_record(table, record_id):
     # --- START: PASSWORD HASHING ---
     if table == 'users':
         if 'password' in data and data['password']:
-            data['password_hash'] = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+            try:
+                data['password_hash'] = password_hasher.generate(data['password'])
+            except PasswordHasherBusy as e:
+                return jsonify({'message': str(e)}), 503, {'Retry-After': '1'}
         # ไม่ว่าจะส่ง password มาหรือไม่ ก็ลบ key นี้ออกจาก data ที่จะ update
         if 'password' in data:
             del data['password']
@@ -221,8 +407,13 @@ def update_record(table, record_id):
             setattr(record, key, value)
             
     try:
-        add_log_entry(f"Updated record with ID '{record_id}' in table '{table}'.")
         db.session.commit()
+        add_log_entry(f"Updated record with ID '{record_id}' in table '{table}'.")
+        if table in CATALOG_TABLES:
+            catalog_cache.invalidate()
+        if table == 'users':
+            user_cache.invalidate(record_id)
+            token_revocations.invalidate()
         return jsonify(record.to_dict_for_crud())
     except Exception as e:
         db.session.rollback()
@@ -264,22 +455,28 @@ def delete_record(table, record_id):
         return jsonify({'message': 'Record not found.'}), 404
         
     try:
-        add_log_entry(f"Deleted record with ID '{record_id}' from table '{table}'.")
+        if table == 'transactions':
+            apply_revenue_change(before=revenue_state(record))
         db.session.delete(record)
         db.session.commit()
+        add_log_entry(f"Deleted record with ID '{record_id}' from table '{table}'.")
+        if table in CATALOG_TABLES:
+            catalog_cache.invalidate()
+        if table == 'users':
+            user_cache.invalidate(record_id)
+            token_revocations.invalidate()
         return jsonify({'message': f'Record deleted successfully.'})
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': f'Error deleting record: {str(e)}'}), 500
 
 def add_log_entry(action_description):
-    """ฟังก์ชันสำหรับสร้างและเพิ่ม Log Entry ใหม่ลงใน session"""
+    """
+    ฟังก์ชันสำหรับบันทึก Log Entry ใหม่ผ่าน audit_logger (write-behind)
+    เรียกหลังจาก commit สำเร็จแล้ว เพื่อไม่ให้มี log ของการแก้ไขที่ถูก rollback
+    """
     try:
-        log = LogEntry(
-            user_id=current_user.user_id,
-            action=action_description
-        )
-        db.session.add(log)
+        audit_logger.log(current_user.user_id, action_description)
     except Exception as e:
         print(f"Error adding log entry: {e}")
 
@@ -293,6 +490,236 @@ def ajax_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# filter ของหน้าค้นหา transaction (ทุกตัวมี index รองรับ ดู Transaction.__table_args__)
+TRANSACTION_SEARCH_FILTERS = {
+    'hn': 'eq', 'patient_fname': 'prefix', 'patient_lname': 'prefix',
+    'doctor_id': 'eq', 'consultant_id': 'eq', 'patient_type': 'eq',
+    'payment_method': 'eq', 'review_status': 'eq'
+}
+
+@api_bp.route('/transactions/search', methods=['GET'])
+@login_required
+@read_replica
+def search_transactions():
+    """
+    ค้นหา transaction ฝั่ง server แทนการโหลดประวัติทั้งหมดมากรองใน browser
+    ?hn=, ?name= (ขึ้นต้นชื่อหรือนามสกุล), ?patient_fname=, ?patient_lname=,
+    ?date_from=&date_to= (หรือ transaction_date_from/_to), ?doctor_id=, ?consultant_id=,
+    ?patient_type=, ?payment_method=, ?review_status=, ?item_code=
+    คืนค่าทีละหน้า (keyset pagination) ในรูปแบบเดียวกับ /api/transaction-history
+    """
+    args = request.args.to_dict()
+
+    try:
+        limit = page_limit_from_request()
+        sort_name, descending = parse_sort(request.args.get('sort'), ['transaction_date', 'transaction_id'], '-transaction_date')
+        query = Transaction.query.options(*TRANSACTION_TO_DICT_LOADERS)
+        query = apply_filters(query, Transaction, TRANSACTION_SEARCH_FILTERS, args)
+
+        # date_from/date_to เป็นวันตามเวลา Asia/Bangkok (เหมือน report และ export) แต่ transaction_date เก็บเป็น UTC
+        date_from, date_to = search_date_range(args)
+        if date_from:
+            query = query.filter(Transaction.transaction_date >= utc_bounds(date_from, date_from)[0])
+        if date_to:
+            query = query.filter(Transaction.transaction_date < utc_bounds(date_to, date_to)[1])
+
+        name = (args.get('name') or '').strip()
+        if name:
+            # MySQL ใช้ index_merge ของ ix_transactions_fname_lname และ ix_transactions_lname
+            query = query.filter(db.or_(Transaction.patient_fname.startswith(name, autoescape=True),
+                                        Transaction.patient_lname.startswith(name, autoescape=True)))
+        if args.get('item_code'):
+            item_subquery = db.select(TransactionItem.transaction_id).where(TransactionItem.item_code == args['item_code'])
+            query = query.filter(Transaction.transaction_id.in_(item_subquery))
+
+        records, next_cursor = keyset_page(
+            query, Transaction, sort_name, 'transaction_id', descending, limit, after=request.args.get('after')
+        )
+        return jsonify({
+            'data': [t.to_dict() for t in records],
+            'next_cursor': next_cursor,
+            'limit': limit,
+            'sort': f"{'-' if descending else ''}{sort_name}"
+        })
+    except PaginationError as e:
+        return jsonify({'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'message': f'Error searching transactions: {str(e)}'}), 500
+
+def search_date_range(args):
+    """อ่าน ?date_from=&date_to= (หรือ transaction_date_from/_to) แบบ YYYY-MM-DD คืนค่า (date หรือ None, date หรือ None)"""
+    bounds = []
+    for name in ('from', 'to'):
+        raw = args.get(f'date_{name}') or args.get(f'transaction_date_{name}')
+        try:
+            bounds.append(date.fromisoformat(raw) if raw else None)
+        except ValueError:
+            raise PaginationError(f'date_{name} must be a date in YYYY-MM-DD format.')
+    return tuple(bounds)
+
+def date_range_from_request():
+    """
+    อ่าน ?from=YYYY-MM-DD&to=YYYY-MM-DD (ค่าเริ่มต้น: ต้นเดือนปัจจุบันถึงวันนี้ ตามเวลา Asia/Bangkok)
+    raise ValueError ถ้ารูปแบบไม่ถูกต้อง
+    """
+    today = datetime.now(LOCAL_TZ).date()
+    try:
+        date_from = date.fromisoformat(request.args['from']) if request.args.get('from') else today.replace(day=1)
+        date_to = date.fromisoformat(request.args['to']) if request.args.get('to') else today
+    except ValueError:
+        raise ValueError('from/to must be dates in YYYY-MM-DD format.')
+    if date_from > date_to:
+        raise ValueError('from must not be after to.')
+    return date_from, date_to
+
+@api_bp.route('/reports/revenue/<kind>', methods=['GET'])
+@login_required
+def get_revenue_report(kind):
+    """
+    รายงานรายได้จากตารางสรุปรายวัน (ไม่ scan transactions)
+    kind: daily (รายวัน), doctors (ตามแพทย์), items (ตามรายการ), payments (ตามประเภทผู้ป่วย/วิธีชำระ)
+    ?from=YYYY-MM-DD&to=YYYY-MM-DD (ค่าเริ่มต้น: ต้นเดือนปัจจุบันถึงวันนี้ ตามเวลา Asia/Bangkok)
+    """
+    if not current_user.role or current_user.role.role_name not in ['admin', 'super admin']:
+        return jsonify({'message': 'Permission denied.'}), 403
+    if kind not in REPORT_KINDS:
+        return jsonify({'message': f"Report '{kind}' not found. Allowed: {', '.join(REPORT_KINDS)}."}), 404
+
+    try:
+        date_from, date_to = date_range_from_request()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    try:
+        return jsonify({
+            'report': kind,
+            'from': date_from.isoformat(),
+            'to': date_to.isoformat(),
+            'data': revenue_report(kind, date_from, date_to)
+        })
+    except Exception as e:
+        return jsonify({'message': f'Error building report: {str(e)}'}), 500
+
+@api_bp.route('/export/transactions', methods=['GET'])
+@login_required
+@read_replica
+def export_transactions():
+    """
+    Export transaction ในช่วงวันที่เป็นไฟล์ CSV หรือ XLSX แบบ streaming (ไม่โหลดทั้งช่วงเข้า memory)
+    ?format=csv|xlsx&from=YYYY-MM-DD&to=YYYY-MM-DD&items=1 (items=1: แตกเป็นหนึ่งแถวต่อ transaction_item)
+    """
+    if not current_user.role or current_user.role.role_name not in ['admin', 'super admin']:
+        return jsonify({'message': 'Permission denied.'}), 403
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'message': f"Unsupported format '{export_format}'. Allowed: {', '.join(EXPORT_FORMATS)}."}), 400
+    try:
+        date_from, date_to = date_range_from_request()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    with_items = request.args.get('items', '').lower() in ('1', 'true', 'yes')
+    headers = TRANSACTION_HEADERS + (ITEM_HEADERS if with_items else [])
+    batches = stream_rows(
+        transaction_export_query(date_from, date_to, with_items),
+        current_app.config.get('STREAM_YIELD_PER', 500),
+        lambda row: transaction_row(row, with_items)
+    )
+    sheet = 'transaction_items' if with_items else 'transactions'
+    name = f"{sheet}_{date_from.isoformat()}_{date_to.isoformat()}"
+    add_log_entry(f"Exported {name} as {export_format}.")
+    return export_response(export_format, name, sheet, headers, batches)
+
+@api_bp.route('/export/logs', methods=['GET'])
+@login_required
+@read_replica
+def export_logs():
+    """Export log ในช่วงวันที่เป็นไฟล์ CSV หรือ XLSX แบบ streaming (?format=csv|xlsx&from=&to=)"""
+    if not current_user.role or current_user.role.role_name not in ['admin', 'super admin']:
+        return jsonify({'message': 'Permission denied.'}), 403
+    export_format = request.args.get('format', 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'message': f"Unsupported format '{export_format}'. Allowed: {', '.join(EXPORT_FORMATS)}."}), 400
+    try:
+        date_from, date_to = date_range_from_request()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    batches = stream_rows(log_export_query(date_from, date_to), current_app.config.get('STREAM_YIELD_PER', 500))
+    name = f"logs_{date_from.isoformat()}_{date_to.isoformat()}"
+    add_log_entry(f"Exported {name} as {export_format}.")
+    return export_response(export_format, name, 'logs', LOG_HEADERS, batches)
+
+def export_response(export_format, name, sheet, headers, batches):
+    mimetype = ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet' if export_format == 'xlsx'
+                else 'text/csv; charset=utf-8')
+    response = Response(stream_with_context(export_chunks(export_format, sheet, headers, batches)), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{name}.{export_format}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@api_bp.route('/logs/archive', methods=['GET'])
+@login_required
+def get_log_archive_months():
+    """รายการเดือนที่ย้ายไป archive แล้ว (จำนวน log, ช่วงเวลา, ช่วง log_id) ดู archive_logs.py"""
+    if not current_user.role or current_user.role.role_name not in ['admin', 'super admin']:
+        return jsonify({'message': 'Permission denied.'}), 403
+    return jsonify({'months': log_archive().months(), 'retention_days': current_app.config.get('LOG_RETENTION_DAYS')})
+
+@api_bp.route('/logs/archive/<month>', methods=['GET'])
+@login_required
+@read_replica
+def get_archived_logs(month):
+    """
+    log ของเดือนที่ระบุ (YYYY-MM) ทั้งส่วนที่อยู่ในไฟล์ archive และส่วนที่ยังอยู่ในตาราง เรียงจาก log_id มากไปน้อย
+    ?limit=&after=<next_cursor>&user_id=&action= (ผลลัพธ์รูปแบบเดียวกับ GET /api/logs?limit=)
+    """
+    if not current_user.role or current_user.role.role_name not in ['admin', 'super admin']:
+        return jsonify({'message': 'Permission denied.'}), 403
+    try:
+        start, end = parse_month(month)
+        limit = page_limit_from_request()
+        after = None
+        if request.args.get('after'):
+            values = decode_cursor(request.args['after'])
+            if len(values) != 1 or not isinstance(values[0], int):
+                raise PaginationError('Invalid cursor.')
+            after = values[0]
+        user_id = coerce_value(LogEntry.user_id, request.args.get('user_id') or None)
+    except ValueError as e: # รวม PaginationError
+        return jsonify({'message': str(e)}), 400
+    action = request.args.get('action') or None
+
+    try:
+        # ส่วนที่ยังไม่ถูก archive (เดือนที่ archive ไปบางส่วน หรือยังไม่ถึงเวลา archive)
+        projection = Projection('logs', LogEntry, ['log_id', 'timestamp', 'user', 'action'])
+        query = projection.select.where(LogEntry.timestamp >= start, LogEntry.timestamp < end)
+        query = apply_filters(query, LogEntry, {'user_id': 'eq', 'action': 'contains'}, request.args)
+        if after is not None:
+            query = query.where(LogEntry.log_id < after)
+        records = projection.serialize(db.session.execute(query.order_by(LogEntry.log_id.desc()).limit(limit + 1)))
+
+        # ส่วนที่อยู่ในไฟล์ archive (เรียง log_id จากน้อยไปมาก)
+        needle = action.casefold() if action else None
+        archived = []
+        for entry in reversed(log_archive().read_month(month)):
+            if after is not None and entry['log_id'] >= after:
+                continue
+            if user_id is not None and entry['user_id'] != user_id:
+                continue
+            if needle and needle not in entry['action'].casefold():
+                continue
+            archived.append({'log_id': entry['log_id'], 'timestamp': entry['timestamp'],
+                             'user': entry['user'] or 'System', 'action': entry['action']})
+            if len(archived) > limit:
+                break
+
+        records = sorted(records + archived, key=lambda record: record['log_id'], reverse=True)
+        next_cursor = encode_cursor([records[limit - 1]['log_id']]) if len(records) > limit else None
+        return jsonify({'data': records[:limit], 'next_cursor': next_cursor, 'limit': limit, 'sort': '-log_id'})
+    except Exception as e:
+        return jsonify({'message': f'Error fetching archived logs: {str(e)}'}), 500
+
 @api_bp.route('/transaction/<transaction_id>', methods=['GET'])
 @login_required
 @ajax_required
@@ -301,7 +728,7 @@ def get_transaction_details(transaction_id):
     if not current_user.role or current_user.role.role_name not in ['admin', 'super admin']:
         return jsonify({'message': 'Permission denied.'}), 403
 
-    transaction = db.session.get(Transaction, transaction_id)
+    transaction = db.session.get(Transaction, transaction_id, options=TRANSACTION_TO_DICT_LOADERS)
     if not transaction:
         return jsonify({'message': 'Transaction not found.'}), 404
         
@@ -315,7 +742,7 @@ def update_transaction(transaction_id):
     if not current_user.role or current_user.role.role_name not in ['admin', 'super admin']:
         return jsonify({'message': 'Permission denied.'}), 403
 
-    txn_to_update = db.session.get(Transaction, transaction_id)
+    txn_to_update = db.session.get(Transaction, transaction_id, options=TRANSACTION_TO_DICT_LOADERS)
     if not txn_to_update:
         return jsonify({'message': 'Transaction not found.'}), 404
 
@@ -325,13 +752,16 @@ def update_transaction(transaction_id):
 
     try:
         # --- 1. บันทึกประวัติเวอร์ชัน (Versioning) ---
-        latest_version_num = db.session.query(db.func.max(TransactionVersion.version_number)).filter_by(transaction_id=transaction_id).scalar() or 0
+        # เก็บเป็น keyframe + diff จากเวอร์ชันก่อนหน้า (ดู app/snapshots.py)
+        latest_version_num, previous_snapshot = latest_snapshot(transaction_id)
+        # Snapshot คือข้อมูล "ณ ปัจจุบัน" ก่อนที่จะเริ่มแก้ไข (ผ่าน JSON เพื่อให้ค่าเหมือนตอนอ่านกลับ)
+        current_snapshot = json.loads(json.dumps(txn_to_update.to_dict()))
+        revenue_before = revenue_state(txn_to_update)
         
         new_version = TransactionVersion(
             transaction_id=transaction_id,
             version_number=latest_version_num + 1,
-            # Snapshot คือข้อมูล "ณ ปัจจุบัน" ก่อนที่จะเริ่มแก้ไข
-            transaction_snapshot=json.dumps(txn_to_update.to_dict()),
+            transaction_snapshot=encode_snapshot(current_snapshot, latest_version_num + 1, previous_snapshot),
             change_reason=data.get('change_reason', 'No reason provided.'),
             created_by_user_id=current_user.user_id
         )
@@ -373,6 +803,7 @@ def update_transaction(transaction_id):
         # --- 4. อัปเดตรายการ Items ---
         # ลบรายการเก่าทั้งหมด แล้วสร้างใหม่จากข้อมูลที่ส่งมา
         TransactionItem.query.filter_by(transaction_id=transaction_id).delete()
+        new_items = []
         if 'cartItems' in data and data['cartItems']:
             for item_data in data['cartItems']:
                 transaction_item = TransactionItem(
@@ -382,14 +813,28 @@ def update_transaction(transaction_id):
                     price_per_unit=float(item_data.get('price', 0))
                 )
                 db.session.add(transaction_item)
+                new_items.append(transaction_item)
 
-        # --- 5. Commit & Return ---
-        add_log_entry(f"Updated transaction '{transaction_id}'. Reason: {data.get('change_reason')}")
+        # --- 5. ตรวจราคากับ catalog และปรับตารางสรุปยอดรายวันตามส่วนต่างก่อน/หลังแก้ไข ---
+        price_check = check_bill(txn_to_update, new_items)
+        if price_check and not price_check.ok and price_check_mode() == 'enforce':
+            db.session.rollback()
+            return jsonify({'message': f'Price check failed: {describe_mismatches(price_check)}',
+                            'price_check': price_check.to_dict()}), 422
+        apply_revenue_change(before=revenue_before, after=revenue_state(txn_to_update, new_items))
+
+        # --- 6. Commit & Return ---
         db.session.commit()
+        add_log_entry(f"Updated transaction '{transaction_id}'. Reason: {data.get('change_reason')}")
+        if price_check and not price_check.ok:
+            add_log_entry(f"Price mismatch on transaction '{transaction_id}': {describe_mismatches(price_check)}")
         
         # ส่งข้อมูลที่อัปเดตแล้วกลับไปให้ Frontend
         return jsonify(txn_to_update.to_dict())
 
+    except SignatureStoreBusy as e:
+        db.session.rollback()
+        return jsonify({'message': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         import traceback
@@ -398,6 +843,7 @@ def update_transaction(transaction_id):
     
 @api_bp.route('/transaction/<transaction_id>/versions', methods=['GET'])
 @login_required
+@read_replica
 def get_transaction_versions(transaction_id):
     """
     API สำหรับดึงประวัติเวอร์ชันทั้งหมดของ Transaction หนึ่งๆ
@@ -407,11 +853,30 @@ def get_transaction_versions(transaction_id):
         return jsonify({'message': 'Permission denied.'}), 403
 
     # ค้นหาทุกเวอร์ชันของ transaction_id ที่ระบุ, เรียงจากเวอร์ชันล่าสุดไปเก่าสุด
-    versions = TransactionVersion.query.filter_by(
+    versions = TransactionVersion.query.options(*TRANSACTION_VERSION_LOADERS).filter_by(
         transaction_id=transaction_id
     ).order_by(db.desc(TransactionVersion.version_number)).all()
 
+    # สร้าง snapshot ของทุกเวอร์ชันในรอบเดียว (เวอร์ชันที่เก็บแบบ diff ต้องไล่จาก keyframe)
+    snapshots = resolve_snapshots(versions)
+
     # ส่งข้อมูลกลับไปในรูปแบบ JSON list
-    return jsonify([v.to_dict() for v in versions])
+    return jsonify([v.to_dict(snapshot=snapshots[v.version_number]) for v in versions])
+
+@api_bp.route('/transaction/<transaction_id>/versions/<int:version_number>', methods=['GET'])
+@login_required
+@read_replica
+def get_transaction_version(transaction_id, version_number):
+    """API สำหรับดึง snapshot ของเวอร์ชันที่ระบุ"""
+    if not current_user.role or current_user.role.role_name not in ['admin', 'super admin']:
+        return jsonify({'message': 'Permission denied.'}), 403
+
+    version = TransactionVersion.query.options(*TRANSACTION_VERSION_LOADERS).filter_by(
+        transaction_id=transaction_id, version_number=version_number
+    ).first()
+    if not version:
+        return jsonify({'message': 'Version not found.'}), 404
+
+    return jsonify(version.to_dict(snapshot=reconstruct_version(transaction_id, version_number)))
 
 # ... The rest of the file (initial-data, get_transactions, save-transaction) remains the same ...
\ No newline at end of file
@@ -0,0 +1,101 @@
+# /app/audit.py
+# Audit log แบบ write-behind
+# แทนการ INSERT LogEntry ภายใน transaction ของ request ทุกครั้ง
+# เราเก็บ event ไว้ใน queue ของ process แล้วเขียนลงตาราง log_entries
+# เป็นชุด (multi-row INSERT) เมื่อครบจำนวน AUDIT_BATCH_SIZE หรือครบเวลา AUDIT_FLUSH_INTERVAL วินาที
+# และ flush ทุกครั้งก่อน process ปิด (atexit)
+# ตั้งค่า AUDIT_SYNC = True (เช่นตอนทดสอบ) เพื่อเขียนทันทีแบบเดิม
+import atexit
+import threading
+from datetime import datetime
+
+from .extensions import db
+from .models import LogEntry, LOCAL_TZ
+
+
+class AuditLogger:
+    def __init__(self, app=None):
+        self.app = None
+        self.sync = False
+        self.batch_size = 100
+        self.flush_interval = 2.0
+        self.max_buffer = 10000
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.sync = app.config.get('AUDIT_SYNC', False)
+        self.batch_size = app.config.get('AUDIT_BATCH_SIZE', self.batch_size)
+        self.flush_interval = app.config.get('AUDIT_FLUSH_INTERVAL', self.flush_interval)
+        self.max_buffer = app.config.get('AUDIT_MAX_BUFFER', self.max_buffer)
+        app.extensions['audit_logger'] = self
+
+        if not self.sync and self._thread is None:
+            self._thread = threading.Thread(target=self._flush_loop, name="audit-flusher", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def after_fork(self):
+        """
+        เรียกใน worker หลัง fork (gunicorn preload_app): thread ของ master ไม่ตามมาหลัง fork
+        จึงต้องสร้าง flusher thread ใหม่ และทิ้ง buffer ที่ copy มาจาก master (master flush เอง)
+        """
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._buffer = []
+        if not self.sync:
+            self._thread = threading.Thread(target=self._flush_loop, name="audit-flusher", daemon=True)
+            self._thread.start()
+
+    def log(self, user_id, action):
+        """บันทึก event (timestamp ตามเวลาที่เกิดเหตุการณ์ ไม่ใช่เวลาที่ flush)"""
+        event = {
+            'timestamp': datetime.now(LOCAL_TZ),
+            'user_id': user_id,
+            'action': action
+        }
+        if self.sync:
+            self._write([event])
+            return
+        with self._lock:
+            self._buffer.append(event)
+            should_wake = len(self._buffer) >= self.batch_size
+        if should_wake:
+            self._wakeup.set()
+
+    def flush(self):
+        """เขียน event ที่ค้างอยู่ทั้งหมดลงฐานข้อมูล"""
+        with self._lock:
+            events, self._buffer = self._buffer, []
+        if not events:
+            return
+        try:
+            self._write(events)
+        except Exception:
+            # เขียนไม่สำเร็จ: ใส่กลับเข้า buffer เพื่อลองใหม่รอบถัดไป (ทิ้งรายการเก่าสุดถ้าเกิน max_buffer)
+            with self._lock:
+                self._buffer = (events + self._buffer)[-self.max_buffer:]
+            raise
+
+    def _flush_loop(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Failed to flush audit log: {e}")
+
+    def _write(self, events):
+        # ใช้ connection แยกจาก session ของ request เพื่อไม่ให้ปนกับ transaction ของผู้ใช้
+        with self.app.app_context():
+            with db.engine.begin() as conn:
+                conn.execute(LogEntry.__table__.insert(), events)
+
+
+audit_logger = AuditLogger()
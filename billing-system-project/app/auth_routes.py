@@ -1,9 +1,12 @@
 # /app/auth_routes.py
 from flask import request, jsonify, redirect, url_for
-from flask_login import LoginManager, login_user, logout_user, login_required
+from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from flask import Blueprint
-from .models import User, LogEntry # <--- เพิ่ม LogEntry
+from .models import User
 from .extensions import db, bcrypt, login_manager 
+from .audit import audit_logger
+from .user_cache import user_cache
+from .passwords import PasswordHasherBusy, password_hasher
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -13,10 +16,12 @@ login_manager.login_view = 'main.index'
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # ใช้ cache ต่อ process (โหลด role มาพร้อมกัน) แทนการ query ทุก request
+    return user_cache.get(int(user_id))
 
 def check_password(password_hash, password):
-    return bcrypt.check_password_hash(password_hash, password)
+    # bcrypt ทำใน thread pool ขนาดจำกัดของ worker (ดู app/passwords.py)
+    return password_hasher.check(password_hash, password)
 
 
 @auth_bp.route('/api/login', methods=['POST'])
@@ -31,17 +36,19 @@ def login_api():
     # ------------------------------------
 
     # บรรทัดที่ 44 ที่เกิด Error คือบรรทัดนี้ ซึ่งตอนนี้จะทำงานได้ถูกต้อง
-    if user and check_password(user.password_hash, data['password']):
+    try:
+        password_ok = user is not None and check_password(user.password_hash, data['password'])
+    except PasswordHasherBusy as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 503, {'Retry-After': '1'}
+
+    if password_ok:
         if user.is_active:
             login_user(user, remember=True)
             
-            # บันทึก Log การ Login
+            # บันทึก Log การ Login (write-behind ไม่ต้อง commit เอง)
             try:
-                log = LogEntry(user_id=user.user_id, action=f"User '{user.username}' logged in.")
-                db.session.add(log)
-                db.session.commit()
+                audit_logger.log(user.user_id, f"User '{user.username}' logged in.")
             except Exception as e:
-                db.session.rollback()
                 print(f"Failed to log login event: {e}")
 
             return jsonify({
@@ -59,11 +66,8 @@ def login_api():
 def logout_api():
     # --- START: บันทึก Log การ Logout ---
     try:
-        log = LogEntry(user_id=current_user.user_id, action=f"User '{current_user.username}' logged out.")
-        db.session.add(log)
-        db.session.commit()
+        audit_logger.log(current_user.user_id, f"User '{current_user.username}' logged out.")
     except Exception as e:
-        db.session.rollback()
         print(f"Failed to log logout event: {e}")
     # --- END: บันทึก Log ---
 
@@ -0,0 +1,132 @@
+# /app/auth_tokens.py
+# JWT ของ File App (Node) ที่ยืนยันตัวตน Superadmin ผ่าน /api/auth/*
+# - login (ตรวจ bcrypt ครั้งเดียว) ได้ access token อายุสั้น (AUTH_ACCESS_TOKEN_TTL) และ refresh token (AUTH_REFRESH_TOKEN_TTL)
+# - /api/auth/refresh แลก refresh token เป็น access token ใหม่: ตรวจแค่ HMAC และ revocation set ใน memory (ไม่มี bcrypt)
+# - /api/auth/introspect บอกว่า token ยังใช้ได้หรือไม่ สำหรับ service ที่ต้องการรู้ผลการยกเลิกทันที
+#   (introspect / revoke เรียกได้เฉพาะ service ที่ส่ง X-Client-Secret ตรงกับ AUTH_CLIENT_SECRET)
+# - revocation set ต่อ process = superadmin ที่ยัง active + jti ที่ถูกยกเลิก (ตาราง revoked_tokens)
+#   โหลดใหม่ทันทีใน process ที่แก้ไข/ลบผู้ใช้ (invalidate) และทุก AUTH_REVOCATION_TTL วินาทีใน worker อื่น
+#   แถวที่ token หมดอายุแล้วถูกลบตอนโหลดใหม่ ไม่เกินครั้งละ AUTH_REVOCATION_PURGE_INTERVAL วินาที (ไม่ใช่ทุกครั้งที่ revoke)
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import jwt
+from flask import current_app
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from .extensions import db
+from .models import User, Role, RevokedToken
+
+ALGORITHM = 'HS256'
+# role ที่ใช้ File App ได้
+FILE_APP_ROLE = 'super admin'
+
+
+class TokenError(Exception):
+    """token ใช้ไม่ได้: หมดอายุ, ลายเซ็นไม่ถูกต้อง, ถูกยกเลิก หรือผู้ใช้ไม่มีสิทธิ์แล้ว (ตอบกลับเป็น 401)"""
+
+
+class TokenRevocations:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._superadmins = frozenset()
+        self._revoked = frozenset()
+        self._loaded_at = None
+        self._purged_at = None
+
+    def invalidate(self):
+        """ให้โหลดใหม่ในการตรวจครั้งถัดไป เช่นหลังแก้ไข/ลบผู้ใช้ (is_active, role)"""
+        with self._lock:
+            self._loaded_at = None
+
+    def check(self, payload):
+        self._ensure_loaded()
+        if int(payload['sub']) not in self._superadmins:
+            raise TokenError('User is inactive or no longer a superadmin.')
+        if payload.get('jti') in self._revoked:
+            raise TokenError('Token has been revoked.')
+
+    def revoke(self, payload):
+        """บันทึก jti ของ token ลง revoked_tokens"""
+        if db.session.get(RevokedToken, payload['jti']) is None:
+            db.session.add(RevokedToken(
+                jti=payload['jti'], user_id=int(payload['sub']),
+                expires_at=datetime.fromtimestamp(payload['exp'], timezone.utc).replace(tzinfo=None)
+            ))
+        db.session.commit()
+        with self._lock:
+            self._revoked = self._revoked | {payload['jti']}
+
+    def _ensure_loaded(self):
+        loaded_at = self._loaded_at
+        if loaded_at is not None and time.monotonic() - loaded_at <= current_app.config.get('AUTH_REVOCATION_TTL', 30):
+            return
+        # session แยกจาก request: ไม่ปนกับ transaction ของผู้ใช้และอ่านจาก primary เสมอ
+        with Session(db.engine) as session:
+            purged_at = self._purged_at
+            if purged_at is None or time.monotonic() - purged_at > current_app.config.get('AUTH_REVOCATION_PURGE_INTERVAL', 3600):
+                self._purged_at = time.monotonic()
+                session.execute(delete(RevokedToken).where(RevokedToken.expires_at < datetime.utcnow()))
+                session.commit()
+            superadmins = frozenset(session.scalars(
+                db.select(User.user_id).join(Role, Role.role_id == User.role_id)
+                .where(User.is_active == 1, Role.role_name == FILE_APP_ROLE)
+            ))
+            revoked = frozenset(session.scalars(
+                db.select(RevokedToken.jti).where(RevokedToken.expires_at >= datetime.utcnow())
+            ))
+        with self._lock:
+            self._superadmins, self._revoked, self._loaded_at = superadmins, revoked, time.monotonic()
+
+
+token_revocations = TokenRevocations()
+
+
+def _encode(token_type, user_id, ttl):
+    now = datetime.utcnow()
+    payload = {
+        'typ': token_type,
+        'sub': str(user_id),
+        'role': FILE_APP_ROLE, # File App ตรวจ role จาก token เอง
+        'iat': now,
+        'exp': now + timedelta(seconds=ttl),
+        'jti': uuid.uuid4().hex
+    }
+    return jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm=ALGORITHM)
+
+
+def issue_tokens(user):
+    """access token + refresh token หลัง login สำเร็จ ('token' คือ access token เหมือนเดิม)"""
+    access_ttl = current_app.config.get('AUTH_ACCESS_TOKEN_TTL', 900)
+    refresh_ttl = current_app.config.get('AUTH_REFRESH_TOKEN_TTL', 86400)
+    return {
+        'token': _encode('access', user.user_id, access_ttl),
+        'expires_in': access_ttl,
+        'refresh_token': _encode('refresh', user.user_id, refresh_ttl),
+        'refresh_expires_in': refresh_ttl
+    }
+
+
+def decode_token(token, token_type=None):
+    """ตรวจลายเซ็น อายุ ชนิด และ revocation set คืน payload หรือ raise TokenError"""
+    try:
+        payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=[ALGORITHM],
+                             options={'require': ['exp', 'iat', 'sub', 'jti']})
+    except jwt.ExpiredSignatureError:
+        raise TokenError('Token has expired.')
+    except jwt.InvalidTokenError:
+        raise TokenError('Invalid token.')
+    if token_type is not None and payload.get('typ') != token_type:
+        raise TokenError(f'Expected a {token_type} token.')
+    token_revocations.check(payload)
+    return payload
+
+
+def refresh_access_token(refresh_token):
+    """แลก refresh token เป็น access token ใหม่ (refresh token เดิมใช้ต่อได้จนหมดอายุหรือถูกยกเลิก)"""
+    payload = decode_token(refresh_token, 'refresh')
+    access_ttl = current_app.config.get('AUTH_ACCESS_TOKEN_TTL', 900)
+    return {'token': _encode('access', payload['sub'], access_ttl), 'expires_in': access_ttl}
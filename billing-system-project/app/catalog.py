@@ -0,0 +1,69 @@
+# /app/catalog.py
+# Cache ของข้อมูล catalog (Items + Staff) สำหรับ /api/initial-data
+# เก็บ JSON ที่ serialize แล้วไว้ใน memory ของแต่ละ process พร้อม version number
+# และ ETag เพื่อให้ browser ได้ 304 Not Modified ถ้า catalog ไม่เปลี่ยน
+import hashlib
+import threading
+import time
+
+from flask import current_app
+from .extensions import db
+from .models import Item, Staff
+
+
+class CatalogCache:
+    """
+    Pre-serialized catalog ต่อ process
+
+    - invalidate() จะเพิ่ม version และทำให้ blob ถูกสร้างใหม่ในการเรียกครั้งถัดไป
+      (เรียกหลังจาก commit การแก้ไข items/staff สำเร็จ)
+    - blob จะถูกสร้างใหม่เมื่ออายุเกิน CATALOG_CACHE_TTL วินาทีด้วย
+      เพื่อให้ worker อื่นที่ไม่ได้รับ invalidate() เห็นข้อมูลใหม่ภายในเวลาที่กำหนด
+    - ETag คำนวณจากเนื้อหา จึงตรงกันทุก worker ที่มีข้อมูลชุดเดียวกัน
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = 0
+        self._built_version = None
+        self._built_at = 0.0
+        self._blob = None
+        self._etag = None
+
+    @property
+    def version(self):
+        return self._version
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+
+    def get(self):
+        """คืนค่า (blob, etag, version) โดยสร้าง blob ใหม่ถ้าจำเป็น"""
+        ttl = current_app.config.get('CATALOG_CACHE_TTL', 60)
+        with self._lock:
+            expired = ttl is not None and time.monotonic() - self._built_at > ttl
+            if self._blob is None or self._built_version != self._version or expired:
+                # หลัง invalidate() อ่านจาก primary เสมอ (read replica อาจยังไม่เห็นการแก้ไขที่เพิ่ง commit)
+                self._build(primary=self._built_version != self._version)
+            return self._blob, self._etag, self._built_version
+
+    def _build(self, primary=False):
+        bind_arguments = {'bind': db.engine} if primary else None
+        items = db.session.scalars(db.select(Item), bind_arguments=bind_arguments).all()
+        staff = db.session.scalars(db.select(Staff), bind_arguments=bind_arguments).all()
+        payload = {
+            'products': [item.to_dict() for item in items],
+            'users': [s.to_dict() for s in staff]
+        }
+        blob = current_app.json.dumps(payload).encode('utf-8')
+        self._blob = blob
+        self._etag = hashlib.sha1(blob).hexdigest()
+        self._built_version = self._version
+        self._built_at = time.monotonic()
+
+
+catalog_cache = CatalogCache()
+
+# ตารางที่ถ้ามีการแก้ไขต้อง invalidate catalog
+CATALOG_TABLES = ('items', 'staff')
@@ -0,0 +1,179 @@
+# /app/compression.py
+# ลดจำนวน bytes ที่ส่งไปยังคลินิกที่เชื่อมต่อผ่านเน็ตช้า
+# - บีบอัด response (JSON / CSV / HTML) ด้วย brotli หรือ gzip ตาม Accept-Encoding ของ client
+#   เฉพาะ response ที่ใหญ่กว่า COMPRESS_MIN_SIZE, response แบบ stream จะบีบอัดทีละ chunk
+# - response ที่มี ETag (เช่น /api/initial-data) จะ cache ผลที่บีบอัดแล้วไว้ตาม ETag ไม่ต้องบีบอัดซ้ำทุก request
+# - static asset ที่ผ่าน build_assets.py จะมีชื่อไฟล์ตาม hash ของเนื้อหา (static/dist/) พร้อมไฟล์ .br / .gz
+#   ที่บีบอัดไว้แล้ว ใช้ asset_url('js/app.js') ใน template แทน url_for('static', ...)
+#   และส่งพร้อม Cache-Control แบบ immutable อายุยาว (ชื่อไฟล์เปลี่ยนเมื่อเนื้อหาเปลี่ยน)
+import gzip
+import json
+import mimetypes
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import current_app, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError: # ไม่มี brotli: ใช้ gzip อย่างเดียว
+    brotli = None
+
+# ตำแหน่ง manifest ภายใน static folder (ต้องตรงกับ build_assets.py)
+ASSET_DIR = 'dist'
+MANIFEST_FILE = 'manifest.json'
+PRECOMPRESSED_SUFFIXES = (('br', '.br'), ('gzip', '.gz'))
+
+
+class ResponseCompressor:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._cache = OrderedDict() # (etag, encoding) -> bytes ที่บีบอัดแล้ว
+        self.manifest = {}
+        self._hashed_files = set()
+
+    def init_app(self, app):
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+        self.gzip_level = app.config.get('COMPRESS_GZIP_LEVEL', 6)
+        self.brotli_quality = app.config.get('COMPRESS_BROTLI_QUALITY', 5)
+        self.mimetypes = set(app.config.get('COMPRESS_MIMETYPES', ()))
+        self.cache_size = app.config.get('COMPRESS_CACHE_SIZE', 32)
+        self.asset_max_age = app.config.get('STATIC_ASSET_MAX_AGE', 31536000)
+        app.extensions['compressor'] = self
+
+        self.load_manifest(app.static_folder)
+        app.add_template_global(self.asset_url, 'asset_url')
+        if self._hashed_files and 'static' in app.view_functions:
+            self._static_view = app.view_functions['static']
+            app.view_functions['static'] = self._serve_static
+        if app.config.get('COMPRESS_ENABLED', True):
+            app.after_request(self._after_request)
+
+    # --- Static assets ---
+
+    def load_manifest(self, static_folder):
+        """อ่าน static/dist/manifest.json (ชื่อไฟล์เดิม -> ชื่อไฟล์ที่มี hash) ถ้ามีการ build ไว้"""
+        path = os.path.join(static_folder, ASSET_DIR, MANIFEST_FILE)
+        try:
+            with open(path, encoding='utf-8') as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+        except (OSError, ValueError) as e:
+            print(f"Error reading asset manifest {path}: {e}")
+            self.manifest = {}
+        self._hashed_files = set(self.manifest.values())
+
+    def asset_url(self, filename, **values):
+        """เหมือน url_for('static', filename=...) แต่ใช้ไฟล์ที่มี hash ถ้ามีใน manifest"""
+        return url_for('static', filename=self.manifest.get(filename, filename), **values)
+
+    def _serve_static(self, filename):
+        if filename not in self._hashed_files:
+            return self._static_view(filename=filename)
+
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        encoding, path = None, filename
+        for candidate, suffix in PRECOMPRESSED_SUFFIXES:
+            if self._accepts(candidate) and os.path.exists(os.path.join(current_app.static_folder, filename + suffix)):
+                encoding, path = candidate, filename + suffix
+                break
+        response = send_from_directory(current_app.static_folder, path, mimetype=mimetype, max_age=self.asset_max_age)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    # --- Dynamic responses ---
+
+    def _accepts(self, encoding):
+        if encoding == 'br' and brotli is None:
+            return False
+        return request.accept_encodings[encoding] > 0
+
+    def _negotiate(self):
+        br, gz = request.accept_encodings['br'], request.accept_encodings['gzip']
+        if brotli is not None and br > 0 and br >= gz:
+            return 'br'
+        if gz > 0:
+            return 'gzip'
+        return None
+
+    def _compressible(self, response):
+        if request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        if response.direct_passthrough or 'Content-Encoding' in response.headers:
+            return False
+        if 'no-transform' in response.headers.get('Cache-Control', ''):
+            return False
+        return response.mimetype in self.mimetypes
+
+    def _after_request(self, response):
+        if not self._compressible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self._negotiate()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            original = response.response
+            response.response = self._compress_stream(response.iter_encoded(), original, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < self.min_size:
+                return response
+            etag, weak = response.get_etag()
+            response.set_data(self._compress_cached(etag, encoding, body) if etag else self._compress(body, encoding))
+            if etag and not weak:
+                # representation เปลี่ยนจึงต้องเป็น weak ETag (If-None-Match ยังเทียบได้)
+                response.set_etag(etag, weak=True)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def _compress(self, body, encoding):
+        if encoding == 'br':
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    def _compress_cached(self, etag, encoding, body):
+        key = (etag, encoding)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        compressed = self._compress(body, encoding)
+        with self._lock:
+            self._cache[key] = compressed
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return compressed
+
+    def _compress_stream(self, chunks, original, encoding):
+        """บีบอัด response แบบ stream ทีละ chunk (flush ทุก chunk เพื่อให้ client ได้ข้อมูลทันที)"""
+        try:
+            if encoding == 'br':
+                compressor = brotli.Compressor(quality=self.brotli_quality)
+                for chunk in chunks:
+                    data = compressor.process(chunk) + compressor.flush()
+                    if data:
+                        yield data
+                yield compressor.finish()
+            else:
+                compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31) # 31 = gzip header
+                for chunk in chunks:
+                    data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                    if data:
+                        yield data
+                yield compressor.flush()
+        finally:
+            if hasattr(original, 'close'):
+                original.close()
+
+
+compressor = ResponseCompressor()
@@ -28,6 +28,7 @@
 #     )
 # /app/config.py
 import os
+import tempfile
 
 class Config:
     """Base configuration class."""
@@ -39,6 +40,99 @@ class Config:
     SECRET_KEY = os.getenv('FLASK_SECRET_KEY', 'default-secret-key-for-dev')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # ขนาดหน้าของ GET /api/<table>?limit= (keyset pagination)
+    API_PAGE_DEFAULT_LIMIT = int(os.getenv('API_PAGE_DEFAULT_LIMIT', 100))
+    API_PAGE_MAX_LIMIT = int(os.getenv('API_PAGE_MAX_LIMIT', 500))
+
+    # จำนวนแถวต่อ batch เมื่อ stream ข้อมูลจาก server-side cursor (yield_per)
+    STREAM_YIELD_PER = int(os.getenv('STREAM_YIELD_PER', 500))
+
+    # จำนวนบิลสูงสุดต่อ request ของ /api/save-transactions
+    SAVE_BATCH_MAX = int(os.getenv('SAVE_BATCH_MAX', 200))
+
+    # การตรวจราคา/ยอดรวมของบิลฝั่ง server (app/pricing.py): 'flag', 'enforce' หรือ 'off'
+    PRICE_CHECK_MODE = os.getenv('PRICE_CHECK_MODE', 'flag')
+    if PRICE_CHECK_MODE not in ('flag', 'enforce', 'off'):
+        raise ValueError(f"Configuration error: Unsupported PRICE_CHECK_MODE '{PRICE_CHECK_MODE}'. Use 'flag', 'enforce' or 'off'.")
+
+    # อายุสูงสุด (วินาที) ของ catalog ที่ cache ไว้ใน process สำหรับ /api/initial-data
+    CATALOG_CACHE_TTL = int(os.getenv('CATALOG_CACHE_TTL', 60))
+
+    # จำนวนแถวต่อ chunk (หนึ่ง round-trip) ตอน import CSV แบบ bulk upsert
+    IMPORT_CHUNK_SIZE = int(os.getenv('IMPORT_CHUNK_SIZE', 1000))
+    # ไฟล์ที่ใหญ่กว่านี้ (bytes) จะถูก import แบบ background ทีละ chunk
+    IMPORT_BACKGROUND_THRESHOLD = int(os.getenv('IMPORT_BACKGROUND_THRESHOLD', 5 * 1024 * 1024))
+    IMPORT_UPLOAD_FOLDER = os.getenv('IMPORT_UPLOAD_FOLDER', os.path.join(tempfile.gettempdir(), 'billing_imports'))
+    # จำนวนแถวที่ถูก reject สูงสุดที่จะเก็บรายละเอียดไว้ใน ImportJob
+    IMPORT_MAX_REJECTS = int(os.getenv('IMPORT_MAX_REJECTS', 1000))
+    # job ที่ไม่ได้บันทึกความคืบหน้านานกว่านี้ (วินาที) ถือว่า worker ที่รันอยู่หยุดไปแล้ว และจะถูก mark เป็น failed
+    IMPORT_HEARTBEAT_TIMEOUT = int(os.getenv('IMPORT_HEARTBEAT_TIMEOUT', 300))
+
+    # ลายเซ็น: ขนาดสูงสุดต่อไฟล์ (bytes หลัง decode) และ background writer
+    SIGNATURE_MAX_BYTES = int(os.getenv('SIGNATURE_MAX_BYTES', 256 * 1024))
+    # 0 = request รอจน writer เขียนไฟล์เสร็จ (ไม่เกิน SIGNATURE_WRITE_TIMEOUT วินาที)
+    SIGNATURE_ASYNC_WRITES = os.getenv('SIGNATURE_ASYNC_WRITES', '1') == '1'
+    SIGNATURE_WRITE_TIMEOUT = float(os.getenv('SIGNATURE_WRITE_TIMEOUT', 10))
+    SIGNATURE_WRITER_THREADS = int(os.getenv('SIGNATURE_WRITER_THREADS', 1))
+    # queue เต็มนานกว่า SIGNATURE_QUEUE_TIMEOUT วินาที: ตอบ 503 ให้ client ลองใหม่
+    SIGNATURE_QUEUE_SIZE = int(os.getenv('SIGNATURE_QUEUE_SIZE', 256))
+    SIGNATURE_QUEUE_TIMEOUT = float(os.getenv('SIGNATURE_QUEUE_TIMEOUT', 0.5))
+    # จำนวนไฟล์สูงสุดต่อชุดของ writer (fsync ของ directory ทำครั้งเดียวต่อชุด, ไฟล์ยัง fsync ทีละไฟล์)
+    SIGNATURE_FSYNC_BATCH = int(os.getenv('SIGNATURE_FSYNC_BATCH', 32))
+
+    # Audit log แบบ write-behind: flush เมื่อครบ AUDIT_BATCH_SIZE รายการหรือทุก AUDIT_FLUSH_INTERVAL วินาที
+    # AUDIT_SYNC=1 จะเขียนทันที (ใช้ตอนทดสอบ)
+    AUDIT_SYNC = os.getenv('AUDIT_SYNC', '0') == '1'
+    AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', 100))
+    AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', 2.0))
+    AUDIT_MAX_BUFFER = int(os.getenv('AUDIT_MAX_BUFFER', 10000))
+
+    # เก็บ snapshot เต็มของ TransactionVersion ทุกๆ กี่เวอร์ชัน (ระหว่างนั้นเก็บเป็น diff)
+    SNAPSHOT_KEYFRAME_INTERVAL = int(os.getenv('SNAPSHOT_KEYFRAME_INTERVAL', 10))
+
+    # Retention ของ log_entries (python archive_logs.py, ดู app/log_archive.py)
+    # log ที่เก่ากว่า LOG_RETENTION_DAYS วันถูกย้ายไปเป็นไฟล์ gzip รายเดือนใน LOG_ARCHIVE_DIR แล้วลบจากตารางทีละ batch
+    # LOG_ARCHIVE_PAUSE: หยุดพัก (วินาที) ระหว่าง batch ให้ query อื่น/replication ได้ทำงาน
+    LOG_RETENTION_DAYS = int(os.getenv('LOG_RETENTION_DAYS', 180))
+    LOG_ARCHIVE_DIR = os.getenv('LOG_ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'archive', 'logs'))
+    LOG_ARCHIVE_BATCH_SIZE = int(os.getenv('LOG_ARCHIVE_BATCH_SIZE', 1000))
+    LOG_ARCHIVE_PAUSE = float(os.getenv('LOG_ARCHIVE_PAUSE', 0.1))
+
+    # อายุ (วินาที) ของ User + Role ที่ cache ไว้ใน process สำหรับ load_user
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 60))
+
+    # JWT ของ File App (app/auth_tokens.py): อายุ access token / refresh token (วินาที)
+    # และรอบการโหลดรายชื่อ superadmin ที่ active + token ที่ถูกยกเลิกใหม่ (worker ที่ไม่ได้แก้ไขผู้ใช้เอง)
+    AUTH_ACCESS_TOKEN_TTL = int(os.getenv('AUTH_ACCESS_TOKEN_TTL', 900))
+    AUTH_REFRESH_TOKEN_TTL = int(os.getenv('AUTH_REFRESH_TOKEN_TTL', 86400))
+    AUTH_REVOCATION_TTL = int(os.getenv('AUTH_REVOCATION_TTL', 30))
+    # รอบการลบแถวใน revoked_tokens ที่ token หมดอายุแล้ว (วินาที, ต่อ worker)
+    AUTH_REVOCATION_PURGE_INTERVAL = int(os.getenv('AUTH_REVOCATION_PURGE_INTERVAL', 3600))
+    # secret ที่ service (File App) ต้องส่งใน header X-Client-Secret เพื่อเรียก /api/auth/introspect และ /api/auth/revoke
+    # ไม่ตั้ง = ปิดสอง endpoint นี้
+    AUTH_CLIENT_SECRET = os.getenv('AUTH_CLIENT_SECRET', '')
+    # bcrypt (app/passwords.py): จำนวน thread ต่อ worker, จำนวนงานที่รอคิวได้ และเวลารอสูงสุด (วินาที)
+    AUTH_BCRYPT_WORKERS = int(os.getenv('AUTH_BCRYPT_WORKERS', 2))
+    AUTH_BCRYPT_MAX_PENDING = int(os.getenv('AUTH_BCRYPT_MAX_PENDING', 16))
+    AUTH_BCRYPT_TIMEOUT = float(os.getenv('AUTH_BCRYPT_TIMEOUT', 10.0))
+
+    # JSON encoder ของ jsonify (app/json_provider.py): 'orjson' (ใช้ json ของ stdlib แทนถ้าไม่ได้ติดตั้ง) หรือ 'stdlib'
+    JSON_PROVIDER = os.getenv('JSON_PROVIDER', 'orjson')
+    if JSON_PROVIDER not in ('orjson', 'stdlib'):
+        raise ValueError(f"Configuration error: Unsupported JSON_PROVIDER '{JSON_PROVIDER}'. Use 'orjson' or 'stdlib'.")
+
+    # บีบอัด response (app/compression.py): brotli ถ้าติดตั้ง package brotli และ client รองรับ ไม่เช่นนั้น gzip
+    COMPRESS_ENABLED = os.getenv('COMPRESS_ENABLED', '1') == '1'
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_GZIP_LEVEL = int(os.getenv('COMPRESS_GZIP_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', 5))
+    COMPRESS_MIMETYPES = ['application/json', 'application/x-ndjson', 'text/csv', 'text/html', 'text/plain', 'text/css',
+                          'text/javascript', 'application/javascript']
+    # จำนวน response ที่มี ETag ซึ่งเก็บผลบีบอัดไว้ใช้ซ้ำ
+    COMPRESS_CACHE_SIZE = int(os.getenv('COMPRESS_CACHE_SIZE', 32))
+    # อายุ cache (วินาที) ของ static asset ที่มี hash ในชื่อไฟล์ (python build_assets.py)
+    STATIC_ASSET_MAX_AGE = int(os.getenv('STATIC_ASSET_MAX_AGE', 31536000))
+
     # Get DB settings from environment variables
     DB_USER = os.getenv('DB_USER')
     DB_PASSWORD = os.getenv('DB_PASSWORD')
@@ -51,7 +145,57 @@ class Config:
     if not all(var is not None for var in required_vars) or DB_PASSWORD is None:
         raise ValueError("Database configuration error: One of the required DB_* variables is missing in the .env file.")
 
+    # warm up ตอน worker เริ่ม (gunicorn post_fork, ดู app/lifecycle.py): เปิด connection ล่วงหน้ากี่ตัวและโหลด cache
+    WORKER_WARMUP = os.getenv('WORKER_WARMUP', '1') == '1'
+    DB_POOL_WARM_CONNECTIONS = int(os.getenv('DB_POOL_WARM_CONNECTIONS', 2))
+    # เวลาสูงสุด (วินาที) ที่ worker รอ background import ของตัวเองก่อนหยุด (gunicorn worker_exit)
+    # import ที่ยังไม่จบจะถูกหยุดและ mark failed: ต้องน้อยกว่า GUNICORN_GRACEFUL_TIMEOUT อย่างน้อย 5 วินาที
+    IMPORT_SHUTDOWN_TIMEOUT = int(os.getenv('IMPORT_SHUTDOWN_TIMEOUT', 20))
+
+    # Driver ของ MySQL: 'mysqlconnector' (ค่าเดิม) หรือ 'pymysql'
+    DB_DRIVER = os.getenv('DB_DRIVER', 'mysqlconnector')
+    if DB_DRIVER not in ('mysqlconnector', 'pymysql'):
+        raise ValueError(f"Database configuration error: Unsupported DB_DRIVER '{DB_DRIVER}'. Use 'mysqlconnector' or 'pymysql'.")
+
     # Create the Database URI for SQLAlchemy
     SQLALCHEMY_DATABASE_URI = (
-        f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4"
+        f"mysql+{DB_DRIVER}://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4"
     )
+
+    # Read replica (ไม่บังคับ, ดู app/replica.py): ตั้ง DB_REPLICA_HOST แล้ว endpoint ที่อ่านอย่างเดียวจะอ่านจาก replica
+    # ค่าที่ไม่ได้ตั้ง (user, password, port, ชื่อ database) ใช้ค่าเดียวกับ primary
+    # - REPLICA_STICKY_SECONDS: หลังผู้ใช้เขียนข้อมูล ให้อ่านจาก primary ต่ออีกกี่วินาที (read-your-writes)
+    # - REPLICA_CHECK_INTERVAL: replica ใช้ไม่ได้ → ใช้ primary นานเท่านี้ก่อนลองใหม่ / รอบการตรวจ lag
+    # - REPLICA_MAX_LAG: lag สูงสุด (วินาที) ที่ยอมรับ ตรวจจาก SHOW REPLICA STATUS (0 = ไม่ตรวจ)
+    # replica มี pool ของตัวเองตาม SQLALCHEMY_ENGINE_OPTIONS (connection ต่อ worker เพิ่มเป็นสองเท่า)
+    DB_REPLICA_HOST = os.getenv('DB_REPLICA_HOST', '')
+    SQLALCHEMY_BINDS = {}
+    if DB_REPLICA_HOST:
+        SQLALCHEMY_BINDS['replica'] = (
+            f"mysql+{DB_DRIVER}://{os.getenv('DB_REPLICA_USER') or DB_USER}:{os.getenv('DB_REPLICA_PASSWORD', DB_PASSWORD)}"
+            f"@{DB_REPLICA_HOST}:{os.getenv('DB_REPLICA_PORT') or DB_PORT}/{os.getenv('DB_REPLICA_NAME') or DB_NAME}?charset=utf8mb4"
+        )
+    REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+    REPLICA_CHECK_INTERVAL = int(os.getenv('REPLICA_CHECK_INTERVAL', 10))
+    REPLICA_MAX_LAG = int(os.getenv('REPLICA_MAX_LAG', 0))
+
+    # Connection pool (ต่อ worker process)
+    # - pool_recycle ต้องน้อยกว่า wait_timeout ของ MySQL เพื่อไม่ให้เจอ "MySQL server has gone away"
+    # - pool_pre_ping ตรวจ connection ก่อนใช้ (เสีย round-trip เล็กน้อยต่อ checkout)
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', '1') == '1',
+    }
+    # เก็บสถิติของ pool (checkout, เวลารอ, overflow) ดูได้ที่ /api/metrics/pool
+    DB_POOL_METRICS = os.getenv('DB_POOL_METRICS', '1') == '1'
+
+    # สถิติต่อ request (latency, SQL, DB time, ขนาด response) ในรูปแบบ Prometheus ที่ /api/metrics
+    # - METRICS_TOKEN: ถ้าตั้งไว้ scraper ต้องส่ง "Authorization: Bearer <token>" (ไม่ตั้ง = เฉพาะ Super Admin ที่ login)
+    # - METRICS_MULTIPROC_DIR: โฟลเดอร์ที่ทุก gunicorn worker เขียนสถิติไว้ให้รวมกันตอน scrape (ว่าง = เฉพาะ process เดียว)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+    METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR', '')
+    METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 5.0))
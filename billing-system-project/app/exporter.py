@@ -0,0 +1,214 @@
+# /app/exporter.py
+# Export transactions (แบบหัวบิล หรือแตกเป็นรายการสินค้า) และ log เป็น CSV / XLSX แบบ streaming
+# - อ่านด้วย query เดียว (JOIN) ผ่าน server-side cursor (stream_results + yield_per)
+#   จึงไม่ต้องโหลดทั้งช่วงวันที่เข้า memory และไม่สร้าง ORM object
+# - CSV ส่งออกทีละ batch ของแถว (UTF-8 พร้อม BOM ให้ Excel อ่านภาษาไทยถูก)
+# - XLSX เขียน zip แบบ stream เอง (worksheet ใช้ inline string) ใช้ memory คงที่ไม่ขึ้นกับจำนวนแถว
+import csv
+import io
+import re
+import zipfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from pytz import utc
+from sqlalchemy.orm import aliased
+
+from .extensions import db
+from .models import Transaction, TransactionItem, Item, Staff, User, LogEntry, LOCAL_TZ
+from .revenue import utc_bounds
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+TRANSACTION_HEADERS = [
+    'transaction_id', 'transaction_date', 'hn', 'patient_fname', 'patient_lname', 'patient_gender', 'patient_age',
+    'patient_type', 'doctor_id', 'doctor_name', 'consultant_id', 'consultant_name', 'total_amount', 'deposit_amount',
+    'outstanding_balance', 'payment_method', 'review_status', 'comment', 'created_by'
+]
+ITEM_HEADERS = ['item_code', 'item_name', 'quantity', 'price_per_unit', 'line_total']
+LOG_HEADERS = ['log_id', 'timestamp', 'username', 'action']
+
+
+# --- Queries ---
+
+def transaction_export_query(date_from, date_to, with_items=False):
+    """SELECT ของ transaction ในช่วงวันที่ (Asia/Bangkok) พร้อมชื่อแพทย์/ผู้สร้าง และรายการสินค้าถ้า with_items"""
+    doctor = aliased(Staff)
+    consultant = aliased(Staff)
+    columns = [
+        Transaction.transaction_id, Transaction.transaction_date, Transaction.hn, Transaction.patient_fname,
+        Transaction.patient_lname, Transaction.patient_gender, Transaction.patient_age, Transaction.patient_type,
+        Transaction.doctor_id, doctor.name_th, Transaction.consultant_id, consultant.name_th, Transaction.total_amount,
+        Transaction.deposit_amount, Transaction.outstanding_balance, Transaction.payment_method,
+        Transaction.review_status, Transaction.comment, User.full_name
+    ]
+    if with_items:
+        columns += [TransactionItem.item_code, Item.name_th, TransactionItem.quantity, TransactionItem.price_per_unit]
+
+    start, end = utc_bounds(date_from, date_to)
+    stmt = (db.select(*columns)
+            .outerjoin(doctor, doctor.staff_id == Transaction.doctor_id)
+            .outerjoin(consultant, consultant.staff_id == Transaction.consultant_id)
+            .outerjoin(User, User.user_id == Transaction.created_by_user_id)
+            .where(Transaction.transaction_date >= start, Transaction.transaction_date < end))
+    order = [Transaction.transaction_date, Transaction.transaction_id]
+    if with_items:
+        stmt = (stmt.outerjoin(TransactionItem, TransactionItem.transaction_id == Transaction.transaction_id)
+                .outerjoin(Item, Item.item_code == TransactionItem.item_code))
+        order.append(TransactionItem.transaction_item_id)
+    return stmt.order_by(*order)
+
+
+def log_export_query(date_from, date_to):
+    """SELECT ของ log ในช่วงวันที่ (timestamp ของ log เก็บเป็นเวลา Asia/Bangkok อยู่แล้ว)"""
+    start = datetime.combine(date_from, datetime.min.time())
+    end = datetime.combine(date_to + timedelta(days=1), datetime.min.time())
+    return (db.select(LogEntry.log_id, LogEntry.timestamp, User.username, LogEntry.action)
+            .outerjoin(User, User.user_id == LogEntry.user_id)
+            .where(LogEntry.timestamp >= start, LogEntry.timestamp < end)
+            .order_by(LogEntry.log_id))
+
+
+def stream_rows(stmt, batch_size, row_converter=None):
+    """อ่านผลลัพธ์ทีละ batch จาก server-side cursor คืน generator ของ list ของแถว"""
+    result = db.session.execute(stmt, execution_options={'stream_results': True, 'yield_per': batch_size})
+    try:
+        for partition in result.partitions():
+            yield [row_converter(row) if row_converter else list(row) for row in partition]
+    finally:
+        result.close()
+
+
+def transaction_row(row, with_items=False):
+    values = list(row)
+    values[1] = local_time(values[1])
+    if with_items:
+        quantity, price = values[-2], values[-1]
+        values.append(price * quantity if price is not None and quantity is not None else None)
+    return values
+
+
+def local_time(value):
+    """transaction_date (UTC) เป็นเวลา Asia/Bangkok แบบข้อความ"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = utc.localize(value)
+    return value.astimezone(LOCAL_TZ).strftime('%Y-%m-%d %H:%M:%S')
+
+
+# --- Writers ---
+
+def csv_chunks(headers, batches):
+    """แปลง batch ของแถวเป็นข้อความ CSV ทีละก้อน"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('﻿')
+    writer.writerow(headers)
+    for batch in batches:
+        writer.writerows([_csv_value(value) for value in row] for row in batch)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+class _ChunkSink:
+    """ปลายทางของ ZipFile ที่เก็บ bytes ไว้ให้ generator ดึงออกไป (ไม่มี seek/tell จึงเขียน zip แบบ stream)"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+_ILLEGAL_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+
+def xlsx_chunks(sheet_name, headers, batches):
+    """เขียนไฟล์ XLSX (sheet เดียว) แบบ stream คืน bytes ทีละก้อนหลังเขียนแต่ละ batch"""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _ROOT_RELS)
+        archive.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(sheet_name)}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ))
+        archive.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        yield sink.drain()
+
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+            sheet.write(_xlsx_row(headers))
+            for batch in batches:
+                sheet.write(b''.join(_xlsx_row(row) for row in batch))
+                yield sink.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
+
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        if value is None:
+            cells.append('<c/>')
+        elif isinstance(value, bool):
+            cells.append(f'<c t="b"><v>{int(value)}</v></c>')
+        elif isinstance(value, (int, float, Decimal)):
+            cells.append(f'<c><v>{value}</v></c>')
+        else:
+            if isinstance(value, datetime):
+                value = value.strftime('%Y-%m-%d %H:%M:%S')
+            text = escape(_ILLEGAL_XML_CHARS.sub('', str(value)))
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return ('<row>' + ''.join(cells) + '</row>').encode('utf-8')
+
+
+def export_chunks(export_format, sheet_name, headers, batches):
+    if export_format == 'xlsx':
+        return xlsx_chunks(sheet_name, headers, batches)
+    return csv_chunks(headers, batches)
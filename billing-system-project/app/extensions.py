@@ -2,7 +2,9 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
+from .replica import RoutingSession
 
-db = SQLAlchemy()
+# RoutingSession ส่ง SELECT ของ view ที่อ่านอย่างเดียวไปยัง read replica (ดู app/replica.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 bcrypt = Bcrypt()
 login_manager = LoginManager()
\ No newline at end of file
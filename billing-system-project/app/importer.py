@@ -0,0 +1,310 @@
+# /app/importer.py
+# Bulk upsert สำหรับหน้า Import CSV
+# แทนการวนทีละแถว (SELECT ต่อแถว + setattr) ด้วยการทำงานทีละ chunk:
+# - แปลงชนิดข้อมูลทั้ง column ครั้งเดียวด้วย pandas
+# - หา PK ที่มีอยู่แล้วด้วย query เดียวต่อ chunk (WHERE pk IN (...))
+# - เขียนด้วย executemany (MySQL ใช้ INSERT ... ON DUPLICATE KEY UPDATE)
+# และ import แบบ background สำหรับไฟล์ใหญ่ (อ่านทีละ chunk, commit ทีละ chunk, บันทึกความคืบหน้าใน ImportJob)
+# thread ของ import อยู่ใน worker process: ImportJob จึงเก็บ host/pid ของ worker และ heartbeat ที่อัปเดตทุก chunk
+# - worker ที่กำลังหยุดเรียก shutdown_import_jobs() เพื่อรอ job ของตัวเองหรือ mark เป็น failed
+# - job ที่ worker ตายไปโดยไม่ได้ mark (เช่น ถูก kill) จะถูก reap_stale_import_jobs() mark เป็น failed
+#   เมื่อ heartbeat เก่ากว่า IMPORT_HEARTBEAT_TIMEOUT และลบไฟล์ CSV ชั่วคราวใน IMPORT_UPLOAD_FOLDER
+import json
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta
+
+import pandas as pd
+from sqlalchemy import insert, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from flask import current_app
+
+from .extensions import db
+from .models import ImportJob
+from .catalog import catalog_cache
+
+
+def prepare_dataframe(df, pk_field, numeric_columns=()):
+    """
+    ทำความสะอาด DataFrame แบบ vectorized
+    - column ราคา: แปลงเป็นตัวเลข ถ้าแปลงไม่ได้ให้เป็น 0
+    - PK: ตัดแถวที่ไม่มี PK ทิ้ง, แปลงเป็น string, ถ้า PK ซ้ำในไฟล์ใช้แถวสุดท้าย
+    - ค่าว่าง (NaN) ใน column อื่นแปลงเป็น None
+    คืนค่า (DataFrame ที่พร้อมเขียน, list ของ index แถวที่ถูกข้ามเพราะไม่มี PK)
+    """
+    df = df.copy()
+    for col in numeric_columns:
+        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+
+    missing_pk = df[pk_field].isna()
+    skipped = df.index[missing_pk].tolist()
+    df = df[~missing_pk]
+    df[pk_field] = df[pk_field].astype(str).str.strip()
+    df = df.drop_duplicates(subset=pk_field, keep='last')
+
+    df = df.astype(object).where(df.notna(), None)
+    return df, skipped
+
+
+def bulk_upsert(Model, df, pk_field, chunk_size=1000):
+    """
+    Upsert ข้อมูลจาก DataFrame ลงตารางของ Model ทีละ chunk (ไม่ commit)
+    คืนค่า (added_count, updated_count)
+    """
+    table = Model.__table__
+    pk_column = table.c[pk_field]
+    update_columns = [c for c in df.columns if c != pk_field]
+    use_mysql_upsert = db.session.get_bind().dialect.name == 'mysql'
+
+    added_count = 0
+    updated_count = 0
+    records = df.to_dict('records')
+
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start:start + chunk_size]
+        keys = [row[pk_field] for row in chunk]
+        existing = set(db.session.scalars(db.select(pk_column).where(pk_column.in_(keys))))
+
+        if use_mysql_upsert:
+            stmt = mysql_insert(table)
+            if update_columns:
+                stmt = stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in update_columns})
+            else:
+                stmt = stmt.prefix_with('IGNORE')
+            db.session.execute(stmt, chunk)
+        else:
+            new_rows = [row for row in chunk if row[pk_field] not in existing]
+            old_rows = [row for row in chunk if row[pk_field] in existing]
+            if new_rows:
+                db.session.execute(insert(table), new_rows)
+            if old_rows and update_columns:
+                # ORM bulk UPDATE by primary key (executemany)
+                db.session.execute(update(Model), old_rows)
+
+        updated_count += len(existing)
+        added_count += len(chunk) - len(existing)
+
+    return added_count, updated_count
+
+
+# --- Background (chunked) import ---
+
+# thread ของ import ที่กำลังรันใน process นี้ (job_id -> Thread)
+_active_jobs = {}
+_active_lock = threading.Lock()
+# ตั้งตอน worker กำลังหยุด: job ที่ยังไม่จบจะหยุดก่อนเริ่ม chunk ถัดไป
+_stopping = threading.Event()
+# เวลา (วินาที) ที่รอให้ job หยุดหลังตั้ง _stopping ก่อนจะ mark failed แทน
+_STOP_GRACE = 5
+
+
+def _upload_path(app, job_id):
+    return os.path.join(app.config['IMPORT_UPLOAD_FOLDER'], f"{job_id}.csv")
+
+
+def start_import_job(app, file_storage, target_table, import_spec, user_id=None):
+    """
+    บันทึกไฟล์ที่อัปโหลดลง disk, สร้าง ImportJob แล้วเริ่ม thread สำหรับ import
+    คืนค่า job_id ให้หน้า import ใช้ poll สถานะ
+    """
+    os.makedirs(app.config['IMPORT_UPLOAD_FOLDER'], exist_ok=True)
+    job_id = uuid.uuid4().hex
+    path = _upload_path(app, job_id)
+    file_storage.save(path)
+
+    try:
+        job = ImportJob(
+            job_id=job_id,
+            target_table=target_table,
+            filename=file_storage.filename,
+            status='pending',
+            total_rows=_count_data_rows(path),
+            created_by_user_id=user_id,
+            worker_host=socket.gethostname(),
+            worker_pid=os.getpid(),
+            heartbeat_at=datetime.utcnow()
+        )
+        db.session.add(job)
+        db.session.commit()
+    except Exception:
+        _remove_file(path)
+        raise
+
+    thread = threading.Thread(
+        target=run_import_job,
+        args=(app, job_id, path, import_spec),
+        name=f"import-{job_id[:8]}",
+        daemon=True
+    )
+    with _active_lock:
+        _active_jobs[job_id] = thread
+    thread.start()
+    return job_id
+
+
+def run_import_job(app, job_id, path, import_spec):
+    """อ่าน CSV ทีละ chunk, upsert และ commit ทีละ chunk พร้อมอัปเดตความคืบหน้า"""
+    with app.app_context():
+        job = db.session.get(ImportJob, job_id)
+        job.status = 'running'
+        job.heartbeat_at = datetime.utcnow()
+        db.session.commit()
+
+        Model = import_spec['model']
+        pk_field = import_spec['pk_field']
+        numeric_columns = import_spec.get('numeric_columns', ())
+        chunk_size = app.config.get('IMPORT_CHUNK_SIZE', 1000)
+        max_rejects = app.config.get('IMPORT_MAX_REJECTS', 1000)
+
+        # เก็บตัวนับไว้นอก session เพราะ rollback ของ chunk ที่ล้มเหลวจะ expire ค่าใน job
+        progress = {'processed_rows': 0, 'added_count': 0, 'updated_count': 0, 'rejected_count': 0, 'chunks_done': 0}
+        rejects = []
+
+        def add_rejects(row_indexes, reason):
+            progress['rejected_count'] += len(row_indexes)
+            for index in row_indexes:
+                if len(rejects) >= max_rejects:
+                    break
+                # +2 = บรรทัด header + นับจาก 1
+                rejects.append({'row': int(index) + 2, 'reason': reason})
+
+        def save_progress(**fields):
+            job = db.session.get(ImportJob, job_id)
+            for key, value in {**progress, **fields}.items():
+                setattr(job, key, value)
+            job.heartbeat_at = datetime.utcnow()
+            job.rejects = json.dumps(rejects, ensure_ascii=False)
+            db.session.commit()
+
+        try:
+            reader = pd.read_csv(path, dtype={pk_field: str}, chunksize=chunk_size)
+            for chunk in reader:
+                if _stopping.is_set():
+                    save_progress(status='failed', finished_at=datetime.utcnow(),
+                                  error_message=f"Import interrupted after {progress['processed_rows']} rows because the worker "
+                                                "stopped. Rows already imported were kept; re-import the file to finish.")
+                    return
+                chunk.columns = chunk.columns.str.strip()
+                df, skipped_rows = prepare_dataframe(chunk, pk_field, numeric_columns)
+                add_rejects(skipped_rows, f"Primary key '{pk_field}' is missing.")
+                try:
+                    added, updated = bulk_upsert(Model, df, pk_field, chunk_size=chunk_size)
+                    db.session.commit()
+                    progress['added_count'] += added
+                    progress['updated_count'] += updated
+                except Exception as e:
+                    db.session.rollback()
+                    add_rejects(df.index.tolist(), f"Chunk failed: {getattr(e, 'orig', e)}")
+
+                progress['processed_rows'] += len(chunk)
+                progress['chunks_done'] += 1
+                save_progress()
+
+            save_progress(status='completed', finished_at=datetime.utcnow())
+        except Exception as e:
+            db.session.rollback()
+            traceback.print_exc()
+            save_progress(status='failed', error_message=str(e), finished_at=datetime.utcnow())
+        finally:
+            catalog_cache.invalidate()
+            db.session.remove()
+            _remove_file(path)
+            with _active_lock:
+                _active_jobs.pop(job_id, None)
+
+
+def shutdown_import_jobs(app, timeout):
+    """
+    เรียกตอน worker กำลังหยุด: รอ import ของ process นี้ให้จบภายใน timeout วินาที
+    job ที่ยังไม่จบจะหยุดก่อน chunk ถัดไป (chunk ที่ commit แล้วยังอยู่) และถูก mark เป็น failed
+    คืนค่าจำนวน job ที่ไม่ได้รันจนจบ
+    """
+    with _active_lock:
+        threads = dict(_active_jobs)
+    if not threads:
+        return 0
+
+    deadline = time.monotonic() + timeout
+    for thread in threads.values():
+        thread.join(max(0, deadline - time.monotonic()))
+    unfinished = [job_id for job_id, thread in threads.items() if thread.is_alive()]
+    if not unfinished:
+        return 0
+
+    _stopping.set()
+    deadline = time.monotonic() + _STOP_GRACE
+    for job_id in unfinished:
+        threads[job_id].join(max(0, deadline - time.monotonic()))
+
+    # thread ที่ยังค้างอยู่ใน chunk (เช่น query ช้า) จะตายไปพร้อม process: mark failed แทน
+    stuck = [job_id for job_id in unfinished if threads[job_id].is_alive()]
+    if stuck:
+        with app.app_context():
+            jobs = ImportJob.query.filter(ImportJob.job_id.in_(stuck), ImportJob.status.in_(('pending', 'running'))).all()
+            _fail_jobs(app, jobs, "Import interrupted because the worker stopped before the job finished. "
+                                  "Rows already imported were kept; re-import the file to finish.")
+            db.session.commit()
+            db.session.remove()
+    return len(unfinished)
+
+
+def reap_stale_import_jobs(job_id=None):
+    """
+    Mark job ที่ pending/running แต่ไม่ได้อัปเดต heartbeat นานกว่า IMPORT_HEARTBEAT_TIMEOUT เป็น failed
+    (worker ที่รันอยู่หยุดไปโดยไม่ได้ mark เอง) และลบไฟล์ CSV ชั่วคราวของ job นั้น
+    ระบุ job_id เพื่อตรวจเฉพาะ job เดียว (ใช้ตอน poll สถานะ) คืนค่าจำนวน job ที่ถูก mark
+    """
+    app = current_app._get_current_object()
+    cutoff = datetime.utcnow() - timedelta(seconds=app.config.get('IMPORT_HEARTBEAT_TIMEOUT', 300))
+    query = ImportJob.query.filter(ImportJob.status.in_(('pending', 'running')),
+                                   db.func.coalesce(ImportJob.heartbeat_at, ImportJob.created_at) < cutoff)
+    if job_id is not None:
+        query = query.filter(ImportJob.job_id == job_id)
+    with _active_lock:
+        # job ที่ thread ใน process นี้ยังรันอยู่ (chunk ช้า) ไม่ใช่ job ที่ค้าง
+        running_here = set(_active_jobs)
+    jobs = [job for job in query if job.job_id not in running_here]
+    if not jobs:
+        return 0
+
+    for job in jobs:
+        _fail_jobs(app, [job], f"Import stopped: worker {job.worker_host or '?'}:{job.worker_pid or '?'} "
+                               f"has not reported progress since {(job.heartbeat_at or job.created_at):%Y-%m-%d %H:%M:%S} UTC. "
+                               "Rows already imported were kept; re-import the file to finish.")
+    db.session.commit()
+    print(f"Marked {len(jobs)} stale import job(s) as failed.")
+    return len(jobs)
+
+
+def _fail_jobs(app, jobs, message):
+    """mark job เป็น failed (ไม่ commit) และลบไฟล์ชั่วคราวที่ยังค้างอยู่"""
+    now = datetime.utcnow()
+    for job in jobs:
+        job.status = 'failed'
+        job.error_message = message
+        job.finished_at = now
+        _remove_file(_upload_path(app, job.job_id))
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _count_data_rows(path):
+    """นับจำนวนบรรทัดข้อมูล (ไม่รวม header) แบบอ่านทีละ block เพื่อใช้แสดงเปอร์เซ็นต์"""
+    lines = 0
+    last_byte = b''
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            lines += block.count(b'\n')
+            last_byte = block[-1:]
+    if last_byte and last_byte != b'\n':
+        lines += 1
+    return max(lines - 1, 0)
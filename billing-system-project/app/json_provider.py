@@ -0,0 +1,75 @@
+# /app/json_provider.py
+# JSON provider ของ Flask (jsonify, current_app.json.dumps) ที่ใช้ orjson ถ้าติดตั้งไว้ ไม่เช่นนั้นใช้ json ของ stdlib
+# - Decimal -> number (float), datetime/date -> ISO 8601 ทั้งสองแบบ (ผลลัพธ์เหมือนกันไม่ว่าจะใช้ encoder ไหน)
+#   serializer จึงส่งค่า Numeric/DateTime จาก DB มาได้ตรงๆ ไม่ต้องแปลงเองทีละแถว
+# - ไม่ escape ภาษาไทยเป็น \uXXXX และไม่ sort key (payload เล็กลงและเร็วขึ้น)
+# - JSON_PROVIDER: 'orjson' (ค่าเริ่มต้น, ใช้ stdlib แทนถ้าไม่ได้ติดตั้ง) หรือ 'stdlib'
+import dataclasses
+import decimal
+import json
+import uuid
+from datetime import date, datetime, time
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError: # ไม่มี orjson: ใช้ json ของ stdlib
+    orjson = None
+
+
+def _default(o):
+    """แปลงค่าที่ encoder ไม่รู้จัก (orjson จัดการ datetime / date / uuid / dataclass เองอยู่แล้ว)"""
+    if isinstance(o, decimal.Decimal):
+        return float(o)
+    if isinstance(o, (datetime, date, time)):
+        return o.isoformat()
+    if isinstance(o, uuid.UUID):
+        return str(o)
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    if dataclasses.is_dataclass(o) and not isinstance(o, type):
+        return dataclasses.asdict(o)
+    if hasattr(o, '__html__'):
+        return str(o.__html__())
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    ensure_ascii = False
+    sort_keys = False
+
+    def __init__(self, app):
+        super().__init__(app)
+        self._orjson = orjson if app.config.get('JSON_PROVIDER', 'orjson') == 'orjson' else None
+
+    @property
+    def encoder(self):
+        return 'orjson' if self._orjson is not None else 'json'
+
+    def dumps_bytes(self, obj, pretty=False):
+        """serialize เป็น UTF-8 bytes (ไม่ต้อง decode/encode ซ้ำเมื่อใช้เป็น response body)"""
+        if self._orjson is not None:
+            option = self._orjson.OPT_NON_STR_KEYS
+            if pretty:
+                option |= self._orjson.OPT_INDENT_2
+            return self._orjson.dumps(obj, default=_default, option=option)
+        return json.dumps(obj, default=_default, ensure_ascii=False, indent=2 if pretty else None,
+                          separators=None if pretty else (',', ':')).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if kwargs: # มี option เฉพาะ (เช่น indent, sort_keys) ใช้ json ของ stdlib
+            kwargs.setdefault('default', _default)
+            kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+            return json.dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if self._orjson is not None and not kwargs:
+            return self._orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(self.dumps_bytes(obj, pretty=pretty), mimetype=self.mimetype)
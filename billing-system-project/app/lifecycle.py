@@ -0,0 +1,86 @@
+# /app/lifecycle.py
+# งานตอน worker process เริ่ม/หยุด (เรียกจาก gunicorn.conf.py)
+# - after_fork: ล้างสิ่งที่ copy มาจาก master เมื่อใช้ preload_app (connection ใน pool, thread, สถิติ)
+#   แล้ว warm up ให้ request แรกของ worker ไม่ต้องเปิด connection / โหลด catalog เอง
+# - before_exit: รอ background import ของ worker นี้ (หรือ mark failed ถ้าไม่จบใน IMPORT_SHUTDOWN_TIMEOUT)
+#   แล้ว flush audit log, ลายเซ็นที่ค้างใน queue และสถิติ ก่อน worker หยุด (เช่นครบ max_requests)
+import glob
+import os
+import time
+
+from .extensions import db
+from .audit import audit_logger
+from .signatures import signature_store
+from .request_metrics import request_metrics
+from .pool_metrics import pool_metrics
+from .catalog import catalog_cache
+from .pricing import price_engine
+from .user_cache import user_cache
+from .importer import shutdown_import_jobs, reap_stale_import_jobs
+
+
+def after_fork(app):
+    """เรียกใน worker ทันทีหลัง fork"""
+    with app.app_context():
+        # connection ที่ master เปิดไว้ใช้ร่วมกันข้าม process ไม่ได้: ทิ้งโดยไม่ปิด (master ยังถืออยู่)
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    audit_logger.after_fork()
+    signature_store.after_fork(app)
+    request_metrics.reset()
+    pool_metrics.reset()
+    if app.config.get('WORKER_WARMUP', True):
+        warm_up(app)
+
+
+def warm_up(app):
+    """เปิด connection ใน pool ล่วงหน้าและโหลด cache ใน process (catalog, ราคา, ผู้ใช้ + role)"""
+    start = time.perf_counter()
+    try:
+        with app.app_context():
+            connections = []
+            try:
+                for _ in range(app.config.get('DB_POOL_WARM_CONNECTIONS', 2)):
+                    connections.append(db.engine.connect())
+            finally:
+                for connection in connections:
+                    connection.close()
+            catalog_cache.get()
+            price_engine.prices()
+            users = user_cache.warm()
+            # job ของ worker ที่ตายไปก่อนหน้า (ถูก kill ก่อน before_exit) จะไม่ค้างเป็น running
+            reap_stale_import_jobs()
+            db.session.remove()
+        print(f"Worker {os.getpid()} warmed up in {time.perf_counter() - start:.2f}s "
+              f"({len(connections)} connections, {users} users).")
+    except Exception as e:
+        # warm up ไม่สำเร็จ (เช่น DB ยังไม่พร้อม) ไม่ควรทำให้ worker ล้ม: request แรกจะโหลดเอง
+        print(f"Worker {os.getpid()} warm-up failed: {e}")
+
+
+def before_exit(app):
+    """เรียกใน worker ก่อนออกจาก process"""
+    # thread ของ import เป็น daemon: ถ้าไม่รอ จะตายไปพร้อม process โดยที่ job ยังเป็น running
+    try:
+        unfinished = shutdown_import_jobs(app, app.config.get('IMPORT_SHUTDOWN_TIMEOUT', 20))
+        if unfinished:
+            print(f"Worker {os.getpid()} stopped {unfinished} unfinished import job(s) before exit.")
+    except Exception as e:
+        print(f"Error stopping import jobs before worker exit: {e}")
+    for name, flush in (('audit log', audit_logger.flush), ('signatures', signature_store.flush),
+                        ('metrics', request_metrics.flush)):
+        try:
+            flush()
+        except Exception as e:
+            print(f"Error flushing {name} before worker exit: {e}")
+
+
+def clear_metrics_dir(path):
+    """ลบไฟล์สถิติของรอบการรันก่อนหน้า (เรียกใน master ตอนเริ่ม ก่อนสร้าง worker)"""
+    if not path or not os.path.isdir(path):
+        return
+    for filename in glob.glob(os.path.join(path, 'metrics-*.json')):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
@@ -0,0 +1,202 @@
+# /app/log_archive.py
+# Retention ของ log_entries: ย้าย log ที่เก่ากว่า LOG_RETENTION_DAYS ไปเก็บเป็นไฟล์ แล้วลบออกจากตาราง
+# - ไฟล์ละเดือน: <LOG_ARCHIVE_DIR>/log_entries-YYYY-MM.ndjson.gz (หนึ่ง log ต่อบรรทัด, เดือนตาม timestamp ของ log)
+#   แต่ละ batch ต่อท้ายไฟล์เป็น gzip member ใหม่ (gzip อ่านต่อกันได้) จึงไม่ต้องเขียนไฟล์เดิมใหม่
+# - index.json: จำนวน log, ช่วงเวลา, ช่วง log_id และขนาดไฟล์ (bytes ที่ archive เสร็จแล้ว) ของแต่ละเดือน
+# - ลบออกจากตารางทีละ batch (LOG_ARCHIVE_BATCH_SIZE) แต่ละ batch เป็น transaction สั้นๆ จึงไม่ lock ตารางนาน
+# - ก่อนเขียนแต่ละ batch จะจดขนาดไฟล์เดิมไว้ใน index ('pending'): ถ้า process หยุดกลางทาง
+#   รอบถัดไปจะดูว่า DELETE ของ batch นั้น commit แล้วหรือยัง แล้วบันทึก batch นั้นให้ครบหรือตัดไฟล์กลับ (log ไม่ซ้ำและไม่หาย)
+import fcntl
+import gzip
+import io
+import json
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from flask import current_app
+from sqlalchemy import delete, func
+
+from .extensions import db
+from .models import LogEntry, User, LOCAL_TZ
+
+INDEX_FILE = 'index.json'
+LOCK_FILE = '.lock'
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def parse_month(month):
+    """'YYYY-MM' -> (วันแรกของเดือน, วันแรกของเดือนถัดไป) เป็น datetime แบบ naive ตามเวลาท้องถิ่น"""
+    try:
+        start = datetime.strptime(month, '%Y-%m')
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid month '{month}'. Use YYYY-MM.")
+    end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1)
+    return start, end
+
+
+def retention_cutoff(days):
+    """เที่ยงคืน (เวลาท้องถิ่น) ของวันที่เก่ากว่าวันนี้ days วัน: log ที่เก่ากว่านี้จะถูก archive"""
+    today = datetime.now(LOCAL_TZ).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=days)
+
+
+class LogArchive:
+    def __init__(self, folder):
+        self.folder = folder
+
+    def path(self, month):
+        return os.path.join(self.folder, f'log_entries-{month}.ndjson.gz')
+
+    def load_index(self):
+        try:
+            with open(os.path.join(self.folder, INDEX_FILE), encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'months': {}, 'pending': None}
+
+    def months(self):
+        """สรุปของทุกเดือนที่ archive แล้ว (ล่าสุดก่อน)"""
+        months = self.load_index()['months']
+        return [dict(months[month], month=month) for month in sorted(months, reverse=True)]
+
+    def read_month(self, month):
+        """log ทั้งหมดของเดือนใน archive เรียงตาม log_id (อ่านเฉพาะส่วนที่ archive เสร็จแล้วตาม index)"""
+        summary = self.load_index()['months'].get(month)
+        if summary is None:
+            return ()
+        return _read_archive_file(self.path(month), summary['size'])
+
+    # --- การ archive (เรียกจาก archive_logs.py ภายใน app context) ---
+
+    def archive(self, before, batch_size=1000, pause=0.0):
+        """ย้าย log ที่ timestamp < before ไปเก็บใน archive ทีละ batch คืนจำนวน log ที่ย้าย"""
+        os.makedirs(self.folder, exist_ok=True)
+        with open(os.path.join(self.folder, LOCK_FILE), 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise RuntimeError('Another log archive run is in progress.')
+            index = self.load_index()
+            self._recover(index)
+            total = 0
+            while True:
+                rows = db.session.execute(
+                    db.select(LogEntry.log_id, LogEntry.timestamp, LogEntry.user_id, User.username, LogEntry.action)
+                    .outerjoin(User, User.user_id == LogEntry.user_id)
+                    .where(LogEntry.timestamp < before)
+                    .order_by(LogEntry.log_id)
+                    .limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                self._archive_batch(index, before, rows)
+                total += len(rows)
+                if pause:
+                    time.sleep(pause)
+            return total
+
+    def _archive_batch(self, index, before, rows):
+        by_month = OrderedDict()
+        for log_id, timestamp, user_id, username, action in rows:
+            by_month.setdefault(timestamp.strftime('%Y-%m'), []).append({
+                'log_id': log_id, 'timestamp': timestamp.strftime(TIMESTAMP_FORMAT),
+                'user_id': user_id, 'user': username, 'action': action
+            })
+        # 1) จดตำแหน่งท้ายไฟล์ก่อนเขียน 2) เขียนไฟล์ 3) ลบจากตาราง 4) บันทึกสรุปลง index
+        index['pending'] = {
+            'before': before.isoformat(), 'min_id': rows[0].log_id, 'max_id': rows[-1].log_id,
+            'offsets': {month: self._size(month) for month in by_month},
+            'months': {month: _summarize(records) for month, records in by_month.items()}
+        }
+        self._save_index(index)
+        for month, records in by_month.items():
+            with open(self.path(month), 'ab') as f:
+                f.write(gzip.compress(''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records).encode('utf-8')))
+                f.flush()
+                os.fsync(f.fileno())
+        try:
+            db.session.execute(delete(LogEntry).where(LogEntry.log_id.in_([row.log_id for row in rows])))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            self._recover(index)
+            raise
+        self._finish(index)
+
+    def _recover(self, index):
+        """จัดการ batch ที่ค้างจากรอบก่อน (ดูคำอธิบายด้านบนของไฟล์)"""
+        pending = index.get('pending')
+        if not pending:
+            return
+        remaining = db.session.scalar(
+            db.select(func.count()).select_from(LogEntry)
+            .where(LogEntry.log_id.between(pending['min_id'], pending['max_id']),
+                   LogEntry.timestamp < datetime.fromisoformat(pending['before']))
+        )
+        if remaining == 0:
+            # DELETE commit แล้ว: ข้อมูลอยู่ในไฟล์ครบ เหลือแค่บันทึกสรุป
+            self._finish(index)
+            return
+        # DELETE ยังไม่ commit: ตัดส่วนที่ต่อท้ายออก แล้ว log ชุดนี้จะถูก archive ใหม่
+        for month, size in pending['offsets'].items():
+            if os.path.exists(self.path(month)):
+                with open(self.path(month), 'r+b') as f:
+                    f.truncate(size)
+        index['pending'] = None
+        self._save_index(index)
+
+    def _finish(self, index):
+        pending = index['pending']
+        for month, summary in pending['months'].items():
+            current = index['months'].get(month)
+            if current is None:
+                current = index['months'][month] = summary
+            else:
+                current['count'] += summary['count']
+                current['first'] = min(current['first'], summary['first'])
+                current['last'] = max(current['last'], summary['last'])
+                current['min_log_id'] = min(current['min_log_id'], summary['min_log_id'])
+                current['max_log_id'] = max(current['max_log_id'], summary['max_log_id'])
+            current['size'] = self._size(month)
+        index['pending'] = None
+        self._save_index(index)
+
+    def _size(self, month):
+        try:
+            return os.path.getsize(self.path(month))
+        except FileNotFoundError:
+            return 0
+
+    def _save_index(self, index):
+        # เขียนไฟล์ชั่วคราวแล้ว rename เพื่อไม่ให้ได้ index ที่เขียนไม่ครบ
+        path = os.path.join(self.folder, INDEX_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=1, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+
+def _summarize(records):
+    return {
+        'count': len(records),
+        'first': min(r['timestamp'] for r in records), 'last': max(r['timestamp'] for r in records),
+        'min_log_id': records[0]['log_id'], 'max_log_id': records[-1]['log_id']
+    }
+
+
+@lru_cache(maxsize=4)
+def _read_archive_file(path, size):
+    # cache ตามขนาดไฟล์: batch ใหม่ที่ต่อท้ายทำให้ขนาดใน index เปลี่ยนและอ่านใหม่เอง
+    with open(path, 'rb') as f:
+        data = gzip.decompress(f.read(size))
+    loads = current_app.json.loads
+    return tuple(loads(line) for line in io.BytesIO(data) if line.strip())
+
+
+def log_archive():
+    """LogArchive ของโฟลเดอร์ที่ตั้งไว้ใน LOG_ARCHIVE_DIR"""
+    return LogArchive(current_app.config['LOG_ARCHIVE_DIR'])
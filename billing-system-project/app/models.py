@@ -1,11 +1,15 @@
 # /app/models.py
 from .extensions import db, bcrypt
 from flask_login import UserMixin
+from sqlalchemy.orm import joinedload, selectinload
 from datetime import datetime
 from decimal import Decimal
-from pytz import timezone 
+from pytz import timezone, utc
 import json
 
+# สร้าง timezone ครั้งเดียว (ไม่ต้อง lookup ทุกแถวตอน serialize)
+LOCAL_TZ = timezone('Asia/Bangkok')
+
 class Role(db.Model):
     __tablename__ = 'roles'
     role_id = db.Column(db.Integer, primary_key=True)
@@ -115,6 +119,21 @@ class Transaction(db.Model):
     created_by_user = db.relationship('User')
     items = db.relationship('TransactionItem', backref='transaction', cascade="all, delete-orphan")
 
+    # index สำหรับหน้าค้นหา (GET /api/transactions/search) และ listing แบบ keyset
+    # index ที่ใช้กรองจะต่อท้ายด้วย transaction_date เพื่อให้เรียงตามวันที่ได้โดยไม่ต้อง sort เพิ่ม
+    # สร้างใน DB เดิมด้วย: python create_tables.py
+    __table_args__ = (
+        db.Index('ix_transactions_date', 'transaction_date', 'transaction_id'),
+        db.Index('ix_transactions_hn_date', 'hn', 'transaction_date'),
+        db.Index('ix_transactions_fname_lname', 'patient_fname', 'patient_lname'),
+        db.Index('ix_transactions_lname', 'patient_lname'),
+        db.Index('ix_transactions_doctor_date', 'doctor_id', 'transaction_date'),
+        db.Index('ix_transactions_consultant_date', 'consultant_id', 'transaction_date'),
+        db.Index('ix_transactions_type_date', 'patient_type', 'transaction_date'),
+        db.Index('ix_transactions_payment_date', 'payment_method', 'transaction_date'),
+        db.Index('ix_transactions_review_date', 'review_status', 'transaction_date'),
+    )
+
     def to_dict(self):
         products_list = []
         for ti in self.items:
@@ -127,7 +146,7 @@ class Transaction(db.Model):
 
         transaction_date_iso = None
         if self.transaction_date:
-            aware_datetime = self.transaction_date.replace(tzinfo=timezone('UTC')) if self.transaction_date.tzinfo is None else self.transaction_date.astimezone(timezone('UTC'))
+            aware_datetime = self.transaction_date.replace(tzinfo=utc) if self.transaction_date.tzinfo is None else self.transaction_date.astimezone(utc)
             transaction_date_iso = aware_datetime.isoformat()
 
         return {
@@ -182,12 +201,17 @@ class TransactionItem(db.Model):
     price_per_unit = db.Column(db.Numeric(10, 2), nullable=False)
     item = db.relationship('Item')
 
+    __table_args__ = (
+        db.Index('ix_transaction_items_transaction_item', 'transaction_id', 'item_code'),
+        db.Index('ix_transaction_items_item_transaction', 'item_code', 'transaction_id'),
+    )
+
 class LogEntry(db.Model):
     __tablename__ = 'log_entries'
     log_id = db.Column(db.Integer, primary_key=True)
     
     def current_time_bangkok():
-        return datetime.now(timezone('Asia/Bangkok'))
+        return datetime.now(LOCAL_TZ)
 
     timestamp = db.Column(db.DateTime, nullable=False, default=current_time_bangkok)
     user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=True)
@@ -202,6 +226,14 @@ class LogEntry(db.Model):
             "action": self.action
         }
     
+class RevokedToken(db.Model):
+    """JWT ของ File App ที่ถูกยกเลิกก่อนหมดอายุ เช่นตอน logout (ดู app/auth_tokens.py)"""
+    __tablename__ = 'revoked_tokens'
+    jti = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.user_id', ondelete='CASCADE'), nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True) # UTC: ลบทิ้งได้เมื่อ token หมดอายุแล้ว
+    revoked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
 class TransactionVersion(db.Model):
     __tablename__ = 'transaction_versions'
     version_id = db.Column(db.Integer, primary_key=True)
@@ -217,13 +249,127 @@ class TransactionVersion(db.Model):
 
     __table_args__ = (db.UniqueConstraint('transaction_id', 'version_number', name='_transaction_version_uc'),)
 
-    def to_dict(self):
+    def to_dict(self, snapshot=None):
+        # snapshot ที่ถูกเก็บแบบ diff ต้องสร้างจาก keyframe ก่อน (ดู app/snapshots.py)
+        if snapshot is None:
+            from .snapshots import reconstruct_version
+            snapshot = reconstruct_version(self.transaction_id, self.version_number)
         return {
             "version_id": self.version_id,
             "transaction_id": self.transaction_id,
             "version_number": self.version_number,
-            "created_at": self.created_at.replace(tzinfo=timezone('UTC')).astimezone(timezone('Asia/Bangkok')).strftime('%Y-%m-%d %H:%M:%S'),
+            "created_at": self.created_at.replace(tzinfo=utc).astimezone(LOCAL_TZ).strftime('%Y-%m-%d %H:%M:%S'),
             "created_by": self.created_by_user.username if self.created_by_user else "N/A",
             "change_reason": self.change_reason,
-            "snapshot": json.loads(self.transaction_snapshot)
-        }
\ No newline at end of file
+            "snapshot": snapshot
+        }
+
+
+class ImportJob(db.Model):
+    """สถานะของการ import CSV แบบ background (ทีละ chunk)"""
+    __tablename__ = 'import_jobs'
+    job_id = db.Column(db.String(36), primary_key=True)
+    target_table = db.Column(db.String(50), nullable=False)
+    filename = db.Column(db.String(255))
+    status = db.Column(db.String(20), nullable=False, default='pending') # pending, running, completed, failed
+    total_rows = db.Column(db.Integer, nullable=True) # ประมาณจากจำนวนบรรทัดในไฟล์
+    processed_rows = db.Column(db.Integer, nullable=False, default=0)
+    added_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_count = db.Column(db.Integer, nullable=False, default=0)
+    rejected_count = db.Column(db.Integer, nullable=False, default=0)
+    chunks_done = db.Column(db.Integer, nullable=False, default=0)
+    rejects = db.Column(db.Text, nullable=True) # JSON list ของ {"row": n, "reason": "..."} (เก็บไม่เกิน IMPORT_MAX_REJECTS)
+    error_message = db.Column(db.Text, nullable=True)
+    created_by_user_id = db.Column(db.Integer, db.ForeignKey('users.user_id'), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    # process ที่รัน import อยู่ และเวลาที่บันทึกความคืบหน้าล่าสุด (อัปเดตทุก chunk)
+    # job ที่ heartbeat เก่ากว่า IMPORT_HEARTBEAT_TIMEOUT ถือว่า worker ตายไปแล้ว (ดู importer.reap_stale_import_jobs)
+    worker_host = db.Column(db.String(255), nullable=True)
+    worker_pid = db.Column(db.Integer, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "target_table": self.target_table,
+            "filename": self.filename,
+            "status": self.status,
+            "total_rows": self.total_rows,
+            "processed_rows": self.processed_rows,
+            "added_count": self.added_count,
+            "updated_count": self.updated_count,
+            "rejected_count": self.rejected_count,
+            "chunks_done": self.chunks_done,
+            "rejects": json.loads(self.rejects) if self.rejects else [],
+            "error_message": self.error_message,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "heartbeat_at": self.heartbeat_at.isoformat() if self.heartbeat_at else None
+        }
+
+
+# --- Revenue summary tables ---
+# ยอดรวมรายวัน (ตามเวลา Asia/Bangkok) ที่อัปเดตแบบ incremental ทุกครั้งที่บันทึก/แก้ไข/ลบ transaction
+# (ดู app/revenue.py) เพื่อให้ report ไม่ต้อง scan transactions / transaction_items
+# ค่า NULL ของ doctor_id / patient_type / payment_method เก็บเป็น '' เพราะเป็นส่วนหนึ่งของ primary key
+# สร้างใหม่ทั้งหมดได้ด้วย: python rebuild_revenue_summary.py
+
+class RevenueDailyDoctor(db.Model):
+    __tablename__ = 'revenue_daily_doctor'
+    day = db.Column(db.Date, primary_key=True)
+    doctor_id = db.Column(db.String(50), primary_key=True)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    deposit_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    outstanding_balance = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+class RevenueDailyItem(db.Model):
+    __tablename__ = 'revenue_daily_item'
+    day = db.Column(db.Date, primary_key=True)
+    item_code = db.Column(db.String(50), primary_key=True)
+    line_count = db.Column(db.Integer, nullable=False, default=0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+class RevenueDailyPayment(db.Model):
+    __tablename__ = 'revenue_daily_payment'
+    day = db.Column(db.Date, primary_key=True)
+    patient_type = db.Column(db.String(50), primary_key=True)
+    payment_method = db.Column(db.String(50), primary_key=True)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    deposit_amount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    outstanding_balance = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+
+# --- Loader strategies ---
+# ชุด option สำหรับ eager-load ความสัมพันธ์ที่ serializer แต่ละตัวเข้าถึง
+# ใช้กับ query เช่น Transaction.query.options(*TRANSACTION_TO_DICT_LOADERS)
+# เพื่อให้จำนวน SQL คงที่ (ไม่เกิด N+1) ไม่ว่าจะมีกี่แถว
+# - many-to-one (doctor, consultant, user, role) ใช้ joinedload → JOIN ใน query เดียว
+# - one-to-many (items) ใช้ selectinload → query เพิ่ม 1 ครั้งแบบ WHERE ... IN (...)
+
+# สำหรับ Transaction.to_dict()
+TRANSACTION_TO_DICT_LOADERS = (
+    selectinload(Transaction.items).joinedload(TransactionItem.item),
+    joinedload(Transaction.doctor),
+    joinedload(Transaction.consultant),
+    joinedload(Transaction.created_by_user),
+)
+
+# สำหรับ Transaction.to_dict_for_crud()
+TRANSACTION_CRUD_LOADERS = (
+    joinedload(Transaction.doctor),
+    joinedload(Transaction.consultant),
+    joinedload(Transaction.created_by_user),
+)
+
+# สำหรับ User.to_dict_for_crud()
+USER_CRUD_LOADERS = (joinedload(User.role),)
+
+# สำหรับ LogEntry.to_dict_for_crud()
+LOG_ENTRY_CRUD_LOADERS = (joinedload(LogEntry.user),)
+
+# สำหรับ TransactionVersion.to_dict()
+TRANSACTION_VERSION_LOADERS = (joinedload(TransactionVersion.created_by_user),)
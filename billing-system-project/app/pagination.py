@@ -0,0 +1,148 @@
+# /app/pagination.py
+# Keyset (cursor) pagination สำหรับ endpoint แบบ listing เช่น GET /api/<table>
+# แทนที่จะใช้ OFFSET (ซึ่งช้าลงเรื่อยๆ ตามจำนวนแถว) เราจำค่า (sort_value, pk)
+# ของแถวสุดท้ายในหน้าไว้ใน cursor แล้วใช้ WHERE เพื่อ seek ไปยังหน้าถัดไปผ่าน index
+import base64
+import json
+from datetime import datetime, date, timezone
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import Select, and_, or_
+from .extensions import db
+
+
+class PaginationError(ValueError):
+    """พารามิเตอร์ pagination/sort/filter ไม่ถูกต้อง (ตอบกลับเป็น 400)"""
+
+
+def encode_cursor(values):
+    """แปลง list ของค่า (sort_value, pk) ให้เป็น cursor string แบบ opaque"""
+    payload = json.dumps([_to_jsonable(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """แปลง cursor string กลับเป็น list ของค่า (ยังไม่ได้แปลงชนิดตาม column)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except (ValueError, TypeError):
+        raise PaginationError('Invalid cursor.')
+    if not isinstance(values, list):
+        raise PaginationError('Invalid cursor.')
+    return values
+
+
+def coerce_value(column, raw):
+    """แปลงค่าจาก query string/cursor ให้ตรงกับชนิดของ column"""
+    if raw is None:
+        return None
+    column_type = column.type
+    try:
+        if isinstance(column_type, db.DateTime):
+            value = raw if isinstance(raw, datetime) else datetime.fromisoformat(str(raw).replace('Z', '+00:00'))
+            # column เก็บเวลา UTC แบบ naive: ค่าที่ระบุ offset มาต้องแปลงเป็น UTC ก่อน ค่าที่ไม่มี offset ใช้ตามเดิม
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            return value
+        if isinstance(column_type, db.Date):
+            return raw if isinstance(raw, date) else date.fromisoformat(str(raw))
+        if isinstance(column_type, db.Integer):
+            return int(raw)
+        if isinstance(column_type, db.Numeric):
+            return Decimal(str(raw))
+    except (ValueError, InvalidOperation):
+        raise PaginationError(f"Invalid value '{raw}' for column '{column.key}'.")
+    return str(raw)
+
+
+def parse_sort(sort_param, sortable, default_sort):
+    """
+    รับค่า ?sort=col หรือ ?sort=-col (เรียงจากมากไปน้อย)
+    คืนค่า (ชื่อ column, descending)
+    """
+    sort_param = sort_param or default_sort
+    descending = sort_param.startswith('-')
+    column_name = sort_param.lstrip('-')
+    if column_name not in sortable:
+        raise PaginationError(f"Cannot sort by '{column_name}'. Allowed: {', '.join(sortable)}.")
+    return column_name, descending
+
+
+def apply_filters(query, Model, filters, args):
+    """
+    ใช้ filter ที่ประกาศไว้ใน MODEL_MAP กับ query
+    ชนิดของ filter: 'eq' (?col=v), 'prefix' (?col=abc → LIKE 'abc%'),
+    'contains' (?col=abc → LIKE '%abc%'), 'range' (?col_from=..&col_to=..)
+    """
+    for name, kind in filters.items():
+        column = getattr(Model, name)
+        if kind == 'range':
+            lower = args.get(f'{name}_from')
+            upper = args.get(f'{name}_to')
+            if lower:
+                query = query.filter(column >= coerce_value(column, lower))
+            if upper:
+                query = query.filter(column <= coerce_value(column, upper))
+            continue
+
+        raw = args.get(name)
+        if raw is None or raw == '':
+            continue
+        if kind == 'eq':
+            query = query.filter(column == coerce_value(column, raw))
+        elif kind == 'prefix':
+            query = query.filter(column.startswith(raw, autoescape=True))
+        elif kind == 'contains':
+            query = query.filter(column.contains(raw, autoescape=True))
+    return query
+
+
+def keyset_page(query, Model, sort_name, pk_name, descending, limit, after=None):
+    """
+    ดึงข้อมูลหนึ่งหน้าโดยใช้ keyset pagination
+    เรียงตาม (sort column, pk) เพื่อให้ลำดับคงที่แม้ sort column จะมีค่าซ้ำกัน
+    คืนค่า (records, next_cursor) โดย next_cursor เป็น None เมื่อถึงหน้าสุดท้าย
+    """
+    sort_col = getattr(Model, sort_name)
+    pk_col = getattr(Model, pk_name)
+    same_column = sort_name == pk_name
+
+    if after:
+        values = decode_cursor(after)
+        if len(values) != (1 if same_column else 2):
+            raise PaginationError('Invalid cursor.')
+        last_sort = coerce_value(sort_col, values[0])
+        if same_column:
+            query = query.filter(sort_col < last_sort if descending else sort_col > last_sort)
+        else:
+            last_pk = coerce_value(pk_col, values[1])
+            if descending:
+                query = query.filter(or_(sort_col < last_sort, and_(sort_col == last_sort, pk_col < last_pk)))
+            else:
+                query = query.filter(or_(sort_col > last_sort, and_(sort_col == last_sort, pk_col > last_pk)))
+
+    if same_column:
+        order = [sort_col.desc() if descending else sort_col.asc()]
+    else:
+        order = [sort_col.desc(), pk_col.desc()] if descending else [sort_col.asc(), pk_col.asc()]
+
+    # ดึงเกินมา 1 แถวเพื่อรู้ว่ายังมีหน้าถัดไปหรือไม่ โดยไม่ต้อง COUNT(*)
+    # query เป็นได้ทั้ง Model.query (คืน ORM object) หรือ Core select() ที่มี column key ตามชื่อ attribute (คืน row)
+    page = query.order_by(*order).limit(limit + 1)
+    records = db.session.execute(page).all() if isinstance(page, Select) else page.all()
+    next_cursor = None
+    if len(records) > limit:
+        records = records[:limit]
+        last = records[-1]
+        key = [getattr(last, sort_name)] if same_column else [getattr(last, sort_name), getattr(last, pk_name)]
+        next_cursor = encode_cursor(key)
+    return records, next_cursor
+
+
+def _to_jsonable(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
@@ -0,0 +1,67 @@
+# /app/passwords.py
+# ตรวจ/สร้าง bcrypt hash ใน thread pool ขนาดเล็กของแต่ละ worker process (AUTH_BCRYPT_WORKERS)
+# - bcrypt ใช้ CPU ราว 0.1-0.3 วินาทีต่อครั้ง (ปล่อย GIL ระหว่างคำนวณ) ถ้าให้ทุก request thread ทำเองพร้อมกัน
+#   login หลายคนพร้อมกันจะกิน CPU ของ worker ทั้งหมดและทำให้ request อื่นช้าไปด้วย
+# - จำกัดจำนวนงานที่รอคิวและกำลังทำ (AUTH_BCRYPT_MAX_PENDING): เกินแล้วตอบ 503 ทันทีแทนการค้างรอ
+#   request ที่รอเกิน AUTH_BCRYPT_TIMEOUT ได้ 503 แต่งานนั้นยังนับรวมจนกว่า bcrypt จะทำเสร็จ
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .extensions import bcrypt
+
+
+class PasswordHasherBusy(Exception):
+    """คิวของ bcrypt เต็ม (ตอบกลับเป็น 503 ให้ client ลองใหม่)"""
+
+
+class PasswordHasher:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+        self.workers = 2
+        self.max_pending = 16
+        self.timeout = 10.0
+
+    def init_app(self, app):
+        self.workers = app.config.get('AUTH_BCRYPT_WORKERS', 2)
+        self.max_pending = app.config.get('AUTH_BCRYPT_MAX_PENDING', 16)
+        self.timeout = app.config.get('AUTH_BCRYPT_TIMEOUT', 10.0)
+        app.extensions['password_hasher'] = self
+
+    def check(self, password_hash, password):
+        return self._run(bcrypt.check_password_hash, password_hash, password)
+
+    def generate(self, password):
+        return self._run(bcrypt.generate_password_hash, password).decode('utf-8')
+
+    def _run(self, fn, *args):
+        with self._lock:
+            # สร้าง pool ใหม่ใน process ลูกหลัง fork (thread และงานค้างของ master ไม่ตามมาด้วย)
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='bcrypt')
+                self._pid = os.getpid()
+                self._pending = 0
+            if self._pending >= self.max_pending:
+                raise PasswordHasherBusy('Too many concurrent sign-ins, please retry.')
+            self._pending += 1
+            executor = self._executor
+        try:
+            future = executor.submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        # คืนช่องเมื่อ bcrypt ทำเสร็จจริง (ไม่ใช่ตอน request เลิกรอ) งานที่ timeout แล้วยังนับรวมจนกว่าจะจบ
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise PasswordHasherBusy('Sign-in is taking too long, please retry.')
+
+    def _release(self, future=None):
+        with self._lock:
+            self._pending -= 1
+
+password_hasher = PasswordHasher()
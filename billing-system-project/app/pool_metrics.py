@@ -0,0 +1,133 @@
+# /app/pool_metrics.py
+# สถิติของ SQLAlchemy connection pool ต่อ worker process
+# ใช้ประกอบการตั้งค่า DB_POOL_SIZE / DB_MAX_OVERFLOW จากการใช้งานจริง:
+# จำนวน checkout, เวลาที่ต้องรอ connection, จำนวนครั้งที่ใช้ overflow และ timeout
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool ที่จับเวลาการรอ connection (SQLAlchemy ไม่มี event ก่อน checkout)"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.record_timeout()
+            raise
+        finally:
+            pool_metrics.record_wait(time.perf_counter() - start)
+
+
+class PoolMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engines = []
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkins = 0
+            self.connects = 0
+            self.invalidations = 0
+            self.timeouts = 0
+            self.overflow_checkouts = 0
+            self.wait_seconds_total = 0.0
+            self.wait_seconds_max = 0.0
+
+    def init_app(self, app):
+        """
+        เรียกก่อน db.init_app(): ตั้ง poolclass ให้เป็น InstrumentedQueuePool
+        แล้วผูก event ของ pool หลังจาก engine ถูกสร้าง
+        """
+        if not app.config.get('DB_POOL_METRICS', True):
+            return
+        options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+        uri = app.config.get('SQLALCHEMY_DATABASE_URI') or ''
+        # SQLite in-memory ใช้ StaticPool/SingletonThreadPool จึงไม่เปลี่ยน poolclass
+        if 'poolclass' not in options and ':memory:' not in uri and uri != 'sqlite://':
+            options['poolclass'] = InstrumentedQueuePool
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+        app.extensions['pool_metrics'] = self
+
+    def attach(self, engine):
+        """ผูก event listener กับ pool ของ engine (เรียกภายใน app context หลัง db.init_app)"""
+        if engine in self._engines:
+            return
+        self._engines.append(engine)
+        event.listen(engine, 'connect', self._on_connect)
+        event.listen(engine, 'checkout', lambda *args: self._on_checkout(engine.pool))
+        event.listen(engine, 'checkin', self._on_checkin)
+        event.listen(engine, 'invalidate', self._on_invalidate)
+
+    def is_attached(self):
+        return bool(self._engines)
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.wait_seconds_total += seconds
+            if seconds > self.wait_seconds_max:
+                self.wait_seconds_max = seconds
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        """สถิติสะสมของ process นี้ + สถานะปัจจุบันของแต่ละ pool"""
+        with self._lock:
+            data = {
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'connects': self.connects,
+                'invalidations': self.invalidations,
+                'timeouts': self.timeouts,
+                'overflow_checkouts': self.overflow_checkouts,
+                'wait_seconds_total': round(self.wait_seconds_total, 6),
+                'wait_seconds_max': round(self.wait_seconds_max, 6),
+                'wait_seconds_avg': round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+            }
+        data['pools'] = [_pool_status(engine) for engine in self._engines]
+        return data
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, pool):
+        with self._lock:
+            self.checkouts += 1
+            # connection ที่ใช้อยู่เกิน pool_size แปลว่ากำลังใช้ overflow
+            if isinstance(pool, QueuePool) and pool.checkedout() > pool.size():
+                self.overflow_checkouts += 1
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checkins += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+
+def _pool_status(engine):
+    pool = engine.pool
+    status = {'url': engine.url.render_as_string(hide_password=True), 'pool_class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': pool.overflow(),
+            'max_overflow': pool._max_overflow,
+        })
+    return status
+
+
+pool_metrics = PoolMetrics()
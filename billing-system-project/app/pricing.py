@@ -0,0 +1,152 @@
+# /app/pricing.py
+# ตรวจราคาและยอดรวมของบิลฝั่ง server (frontend เป็นผู้คำนวณ price / total แล้วส่งมา)
+# - เก็บตารางราคา item_code -> ราคาต่อประเภทผู้ป่วย (Decimal) ไว้ใน memory ของแต่ละ process
+#   โหลดใหม่เมื่อ catalog_cache.version เปลี่ยน (แก้ไข/import items) หรืออายุเกิน CATALOG_CACHE_TTL
+# - คำนวณยอดทั้งตะกร้าด้วย Decimal โดยไม่ query DB ต่อรายการ
+# - PRICE_CHECK_MODE: 'flag' (บันทึกตามที่ส่งมา แต่รายงานและ log รายการที่ไม่ตรง),
+#   'enforce' (ปฏิเสธบิลที่ไม่ตรง) หรือ 'off'
+import threading
+import time
+from decimal import Decimal, InvalidOperation
+
+from flask import current_app
+from .extensions import db
+from .models import Item
+from .catalog import catalog_cache
+
+CENT = Decimal('0.01')
+# ลำดับเดียวกับ column ราคาใน Item และค่า patientType ของหน้า billing
+PATIENT_TYPES = ('opd', 'ipd', 'foreign_opd', 'foreign_ipd', 'staff')
+PRICE_COLUMNS = (Item.price_opd, Item.price_ipd, Item.price_foreign_opd, Item.price_foreign_ipd, Item.price_staff)
+_TYPE_INDEX = {patient_type: index for index, patient_type in enumerate(PATIENT_TYPES)}
+
+
+def to_money(value):
+    """แปลงค่าจาก client (float/str) เป็น Decimal 2 ตำแหน่ง, None ถ้าแปลงไม่ได้"""
+    if value is None or value == '':
+        return None
+    try:
+        return Decimal(str(value)).quantize(CENT)
+    except (InvalidOperation, ValueError):
+        return None
+
+
+class PriceCheck:
+    """ผลการตรวจบิลหนึ่งใบ"""
+
+    def __init__(self, total, lines, mismatches):
+        self.total = total
+        self.lines = lines
+        self.mismatches = mismatches
+
+    @property
+    def ok(self):
+        return not self.mismatches
+
+    def to_dict(self):
+        return {
+            'ok': self.ok,
+            'total': float(self.total),
+            'lines': [{**line, 'unit_price': float(line['unit_price']), 'line_total': float(line['line_total'])} for line in self.lines],
+            'mismatches': self.mismatches
+        }
+
+
+class PriceEngine:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._prices = None # item_code -> tuple ของราคาตาม PATIENT_TYPES
+        self._version = None
+        self._loaded_at = 0.0
+
+    def prices(self):
+        """ตารางราคาปัจจุบัน (โหลดใหม่ถ้า catalog เปลี่ยนหรือหมดอายุ)"""
+        ttl = current_app.config.get('CATALOG_CACHE_TTL', 60)
+        with self._lock:
+            stale = self._prices is None or self._version != catalog_cache.version
+            if stale or (ttl is not None and time.monotonic() - self._loaded_at > ttl):
+                version = catalog_cache.version
+                rows = db.session.execute(db.select(Item.item_code, *PRICE_COLUMNS)).all()
+                self._prices = {
+                    row[0]: tuple(Decimal(price or 0).quantize(CENT) for price in row[1:])
+                    for row in rows
+                }
+                self._version = version
+                self._loaded_at = time.monotonic()
+            return self._prices
+
+    def price_cart(self, patient_type, cart):
+        """
+        คำนวณราคาของตะกร้า cart = list ของ (item_code, quantity, client_unit_price)
+        ราคาใน catalog ที่เป็น 0 ถือเป็นรายการราคาเปิด (ใช้ราคาที่ส่งมา)
+        client_unit_price เป็น None ได้ถ้าต้องการแค่ราคาจาก catalog
+        """
+        prices = self.prices()
+        type_key = (patient_type or '').lower()
+        type_index = _TYPE_INDEX.get(type_key)
+        mismatches = []
+        if type_index is None:
+            mismatches.append({'field': 'type', 'message': f"Unknown patient type '{patient_type}'."})
+
+        lines = []
+        total = Decimal('0.00')
+        for item_code, quantity, client_price in cart:
+            client_price = to_money(client_price)
+            item_prices = prices.get(item_code)
+            if item_prices is None:
+                mismatches.append({'item_code': item_code, 'message': 'Item not found in catalog.'})
+                unit_price = client_price or Decimal('0.00')
+            elif type_index is None:
+                unit_price = client_price or Decimal('0.00')
+            else:
+                unit_price = item_prices[type_index]
+                if client_price is None:
+                    pass # ขอราคาอย่างเดียว (เช่น /api/price-quote)
+                elif unit_price == 0:
+                    unit_price = client_price
+                elif client_price != unit_price:
+                    mismatches.append({
+                        'item_code': item_code,
+                        'message': f"Price {client_price} does not match catalog price {unit_price} for '{type_key}'.",
+                        'expected': float(unit_price),
+                        'received': float(client_price)
+                    })
+            line_total = unit_price * quantity
+            total += line_total
+            lines.append({'item_code': item_code, 'quantity': quantity, 'unit_price': unit_price, 'line_total': line_total})
+        return PriceCheck(total, lines, mismatches)
+
+    def check_transaction(self, transaction, items):
+        """ตรวจราคาต่อรายการ, ยอดรวม และยอดค้างชำระของ Transaction ที่ยังไม่ได้บันทึก"""
+        check = self.price_cart(
+            transaction.patient_type,
+            [(ti.item_code, int(ti.quantity or 0), ti.price_per_unit) for ti in items]
+        )
+        total = to_money(transaction.total_amount)
+        if total != check.total:
+            check.mismatches.append({'field': 'total', 'message': f"Total {total} does not match computed total {check.total}.",
+                                     'expected': float(check.total), 'received': float(total) if total is not None else None})
+        deposit = to_money(transaction.deposit_amount) or Decimal('0.00')
+        outstanding = to_money(transaction.outstanding_balance)
+        if total is not None and outstanding != total - deposit:
+            check.mismatches.append({'field': 'outstanding_balance',
+                                     'message': f"Outstanding balance {outstanding} does not equal total minus deposit ({total - deposit})."})
+        return check
+
+
+def price_check_mode():
+    return current_app.config.get('PRICE_CHECK_MODE', 'flag')
+
+
+def check_bill(transaction, items):
+    """ตรวจบิลตาม PRICE_CHECK_MODE คืนค่า PriceCheck หรือ None ถ้าปิดการตรวจ"""
+    if price_check_mode() == 'off':
+        return None
+    return price_engine.check_transaction(transaction, items)
+
+
+def describe_mismatches(check):
+    return '; '.join(m['message'] if 'item_code' not in m else f"{m['item_code']}: {m['message']}" for m in check.mismatches)
+
+
+price_engine = PriceEngine()
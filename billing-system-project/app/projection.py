@@ -0,0 +1,139 @@
+# /app/projection.py
+# Sparse fields สำหรับ GET /api/<table>?fields=a,b,c
+# สร้าง Core select() เฉพาะ column ที่ขอ (JOIN ตารางที่เกี่ยวข้องเฉพาะเมื่อขอ field ที่ต้องใช้)
+# แล้วแปลง row tuple เป็น dict ตรงๆ โดยไม่สร้าง ORM object
+# ชื่อ field และรูปแบบค่าเหมือนกับ to_dict_for_crud() ของแต่ละ model
+from sqlalchemy.orm import aliased
+
+from .extensions import db
+from .models import Item, Staff, User, Role, Transaction, LogEntry
+from .pagination import PaginationError
+
+
+class Field:
+    """field หนึ่งตัวของผลลัพธ์: column ที่ต้อง select, ชื่อ JOIN ที่ต้องใช้ และฟังก์ชันแปลงค่า (รับค่าตามลำดับ column)"""
+
+    def __init__(self, *columns, join=None, convert=None):
+        self.columns = columns
+        self.join = join
+        self.convert = convert
+
+
+def _default(value_if_none):
+    return lambda value: value_if_none if value is None else value
+
+
+def _money(value):
+    return value if value is not None else 0.0
+
+
+def _columns(Model):
+    return {c.key: Field(getattr(Model, c.key)) for c in Model.__table__.columns}
+
+
+Doctor = aliased(Staff, name='doctor')
+Consultant = aliased(Staff, name='consultant')
+Creator = aliased(User, name='creator')
+LogUser = aliased(User, name='log_user')
+
+# ชื่อ JOIN -> (ตาราง, เงื่อนไข) ตาม table ของ /api/<table>
+JOINS = {
+    'users': {'role': (Role, Role.role_id == User.role_id)},
+    'transactions': {
+        'doctor': (Doctor, Doctor.staff_id == Transaction.doctor_id),
+        'consultant': (Consultant, Consultant.staff_id == Transaction.consultant_id),
+        'creator': (Creator, Creator.user_id == Transaction.created_by_user_id),
+    },
+    'logs': {'user': (LogUser, LogUser.user_id == LogEntry.user_id)},
+}
+
+FIELDS = {
+    'items': _columns(Item),
+    'staff': {
+        'staff_id': Field(Staff.staff_id),
+        'name_en': Field(Staff.name_en),
+        'name_th': Field(Staff.name_th),
+        'staff_role': Field(Staff.staff_role),
+    },
+    'users': {
+        'user_id': Field(User.user_id),
+        'username': Field(User.username),
+        'full_name': Field(User.full_name),
+        'role_id': Field(User.role_id),
+        'role_name': Field(Role.role_name, join='role', convert=_default('N/A')),
+        'is_active': Field(User.is_active),
+    },
+    'transactions': {
+        'transaction_id': Field(Transaction.transaction_id),
+        'patient_hn': Field(Transaction.hn),
+        'patient_type': Field(Transaction.patient_type),
+        'transaction_date': Field(Transaction.transaction_date),
+        'patient_name': Field(Transaction.patient_fname, Transaction.patient_lname,
+                              convert=lambda fname, lname: f"{fname or ''} {lname or ''}".strip()),
+        'patientAge': Field(Transaction.patient_age),
+        'doctor': Field(Doctor.name_th, join='doctor', convert=_default('N/A')),
+        'consultant': Field(Consultant.name_th, join='consultant', convert=_default('N/A')),
+        'total_amount': Field(Transaction.total_amount, convert=_money),
+        'deposit_amount': Field(Transaction.deposit_amount, convert=_money),
+        'payment_method': Field(Transaction.payment_method),
+        'review_status': Field(Transaction.review_status),
+        'comment': Field(Transaction.comment),
+        'created_by': Field(Creator.user_id, Creator.full_name, join='creator',
+                            convert=lambda user_id, full_name: full_name if user_id is not None else 'N/A'),
+    },
+    'logs': {
+        'log_id': Field(LogEntry.log_id),
+        'timestamp': Field(LogEntry.timestamp, convert=lambda value: value.strftime('%Y-%m-%d %H:%M:%S') if value else None),
+        'user': Field(LogUser.username, join='user', convert=_default('System')),
+        'action': Field(LogEntry.action),
+    },
+}
+
+
+def parse_fields(table, fields_param):
+    """แปลง ?fields=a,b,c เป็น list ของชื่อ field (ตามลำดับที่ขอ ไม่ซ้ำ)"""
+    available = FIELDS[table]
+    names = list(dict.fromkeys(name.strip() for name in fields_param.split(',') if name.strip()))
+    if not names:
+        raise PaginationError('fields must list at least one field.')
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise PaginationError(f"Unknown field(s) {', '.join(unknown)}. Allowed: {', '.join(available)}.")
+    return names
+
+
+class Projection:
+    """select ของ field ที่ขอ + column ที่ใช้เป็น key ของ keyset pagination"""
+
+    def __init__(self, table, Model, names, key_columns=()):
+        fields = FIELDS[table]
+        joins = JOINS.get(table, {})
+        columns, used_joins, self.readers = [], [], []
+        for name in names:
+            field = fields[name]
+            start = len(columns)
+            columns.extend(column.label(f'f{start + i}') for i, column in enumerate(field.columns))
+            self.readers.append((name, start, len(columns), field.convert))
+            if field.join and field.join not in used_joins:
+                used_joins.append(field.join)
+        # ใช้ชื่อ attribute เดิมเป็น label เพื่อให้ keyset_page อ่านค่า key จาก row ได้
+        columns.extend(getattr(Model, key).label(key) for key in dict.fromkeys(key_columns))
+
+        stmt = db.select(*columns).select_from(Model)
+        for join in (name for name in joins if name in used_joins):
+            target, onclause = joins[join]
+            stmt = stmt.outerjoin(target, onclause)
+        self.select = stmt
+
+    def serialize(self, rows):
+        readers = self.readers
+        result = []
+        for row in rows:
+            record = {}
+            for name, start, end, convert in readers:
+                if convert is None:
+                    record[name] = row[start]
+                else:
+                    record[name] = convert(*row[start:end])
+            result.append(record)
+        return result
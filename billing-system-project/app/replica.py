@@ -0,0 +1,129 @@
+# /app/replica.py
+# Read replica: endpoint ที่อ่านอย่างเดียว (ติด @read_replica) ส่ง SELECT ไปยัง bind 'replica' (SQLALCHEMY_BINDS)
+# - การเขียน (flush, INSERT/UPDATE/DELETE) และ query หลังจากเขียนใน request เดียวกันใช้ primary เสมอ
+# - read-your-writes: request ที่เขียนข้อมูลจะจำเวลาไว้ใน session cookie ของผู้ใช้
+#   และ request ของผู้ใช้คนนั้นอ่านจาก primary ต่ออีก REPLICA_STICKY_SECONDS วินาที (ทุก worker เห็นเหมือนกัน)
+# - replica ใช้ไม่ได้ (connect ไม่ได้ / lag เกิน REPLICA_MAX_LAG): กลับไปใช้ primary REPLICA_CHECK_INTERVAL วินาที
+#   ถ้า error เกิดระหว่าง request จะรัน view นั้นใหม่กับ primary (view ที่ติด @read_replica ต้องไม่เขียนข้อมูล)
+# ไม่ได้ตั้ง replica ไว้ = ทุกอย่างใช้ primary เหมือนเดิม
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, has_app_context, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+REPLICA_BIND = 'replica'
+
+
+class RoutingSession(Session):
+    """Session ของ db.session ที่เลือก engine ตามชนิดของ statement และ request ปัจจุบัน"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            if self._flushing or (clause is not None and clause.is_dml):
+                g._db_wrote = True
+            elif (g.get('_read_replica') and not g.get('_db_wrote')
+                  and clause is not None and clause.is_select):
+                engine = self._db.engines.get(REPLICA_BIND)
+                if engine is not None and replica_router.available(engine):
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engines = []
+        self._down_until = 0.0
+        self._checked_at = 0.0
+        self._check_interval = 10
+
+    def init_app(self, app):
+        self._check_interval = app.config.get('REPLICA_CHECK_INTERVAL', 10)
+        app.extensions['replica_router'] = self
+        app.after_request(self._after_request)
+
+    def attach(self, engine):
+        """ผูก event จับ error ของ connection กับ engine ของ replica (เรียกภายใน app context หลัง db.init_app)"""
+        if engine is None or engine in self._engines:
+            return
+        self._engines.append(engine)
+        event.listen(engine, 'handle_error', self._on_error)
+
+    def enabled(self):
+        return REPLICA_BIND in current_app.extensions['sqlalchemy'].engines
+
+    def sticky(self):
+        """ผู้ใช้เพิ่งเขียนข้อมูล: ต้องอ่านจาก primary เพื่อให้เห็นสิ่งที่ตัวเองเขียน"""
+        return session.get('_read_primary_until', 0) > time.time()
+
+    def available(self, engine):
+        now = time.monotonic()
+        if now < self._down_until:
+            return False
+        max_lag = current_app.config.get('REPLICA_MAX_LAG', 0)
+        if max_lag and now - self._checked_at > self._check_interval:
+            with self._lock:
+                self._checked_at = now
+            lag = self._lag(engine)
+            if lag is None or lag > max_lag:
+                self.mark_down(f"replication lag {lag}s (max {max_lag}s)")
+                return False
+        return True
+
+    def mark_down(self, reason):
+        with self._lock:
+            was_up = time.monotonic() >= self._down_until
+            self._down_until = time.monotonic() + self._check_interval
+        if was_up:
+            print(f"Read replica unavailable, using primary: {reason}")
+
+    def _lag(self, engine):
+        """วินาทีที่ replica ตามหลัง primary (None = ไม่ได้ replicate อยู่ หรือตรวจไม่ได้)"""
+        if engine.dialect.name != 'mysql':
+            return 0
+        try:
+            with engine.connect() as connection:
+                row = connection.exec_driver_sql('SHOW REPLICA STATUS').mappings().first()
+        except Exception:
+            return None
+        if row is None:
+            return None
+        return row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+
+    def _on_error(self, context):
+        if context.is_disconnect or isinstance(context.sqlalchemy_exception, (OperationalError, InterfaceError)):
+            if has_request_context():
+                g._replica_failed = True
+            self.mark_down(context.original_exception)
+
+    def _after_request(self, response):
+        # request นี้เขียนข้อมูลสำเร็จ: ให้ผู้ใช้อ่านจาก primary ต่ออีกระยะ (ให้ replica ตามทัน)
+        if g.get('_db_wrote') and response.status_code < 400 and self.enabled():
+            seconds = current_app.config.get('REPLICA_STICKY_SECONDS', 5)
+            if seconds > 0:
+                session['_read_primary_until'] = time.time() + seconds
+        return response
+
+
+replica_router = ReplicaRouter()
+
+
+def read_replica(f):
+    """Decorator ของ view ที่อ่านอย่างเดียว: SELECT ใน request นี้ไปที่ replica (ถ้ามีและใช้ได้)"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not replica_router.enabled() or replica_router.sticky():
+            return f(*args, **kwargs)
+        g._read_replica = True
+        response = f(*args, **kwargs)
+        if g.pop('_replica_failed', False):
+            # view ส่วนใหญ่ดัก exception เองแล้วตอบ 500: รันใหม่กับ primary แทน
+            g._read_replica = False
+            current_app.extensions['sqlalchemy'].session.rollback()
+            response = f(*args, **kwargs)
+        return response
+    return decorated_function
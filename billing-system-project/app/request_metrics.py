@@ -0,0 +1,363 @@
+# /app/request_metrics.py
+# เก็บสถิติต่อ request แยกตาม endpoint: เวลาตอบ (histogram), จำนวน SQL, เวลาที่ใช้ใน DB,
+# ขนาด response และจำนวน request ที่กำลังทำงานอยู่ แล้วแสดงในรูปแบบ Prometheus text (/api/metrics)
+#
+# ทำงานหลาย worker (gunicorn): ถ้าตั้ง METRICS_MULTIPROC_DIR แต่ละ worker จะเขียนสถิติของตัวเอง
+# ลงไฟล์ metrics-<pid>.json เป็นระยะ และตอน scrape จะรวมไฟล์ของทุก worker เข้าด้วยกัน
+# - counter / histogram ของ worker ที่ตายไปแล้วจะถูกรวมเข้า metrics-archive.json (ค่าไม่ย้อนกลับ)
+# - gauge (เช่น in-flight) นับเฉพาะ worker ที่ยังทำงานอยู่
+import glob
+import json
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from .pool_metrics import pool_metrics
+
+try:
+    import fcntl
+except ImportError: # Windows: ไม่รวมไฟล์ของ worker ที่ตายแล้ว
+    fcntl = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# ชื่อ metric -> (ชนิด, คำอธิบาย, buckets)
+METRICS = {
+    'billing_http_requests_total': ('counter', 'HTTP requests handled.', None),
+    'billing_http_request_duration_seconds': ('histogram', 'Request latency including streamed bodies.', LATENCY_BUCKETS),
+    'billing_http_request_sql_statements': ('histogram', 'SQL statements executed per request.', SQL_COUNT_BUCKETS),
+    'billing_http_request_db_seconds': ('histogram', 'Time spent executing SQL per request.', LATENCY_BUCKETS),
+    'billing_http_response_size_bytes': ('histogram', 'Response body size.', SIZE_BUCKETS),
+    'billing_http_requests_in_flight': ('gauge', 'Requests currently being handled.', None),
+    'billing_db_pool_checkouts_total': ('counter', 'Connections checked out from the pool.', None),
+    'billing_db_pool_connects_total': ('counter', 'New DBAPI connections opened.', None),
+    'billing_db_pool_invalidations_total': ('counter', 'Connections invalidated.', None),
+    'billing_db_pool_timeouts_total': ('counter', 'Pool checkouts that timed out.', None),
+    'billing_db_pool_overflow_checkouts_total': ('counter', 'Checkouts that used overflow connections.', None),
+    'billing_db_pool_wait_seconds_total': ('counter', 'Time spent waiting for a pool connection.', None),
+    'billing_db_pool_checked_out': ('gauge', 'Connections currently checked out.', None),
+}
+
+# ค่าจาก pool_metrics.snapshot() -> ชื่อ metric
+POOL_COUNTERS = {
+    'checkouts': 'billing_db_pool_checkouts_total',
+    'connects': 'billing_db_pool_connects_total',
+    'invalidations': 'billing_db_pool_invalidations_total',
+    'timeouts': 'billing_db_pool_timeouts_total',
+    'overflow_checkouts': 'billing_db_pool_overflow_checkouts_total',
+    'wait_seconds_total': 'billing_db_pool_wait_seconds_total',
+}
+
+ARCHIVE_FILE = 'metrics-archive.json'
+
+
+class RequestMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engines = []
+        self._last_flush = 0.0
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}   # (name, labels) -> value
+            self._histograms = {} # (name, labels) -> [bucket counts..., +Inf count], sum
+            self._gauges = {}     # (name, labels) -> value
+
+    def init_app(self, app):
+        self.multiproc_dir = app.config.get('METRICS_MULTIPROC_DIR') or None
+        self.flush_interval = app.config.get('METRICS_FLUSH_INTERVAL', 5.0)
+        app.extensions['request_metrics'] = self
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        if self.multiproc_dir:
+            os.makedirs(self.multiproc_dir, exist_ok=True)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    def attach(self, engine):
+        """นับ SQL และเวลา DB ของ request ปัจจุบันผ่าน engine event (เรียกภายใน app context)"""
+        if engine in self._engines:
+            return
+        self._engines.append(engine)
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    # --- Request hooks ---
+
+    def _before_request(self):
+        g._request_metrics = {
+            'start': time.perf_counter(), 'endpoint': request.endpoint or 'unmatched', # ไม่ใช้ path เพื่อไม่ให้ label มีค่าไม่จำกัด
+            'method': request.method, 'sql': 0, 'db_seconds': 0.0, 'status': 500, 'size': 0, 'streaming': False
+        }
+        self._inc_gauge('billing_http_requests_in_flight', (), 1)
+
+    def _after_request(self, response):
+        state = g.get('_request_metrics')
+        if state is None:
+            return response
+        state['status'] = response.status_code
+        if response.content_length is not None:
+            state['size'] = response.content_length
+        elif response.is_streamed:
+            # response แบบ stream: teardown ทำงานก่อนส่ง body จึงบันทึกตอน stream จบแทน
+            state['streaming'] = True
+            original = response.response
+            response.response = self._stream_body(response.iter_encoded(), original, state)
+        return response
+
+    def _teardown_request(self, exc):
+        state = g.get('_request_metrics')
+        if state is None or state['streaming']:
+            return
+        g.pop('_request_metrics', None)
+        self._record(state)
+
+    def _stream_body(self, chunks, original, state):
+        try:
+            for chunk in chunks:
+                state['size'] += len(chunk)
+                yield chunk
+        finally:
+            if hasattr(original, 'close'):
+                original.close()
+            self._record(state)
+
+    def _record(self, state):
+        elapsed = time.perf_counter() - state['start']
+        labels = (('endpoint', state['endpoint']), ('method', state['method']))
+        with self._lock:
+            key = ('billing_http_requests_total', labels + (('status', str(state['status'])),))
+            self._counters[key] = self._counters.get(key, 0) + 1
+            self._observe('billing_http_request_duration_seconds', labels, elapsed)
+            self._observe('billing_http_request_sql_statements', labels, state['sql'])
+            self._observe('billing_http_request_db_seconds', labels, state['db_seconds'])
+            self._observe('billing_http_response_size_bytes', labels, state['size'])
+        self._inc_gauge('billing_http_requests_in_flight', (), -1)
+
+        if self.multiproc_dir and time.monotonic() - self._last_flush >= self.flush_interval:
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"Failed to write request metrics: {e}")
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and '_request_metrics' in g:
+            conn.info.setdefault('_metrics_query_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('_metrics_query_start')
+        if not starts:
+            return
+        started = starts.pop()
+        state = g.get('_request_metrics') if has_request_context() else None
+        if state is not None:
+            state['sql'] += 1
+            state['db_seconds'] += time.perf_counter() - started
+
+    # --- Aggregation ---
+
+    def _observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, labels)
+        entry = self._histograms.get(key)
+        if entry is None:
+            entry = self._histograms[key] = [[0] * (len(buckets) + 1), 0.0]
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                entry[0][i] += 1
+                break
+        else:
+            entry[0][-1] += 1
+        entry[1] += value
+
+    def _inc_gauge(self, name, labels, amount):
+        with self._lock:
+            key = (name, labels)
+            self._gauges[key] = self._gauges.get(key, 0) + amount
+
+    def local_state(self):
+        """สถิติของ process นี้ในรูปที่ serialize เป็น JSON ได้"""
+        with self._lock:
+            state = {
+                'pid': os.getpid(),
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, list(labels), list(entry[0]), entry[1]] for (name, labels), entry in self._histograms.items()],
+                'gauges': [[name, list(labels), value] for (name, labels), value in self._gauges.items()],
+            }
+        if pool_metrics.is_attached():
+            pool = pool_metrics.snapshot()
+            state['counters'] += [[metric, [], pool[field]] for field, metric in POOL_COUNTERS.items()]
+            state['gauges'].append(['billing_db_pool_checked_out', [], sum(p.get('checked_out', 0) for p in pool['pools'])])
+        return state
+
+    def flush(self):
+        """เขียนสถิติของ worker นี้ลง METRICS_MULTIPROC_DIR (แทนที่ไฟล์เดิมแบบ atomic)"""
+        if not self.multiproc_dir:
+            return
+        self._last_flush = time.monotonic()
+        _write_json(os.path.join(self.multiproc_dir, f"metrics-{os.getpid()}.json"), self.local_state())
+
+    def collect(self):
+        """รวมสถิติของทุก worker (หรือเฉพาะ process นี้ถ้าไม่ได้ตั้ง METRICS_MULTIPROC_DIR)"""
+        if not self.multiproc_dir:
+            return _merge([self.local_state()], include_gauges=True)
+        self.flush()
+        self._compact_dead_workers()
+
+        live, archived = [], []
+        for path in glob.glob(os.path.join(self.multiproc_dir, 'metrics-*.json')):
+            state = _read_json(path)
+            if state is None:
+                continue
+            if os.path.basename(path) == ARCHIVE_FILE:
+                archived.append(state)
+            elif _pid_alive(state.get('pid')):
+                live.append(state)
+        merged = _merge(live, include_gauges=True)
+        return _merge([merged, _merge(archived, include_gauges=False)], include_gauges=True)
+
+    def _compact_dead_workers(self):
+        """ย้ายสถิติของ worker ที่ตายแล้ว (เช่นถูก recycle ด้วย max_requests) เข้าไฟล์ archive"""
+        if fcntl is None:
+            return
+        lock_path = os.path.join(self.multiproc_dir, 'metrics.lock')
+        with open(lock_path, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                archive_path = os.path.join(self.multiproc_dir, ARCHIVE_FILE)
+                dead = []
+                for path in glob.glob(os.path.join(self.multiproc_dir, 'metrics-*.json')):
+                    if os.path.basename(path) == ARCHIVE_FILE:
+                        continue
+                    state = _read_json(path)
+                    if state is not None and not _pid_alive(state.get('pid')):
+                        dead.append((path, state))
+                if not dead:
+                    return
+                archive = _read_json(archive_path) or {}
+                merged = _merge([archive] + [state for _, state in dead], include_gauges=False)
+                _write_json(archive_path, _to_state(merged))
+                for path, _ in dead:
+                    os.remove(path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def render(self):
+        """สถิติทั้งหมดในรูปแบบ Prometheus text exposition format"""
+        merged = self.collect()
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            series = merged[kind + 's'].get(name)
+            if not series:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(series.items()):
+                if kind != 'histogram':
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                counts, total = value
+                cumulative = 0
+                for bound, count in zip(list(buckets) + ['+Inf'], counts):
+                    cumulative += count
+                    le = bound if bound == '+Inf' else _format_value(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+        return '\n'.join(lines) + '\n'
+
+
+# --- Helpers ---
+
+def _merge(states, include_gauges):
+    """รวม state หลายชุดเป็น {'counters'|'histograms'|'gauges': {name: {labels: value}}}"""
+    merged = {'counters': {}, 'histograms': {}, 'gauges': {}}
+    for state in states:
+        for kind in ('counters', 'histograms', 'gauges'):
+            if kind == 'gauges' and not include_gauges:
+                continue
+            for row in _rows(state, kind):
+                name, labels = row[0], tuple(tuple(pair) for pair in row[1])
+                series = merged[kind].setdefault(name, {})
+                if kind == 'histograms':
+                    counts, total = row[2], row[3]
+                    current = series.get(labels)
+                    if current is None or len(current[0]) != len(counts):
+                        series[labels] = [list(counts), total]
+                    else:
+                        series[labels] = [[a + b for a, b in zip(current[0], counts)], current[1] + total]
+                else:
+                    series[labels] = series.get(labels, 0) + row[2]
+    return merged
+
+
+def _rows(state, kind):
+    """อ่านแถวจาก state ที่เป็น list (จากไฟล์) หรือ dict (ผลของ _merge)"""
+    data = state.get(kind) or []
+    if isinstance(data, list):
+        return data
+    rows = []
+    for name, series in data.items():
+        for labels, value in series.items():
+            if kind == 'histograms':
+                rows.append([name, [list(pair) for pair in labels], value[0], value[1]])
+            else:
+                rows.append([name, [list(pair) for pair in labels], value])
+    return rows
+
+
+def _to_state(merged):
+    return {kind: _rows(merged, kind) for kind in ('counters', 'histograms')}
+
+
+def _pid_alive(pid):
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape_label(value)}"' for key, value in labels) + '}'
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+request_metrics = RequestMetrics()
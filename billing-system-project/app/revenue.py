@@ -0,0 +1,236 @@
+# /app/revenue.py
+# ตารางสรุปยอดรายได้รายวัน (revenue_daily_doctor / _item / _payment) แบบ incremental
+# - ทุกครั้งที่บันทึก/แก้ไข/ลบ transaction จะคำนวณ "ส่วนต่าง" ของยอดก่อนและหลัง
+#   แล้วบวกเข้าตารางสรุปใน DB transaction เดียวกัน (commit หรือ rollback ไปพร้อมกัน)
+# - report อ่านเฉพาะตารางสรุป จึงไม่ต้อง scan transactions / transaction_items
+# - วันที่ของยอดคือวันตามเวลา Asia/Bangkok ของ transaction_date (ซึ่งเก็บเป็น UTC)
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from pytz import utc
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import selectinload
+
+from .extensions import db
+from .models import Transaction, Staff, Item, RevenueDailyDoctor, RevenueDailyItem, RevenueDailyPayment, LOCAL_TZ
+
+CENT = Decimal('0.01')
+
+# Model -> (column ที่เป็น key, column ที่เป็นยอดสะสม)
+SUMMARY_TABLES = {
+    RevenueDailyDoctor: (('day', 'doctor_id'), ('transaction_count', 'total_amount', 'deposit_amount', 'outstanding_balance')),
+    RevenueDailyItem: (('day', 'item_code'), ('line_count', 'quantity', 'revenue')),
+    RevenueDailyPayment: (('day', 'patient_type', 'payment_method'), ('transaction_count', 'total_amount', 'deposit_amount', 'outstanding_balance')),
+}
+
+REPORT_KINDS = ('daily', 'doctors', 'items', 'payments')
+
+
+def local_day(value):
+    """วันที่ (Asia/Bangkok) ของ transaction_date ที่เก็บเป็น UTC"""
+    if value.tzinfo is None:
+        value = utc.localize(value)
+    return value.astimezone(LOCAL_TZ).date()
+
+
+def utc_bounds(date_from, date_to):
+    """ช่วงเวลา UTC (naive) ที่ครอบคลุมวันที่ date_from ถึง date_to ตามเวลา Asia/Bangkok"""
+    start = LOCAL_TZ.localize(datetime.combine(date_from, time.min)).astimezone(utc).replace(tzinfo=None)
+    end = LOCAL_TZ.localize(datetime.combine(date_to + timedelta(days=1), time.min)).astimezone(utc).replace(tzinfo=None)
+    return start, end
+
+
+def _money(value):
+    return Decimal(str(value or 0)).quantize(CENT)
+
+
+def revenue_state(transaction, items=None):
+    """
+    เก็บค่าที่มีผลต่อยอดสรุปของ transaction ไว้เป็น dict
+    items = รายการ TransactionItem ที่จะใช้แทน transaction.items (เช่นรายการใหม่ที่ยังไม่ flush)
+    """
+    items = transaction.items if items is None else items
+    return {
+        'day': local_day(transaction.transaction_date),
+        'doctor_id': transaction.doctor_id or '',
+        'patient_type': (transaction.patient_type or '').lower(),
+        'payment_method': transaction.payment_method or '',
+        'total_amount': _money(transaction.total_amount),
+        'deposit_amount': _money(transaction.deposit_amount),
+        'outstanding_balance': _money(transaction.outstanding_balance),
+        'items': [(ti.item_code, int(ti.quantity or 0), _money(ti.price_per_unit)) for ti in items],
+    }
+
+
+def _add_state(deltas, state, sign):
+    day = state['day']
+    amounts = {
+        'transaction_count': sign,
+        'total_amount': sign * state['total_amount'],
+        'deposit_amount': sign * state['deposit_amount'],
+        'outstanding_balance': sign * state['outstanding_balance'],
+    }
+    for key, Model in (((day, state['doctor_id']), RevenueDailyDoctor),
+                       ((day, state['patient_type'], state['payment_method']), RevenueDailyPayment)):
+        row = deltas[Model][key]
+        for column, amount in amounts.items():
+            row[column] += amount
+    for item_code, quantity, price in state['items']:
+        row = deltas[RevenueDailyItem][(day, item_code)]
+        row['line_count'] += sign
+        row['quantity'] += sign * quantity
+        row['revenue'] += sign * (price * quantity)
+
+
+def _new_deltas():
+    return {Model: defaultdict(lambda: defaultdict(int)) for Model in SUMMARY_TABLES}
+
+
+def apply_revenue_change(before=None, after=None):
+    """
+    ปรับตารางสรุปจาก state ก่อน (before) เป็นหลัง (after) ของ transaction
+    บันทึกใหม่: after อย่างเดียว, ลบ: before อย่างเดียว, แก้ไข: ทั้งสองค่า
+    ต้องเรียกก่อน db.session.commit() ของการเปลี่ยนแปลงนั้น
+    """
+    apply_revenue_changes([(before, after)])
+
+
+def apply_revenue_changes(changes):
+    """เหมือน apply_revenue_change แต่รับ list ของ (before, after) หลาย transaction แล้ว upsert ครั้งเดียว"""
+    deltas = _new_deltas()
+    for before, after in changes:
+        if before:
+            _add_state(deltas, before, -1)
+        if after:
+            _add_state(deltas, after, 1)
+    for Model, rows in deltas.items():
+        key_columns, value_columns = SUMMARY_TABLES[Model]
+        values = []
+        for key, amounts in rows.items():
+            if not any(amounts.values()):
+                continue # ไม่มีอะไรเปลี่ยน (เช่นแก้ไขเฉพาะชื่อผู้ป่วย)
+            row = dict(zip(key_columns, key))
+            row.update({column: amounts[column] for column in value_columns})
+            values.append(row)
+        if values:
+            _upsert_add(Model, values)
+
+
+def _upsert_add(Model, rows):
+    """INSERT แถวใหม่ หรือบวกยอดเข้าแถวเดิมถ้า key ซ้ำ (atomic ในระดับ DB)"""
+    table = Model.__table__
+    key_columns, value_columns = SUMMARY_TABLES[Model]
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        stmt = mysql_insert(table).values(rows)
+        stmt = stmt.on_duplicate_key_update({column: table.c[column] + stmt.inserted[column] for column in value_columns})
+        db.session.execute(stmt)
+    elif dialect == 'sqlite':
+        stmt = sqlite_insert(table).values(rows)
+        stmt = stmt.on_conflict_do_update(index_elements=list(key_columns),
+                                          set_={column: table.c[column] + stmt.excluded[column] for column in value_columns})
+        db.session.execute(stmt)
+    else:
+        for row in rows:
+            condition = db.and_(*(table.c[column] == row[column] for column in key_columns))
+            result = db.session.execute(
+                table.update().where(condition).values({column: table.c[column] + row[column] for column in value_columns})
+            )
+            if result.rowcount == 0:
+                db.session.execute(table.insert().values(row))
+
+
+def rebuild_summaries(date_from=None, date_to=None, batch_size=1000):
+    """
+    คำนวณตารางสรุปใหม่จาก transactions (ใช้ตอน backfill หรือเมื่อสงสัยว่ายอดไม่ตรง)
+    ระบุ date_from/date_to (date) เพื่อสร้างใหม่เฉพาะช่วงวันนั้น คืนค่าจำนวน transaction ที่นับ
+    ผู้เรียกต้อง commit เอง
+    """
+    for Model in SUMMARY_TABLES:
+        delete = db.delete(Model)
+        if date_from:
+            delete = delete.where(Model.day >= date_from)
+        if date_to:
+            delete = delete.where(Model.day <= date_to)
+        db.session.execute(delete)
+
+    query = db.select(Transaction).options(selectinload(Transaction.items))
+    if date_from:
+        query = query.where(Transaction.transaction_date >= utc_bounds(date_from, date_from)[0])
+    if date_to:
+        query = query.where(Transaction.transaction_date < utc_bounds(date_to, date_to)[1])
+
+    # อ่านทีละ batch ด้วย keyset (transaction_date, transaction_id) ผ่าน ix_transactions_date
+    # แทน server-side cursor เพราะต้องเขียนตารางสรุปด้วย connection เดียวกันระหว่างอ่าน
+    count = 0
+    last = None
+    while True:
+        batch_query = query
+        if last:
+            batch_query = batch_query.where(db.or_(
+                Transaction.transaction_date > last[0],
+                db.and_(Transaction.transaction_date == last[0], Transaction.transaction_id > last[1])
+            ))
+        batch = db.session.scalars(
+            batch_query.order_by(Transaction.transaction_date, Transaction.transaction_id).limit(batch_size)
+        ).all()
+        if not batch:
+            break
+        apply_revenue_changes([(None, revenue_state(transaction)) for transaction in batch])
+        count += len(batch)
+        last = (batch[-1].transaction_date, batch[-1].transaction_id)
+        db.session.expunge_all() # ไม่ให้ identity map โตตามจำนวน transaction
+    return count
+
+
+def revenue_report(kind, date_from, date_to):
+    """สรุปยอดจากตารางสรุปในช่วงวันที่ (รวมทั้งสองวัน) คืนค่าเป็น list ของ dict"""
+    if kind == 'daily':
+        M = RevenueDailyPayment
+        rows = (db.session.query(M.day, db.func.sum(M.transaction_count), db.func.sum(M.total_amount),
+                                 db.func.sum(M.deposit_amount), db.func.sum(M.outstanding_balance))
+                .filter(M.day >= date_from, M.day <= date_to).group_by(M.day).order_by(M.day).all())
+        return [{'day': day.isoformat(), **_totals(count, total, deposit, outstanding)}
+                for day, count, total, deposit, outstanding in rows]
+
+    if kind == 'doctors':
+        M = RevenueDailyDoctor
+        rows = (db.session.query(M.doctor_id, Staff.name_th, db.func.sum(M.transaction_count), db.func.sum(M.total_amount),
+                                 db.func.sum(M.deposit_amount), db.func.sum(M.outstanding_balance))
+                .outerjoin(Staff, Staff.staff_id == M.doctor_id)
+                .filter(M.day >= date_from, M.day <= date_to)
+                .group_by(M.doctor_id, Staff.name_th).order_by(db.func.sum(M.total_amount).desc()).all())
+        return [{'doctor_id': doctor_id or None, 'doctor_name': name or '', **_totals(count, total, deposit, outstanding)}
+                for doctor_id, name, count, total, deposit, outstanding in rows]
+
+    if kind == 'items':
+        M = RevenueDailyItem
+        rows = (db.session.query(M.item_code, Item.name_th, db.func.sum(M.line_count), db.func.sum(M.quantity), db.func.sum(M.revenue))
+                .outerjoin(Item, Item.item_code == M.item_code)
+                .filter(M.day >= date_from, M.day <= date_to)
+                .group_by(M.item_code, Item.name_th).order_by(db.func.sum(M.revenue).desc()).all())
+        return [{'item_code': item_code, 'name': name or '', 'line_count': int(lines or 0), 'quantity': int(quantity or 0),
+                 'revenue': float(revenue or 0)}
+                for item_code, name, lines, quantity, revenue in rows]
+
+    if kind == 'payments':
+        M = RevenueDailyPayment
+        rows = (db.session.query(M.patient_type, M.payment_method, db.func.sum(M.transaction_count), db.func.sum(M.total_amount),
+                                 db.func.sum(M.deposit_amount), db.func.sum(M.outstanding_balance))
+                .filter(M.day >= date_from, M.day <= date_to)
+                .group_by(M.patient_type, M.payment_method).order_by(M.patient_type, M.payment_method).all())
+        return [{'patient_type': patient_type, 'payment_method': payment_method or None, **_totals(count, total, deposit, outstanding)}
+                for patient_type, payment_method, count, total, deposit, outstanding in rows]
+
+    raise ValueError(f"Unknown report '{kind}'. Allowed: {', '.join(REPORT_KINDS)}.")
+
+
+def _totals(count, total, deposit, outstanding):
+    return {
+        'transaction_count': int(count or 0),
+        'total_amount': float(total or 0),
+        'deposit_amount': float(deposit or 0),
+        'outstanding_balance': float(outstanding or 0),
+    }
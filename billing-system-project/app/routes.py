@@ -1,16 +1,21 @@
 # --- 1. Imports ที่จำเป็น ---
-import os
-import uuid
-import base64
 import json
 import pandas as pd
 from datetime import datetime
 from flask import (Blueprint, Response, render_template, jsonify, 
-                   request, flash, redirect, url_for, current_app)
+                   request, flash, redirect, url_for, current_app, stream_with_context)
 from flask_login import login_required, current_user
 from sqlalchemy.exc import IntegrityError
-from .models import db, Item, Staff, Transaction, TransactionItem, User,TransactionVersion
+from .models import db, Item, Staff, Transaction, TransactionItem, User,TransactionVersion, ImportJob
+from .serializers import transaction_select, serialize_transactions
 from .extensions import db
+from .catalog import catalog_cache
+from .signatures import signature_store, SignatureStoreBusy
+from .pricing import check_bill, describe_mismatches, price_check_mode, price_engine
+from .audit import audit_logger
+from .revenue import apply_revenue_change, apply_revenue_changes, revenue_state
+from .importer import prepare_dataframe, bulk_upsert, start_import_job, reap_stale_import_jobs
+from .replica import read_replica
 from functools import wraps
 
 
@@ -20,28 +25,18 @@ main_bp = Blueprint('main', __name__)
 # --- 2. Helper Function สำหรับบันทึกลายเซ็น ---
 def save_signature_file(b64_data, transaction_id):
     """
-    ถอดรหัส Base64, สร้างชื่อไฟล์ที่ไม่ซ้ำกัน, และบันทึกไฟล์ลายเซ็น
+    ถอดรหัส Base64 และส่งลายเซ็นให้ signature_store เขียนลง disk ใน background
+    ชื่อไฟล์มาจาก hash ของรูป (ลายเซ็นที่เหมือนกันใช้ไฟล์เดียวกัน) จึงไม่ขึ้นกับ transaction_id
+    SignatureStoreBusy ถูกส่งต่อให้ route ตอบ 503 (ไม่บันทึกบิลโดยไม่มีลายเซ็น)
     """
     if not b64_data:
         return None
     try:
-        # สร้างโฟลเดอร์ (ถ้ายังไม่มี)
-        signature_folder = os.path.join(current_app.static_folder, 'signatures')
-        os.makedirs(signature_folder, exist_ok=True)
-        
-        # ตัดส่วนหัวของ Base64 string ออก
-        header, encoded = b64_data.split(",", 1)
-        signature_binary = base64.b64decode(encoded)
-        
-        # สร้างชื่อไฟล์ใหม่ที่ไม่ซ้ำกัน
-        filename = f"sig_{transaction_id}_{uuid.uuid4().hex[:8]}.png"
-        filepath = os.path.join(signature_folder, filename)
-        
-        with open(filepath, "wb") as f:
-            f.write(signature_binary)
-        return filename
+        return signature_store.save(b64_data)
+    except SignatureStoreBusy:
+        raise
     except Exception as e:
-        print(f"Error saving signature file: {e}")
+        print(f"Error saving signature file for {transaction_id}: {e}")
         return None
 
 
@@ -65,7 +60,8 @@ def import_page():
     # กำหนดโครงสร้าง Header ที่คาดหวังและ PK field
     MODEL_MAP = {
         'staff': {'model': Staff, 'expected_headers': ['staff_id', 'name_th', 'name_en', 'staff_role'], 'pk_field': 'staff_id'},
-        'items': {'model': Item, 'expected_headers': ['item_code', 'name_th', 'price_opd', 'price_ipd', 'price_foreign_opd', 'price_foreign_ipd', 'price_staff'], 'pk_field': 'item_code'}
+        'items': {'model': Item, 'expected_headers': ['item_code', 'name_th', 'price_opd', 'price_ipd', 'price_foreign_opd', 'price_foreign_ipd', 'price_staff'], 'pk_field': 'item_code',
+                  'numeric_columns': ['price_opd', 'price_ipd', 'price_foreign_opd', 'price_foreign_ipd', 'price_staff']}
     }
     
     if request.method == 'POST':
@@ -88,56 +84,51 @@ def import_page():
         pk_field = model_info['pk_field'] # ดึงชื่อ Primary Key field
         expected_headers = set(model_info['expected_headers'])
 
+        # ไฟล์ใหญ่ (หรือเลือก background) จะ import ทีละ chunk ใน background thread
+        # แล้วให้หน้า import poll สถานะจาก /import/status/<job_id>
+        background = (request.form.get('background') == '1' or
+                      (request.content_length or 0) > current_app.config.get('IMPORT_BACKGROUND_THRESHOLD', 5 * 1024 * 1024))
+        if background:
+            try:
+                header_df = pd.read_csv(file.stream, nrows=0)
+                file.stream.seek(0)
+                error_msg = check_csv_headers(header_df.columns.str.strip(), expected_headers)
+                if error_msg:
+                    flash(error_msg, 'error')
+                    return redirect(request.url)
+                job_id = start_import_job(current_app._get_current_object(), file, target_table, model_info,
+                                          user_id=current_user.user_id)
+            except Exception as e:
+                db.session.rollback()
+                import traceback
+                traceback.print_exc()
+                flash(f'An unexpected error occurred: {str(e)}', 'error')
+                return redirect(request.url)
+            flash(f'Import started in background for "{target_table}" table.', 'success')
+            return redirect(url_for('main.import_page', job=job_id))
+
         try:
-            df = pd.read_csv(file)
+            # อ่าน PK เป็น string เสมอ (ไม่ให้ pandas แปลง '001' เป็น 1)
+            df = pd.read_csv(file, dtype={pk_field: str})
             
             # ทำความสะอาดชื่อ Header โดยตัดช่องว่างหน้า-หลังออก
             df.columns = df.columns.str.strip()
-            csv_headers = set(df.columns)
-
-            if csv_headers != expected_headers:
-                missing = expected_headers - csv_headers
-                extra = csv_headers - expected_headers
-                error_msg = "CSV headers do not match. "
-                if missing: error_msg += f"Missing: {', '.join(missing)}. "
-                if extra: error_msg += f"Extra: {', '.join(extra)}."
+            error_msg = check_csv_headers(df.columns, expected_headers)
+            if error_msg:
                 flash(error_msg, 'error')
                 return redirect(request.url)
 
-            added_count = 0
-            updated_count = 0
-            
-            for index, row in df.iterrows():
-                data_dict = row.to_dict()
-                
-                # ถ้าเป็นตาราง items ให้แปลงคอลัมน์ราคาเป็นตัวเลข และถ้าแปลงไม่ได้ให้เป็น 0
-                if target_table == 'items':
-                    price_columns = ['price_opd', 'price_ipd', 'price_foreign_opd', 'price_foreign_ipd', 'price_staff']
-                    for col in price_columns:
-                        data_dict[col] = pd.to_numeric(data_dict.get(col), errors='coerce').fillna(0)
-
-                pk_value = data_dict.get(pk_field)
-                if pk_value is None:
-                    # หากไม่มี PK, อาจข้ามหรือแจ้ง Error ขึ้นอยู่กับ Business Logic
-                    print(f"Skipping row {index+1}: Primary key '{pk_field}' is missing.")
-                    continue # ข้ามแถวนี้ไปเลย หรือจะ flash error ก็ได้
-
-                # ตรวจสอบว่ามี Record นี้อยู่แล้วหรือไม่
-                existing_record = db.session.get(Model, pk_value) # ใช้ db.session.get เพื่อค้นหาด้วย PK
-
-                if existing_record:
-                    # ถ้ามีอยู่แล้ว ให้อัปเดตข้อมูล
-                    for key, value in data_dict.items():
-                        if key != pk_field: # ไม่อัปเดต Primary Key
-                            setattr(existing_record, key, value)
-                    updated_count += 1
-                else:
-                    # ถ้ายังไม่มี ให้สร้าง Record ใหม่
-                    new_record = Model(**data_dict)
-                    db.session.add(new_record)
-                    added_count += 1
+            # แปลงชนิดข้อมูลทั้ง DataFrame ครั้งเดียว แล้ว upsert ทีละ chunk
+            # (ราคาที่แปลงไม่ได้จะเป็น 0, แถวที่ไม่มี PK จะถูกข้าม)
+            df, skipped_rows = prepare_dataframe(df, pk_field, model_info.get('numeric_columns', ()))
+            if skipped_rows:
+                print(f"Skipped {len(skipped_rows)} rows: Primary key '{pk_field}' is missing.")
+
+            chunk_size = current_app.config.get('IMPORT_CHUNK_SIZE', 1000)
+            added_count, updated_count = bulk_upsert(Model, df, pk_field, chunk_size=chunk_size)
 
             db.session.commit()
+            catalog_cache.invalidate()
             flash(f'Import completed: {added_count} records added, {updated_count} records updated in "{target_table}" table!', 'success')
 
         except IntegrityError as e:
@@ -156,7 +147,32 @@ def import_page():
     # ส่งข้อมูล Header ไปให้ Template แสดงเป็นตัวอย่าง
     import json
     expected_headers_json = json.dumps({k: v['expected_headers'] for k, v in MODEL_MAP.items()})
-    return render_template('import.html', expected_headers_json=expected_headers_json)
+    return render_template('import.html', expected_headers_json=expected_headers_json, job_id=request.args.get('job'))
+
+def check_csv_headers(columns, expected_headers):
+    """ตรวจว่า Header ของ CSV ตรงกับที่คาดหวัง คืนค่าข้อความ error หรือ None ถ้าถูกต้อง"""
+    csv_headers = set(columns)
+    if csv_headers == expected_headers:
+        return None
+    missing = expected_headers - csv_headers
+    extra = csv_headers - expected_headers
+    error_msg = "CSV headers do not match. "
+    if missing: error_msg += f"Missing: {', '.join(missing)}. "
+    if extra: error_msg += f"Extra: {', '.join(extra)}."
+    return error_msg
+
+@main_bp.route('/import/status/<job_id>')
+@login_required
+def import_status(job_id):
+    """สถานะของ background import สำหรับให้หน้า import poll"""
+    if not current_user.role or current_user.role.role_name not in ['admin', 'super admin']:
+        return jsonify({'message': 'Permission denied.'}), 403
+    # job ที่ worker หยุดไปโดยไม่ได้ mark (heartbeat เก่า) จะถูก mark failed ที่นี่ หน้า import จึงไม่ poll ค้างไปเรื่อยๆ
+    reap_stale_import_jobs(job_id=job_id)
+    job = db.session.get(ImportJob, job_id)
+    if not job:
+        return jsonify({'message': 'Import job not found.'}), 404
+    return jsonify(job.to_dict())
 
 @main_bp.route('/download-template/<target_table>')
 @login_required
@@ -188,28 +204,131 @@ def ajax_required(f):
 # --- 5. Route สำหรับ API ต่างๆ ---
 @main_bp.route('/api/initial-data')
 @ajax_required
+@read_replica
 def get_initial_data():
     try:
-        items = Item.query.all()
-        staff = Staff.query.all()
-        items_list = [item.to_dict() for item in items]
-        users_list = [s.to_dict() for s in staff]
-        return jsonify({'products': items_list, 'users': users_list})
+        # ใช้ catalog ที่ serialize ไว้แล้ว และตอบ 304 ถ้า If-None-Match ตรงกับ ETag
+        blob, etag, version = catalog_cache.get()
+        response = Response(blob, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['X-Catalog-Version'] = str(version)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @main_bp.route('/api/transaction-history')
 @ajax_required
+@read_replica
 def get_transactions():
+    # ?stream=1 → ส่ง JSON array ทีละส่วน, ?format=ndjson → หนึ่ง transaction ต่อบรรทัด
+    stream_format = request.args.get('format', 'json')
+    if stream_format == 'ndjson' or request.args.get('stream') in ('1', 'true'):
+        return stream_transactions(stream_format)
+
     try:
-        transactions = Transaction.query.order_by(Transaction.transaction_date.desc()).all()
-        history_list = [t.to_dict() for t in transactions]
-        return jsonify(history_list)
+        # อ่าน column ตรง (ไม่สร้าง ORM object) แล้วให้ JSON provider แปลง Decimal/datetime เอง
+        rows = db.session.execute(transaction_select().order_by(Transaction.transaction_date.desc()))
+        return jsonify(serialize_transactions(rows))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def stream_transactions(stream_format):
+    """
+    Stream ประวัติ transaction โดยไม่โหลดทั้งตารางเข้า memory
+    ใช้ yield_per + stream_results (server-side cursor) ดึงหัวบิลทีละ batch
+    แล้วโหลดรายการสินค้าของ batch นั้นและส่ง JSON ออกไปทีละแถวผ่าน generator response
+    """
+    if stream_format not in ('json', 'ndjson'):
+        return jsonify({'error': f"Unsupported format '{stream_format}'."}), 400
+
+    batch_size = current_app.config.get('STREAM_YIELD_PER', 500)
+    stmt = (transaction_select()
+            .order_by(Transaction.transaction_date.desc())
+            .execution_options(yield_per=batch_size, stream_results=True))
+    dumps = current_app.json.dumps
+
+    def batches():
+        # หัวบิล stream ผ่าน connection แยก เพราะระหว่างที่ server-side cursor ยังเปิดอยู่
+        # connection เดียวกันจะรัน query รายการสินค้าของแต่ละ batch ไม่ได้ (MySQL)
+        # get_bind เลือก engine เดียวกับที่ db.session ใช้กับ SELECT นี้ (replica หรือ primary)
+        with db.session.get_bind(clause=stmt).connect() as connection:
+            result = connection.execute(stmt)
+            for partition in result.partitions():
+                yield serialize_transactions(partition)
+
+    def generate_ndjson():
+        for batch in batches():
+            yield ''.join(dumps(transaction) + '\n' for transaction in batch)
+
+    def generate_json_array():
+        yield '['
+        first = True
+        for batch in batches():
+            for transaction in batch:
+                yield ('' if first else ',') + dumps(transaction)
+                first = False
+        yield ']'
+
+    if stream_format == 'ndjson':
+        return Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
+    return Response(stream_with_context(generate_json_array()), mimetype='application/json')
+
+
 # --- 6. Route สำหรับบันทึก Transaction (สำคัญ) ---
+def build_transaction(data):
+    """
+    สร้าง Transaction และ TransactionItem (ยังไม่ add เข้า session) จากข้อมูลบิลที่ frontend ส่งมา
+    ลายเซ็นจะถูกส่งให้ signature_store เขียนลง disk ในขั้นตอนนี้
+    """
+    doctor_id = data.get('doctor_id') or None
+    consultant_id = data.get('consultant_id') or None
+
+    new_transaction = Transaction(
+        transaction_id=data.get('transaction_id'),
+        hn=data.get('patient_hn'),
+        patient_fname=data.get('fname'),
+        patient_lname=data.get('lname'),
+        patient_gender=data.get('gender'),
+        # patient_dob=datetime.strptime(data['patient_dob'], '%Y-%m-%d').date() if data.get('patient_dob') else None,
+        patient_age=data.get('patient_age'),
+        transaction_date=datetime.fromisoformat(data['date'].replace('Z', '+00:00')),
+        patient_type=data.get('type'),
+        total_amount=float(data.get('total', 0)),
+        deposit_amount=float(data.get('deposit_amount', 0)),
+        outstanding_balance=float(data.get('outstanding_balance', 0)),
+        payment_method=data.get('payment_method'),
+        review_status=data.get('review_status'),
+        comment=data.get('comment'),
+        doctor_id=doctor_id,
+        consultant_id=consultant_id,
+        created_by_user_id=current_user.user_id if current_user.is_authenticated else None
+    )
+
+    # จัดการบันทึกลายเซ็น (ตาม Requirement ล่าสุดคือของ Consultant)
+    signature_b64 = data.get('consultant_signature_b64')
+    if signature_b64:
+        filename = save_signature_file(signature_b64, new_transaction.transaction_id)
+        new_transaction.consultant_signature_filename = filename
+
+    patient_sig_b64 = data.get('patient_signature_b64')
+    if patient_sig_b64:
+        filename = save_signature_file(patient_sig_b64, new_transaction.transaction_id)
+        new_transaction.patient_signature_filename = filename
+
+    # รายการสินค้าในตะกร้า
+    new_items = []
+    for item_data in data.get('cartItems') or []:
+        new_items.append(TransactionItem(
+            transaction_id=new_transaction.transaction_id,
+            item_code=item_data.get('itemcode'),
+            quantity=int(item_data.get('quantity', 1)),
+            price_per_unit=float(item_data.get('price', 0))
+        ))
+    return new_transaction, new_items
+
+
 @main_bp.route('/api/save-transaction', methods=['POST'])
 def save_transaction_to_db():
     data = request.get_json()
@@ -217,65 +336,175 @@ def save_transaction_to_db():
         return jsonify({'status': 'error', 'message': 'Invalid data provided.'}), 400
 
     try:
-        doctor_id = data.get('doctor_id') or None
-        consultant_id = data.get('consultant_id') or None
+        new_transaction, new_items = build_transaction(data)
 
+        # ตรวจราคา/ยอดรวมกับ catalog (ไม่มี query ต่อรายการ)
+        price_check = check_bill(new_transaction, new_items)
+        if price_check and not price_check.ok and price_check_mode() == 'enforce':
+            return jsonify({'status': 'error', 'message': f'Price check failed: {describe_mismatches(price_check)}',
+                            'price_check': price_check.to_dict()}), 422
 
-            
-        new_transaction = Transaction(
-            transaction_id=data.get('transaction_id'),
-            hn=data.get('patient_hn'),
-            patient_fname=data.get('fname'),
-            patient_lname=data.get('lname'),
-            patient_gender=data.get('gender'),
-            # patient_dob=datetime.strptime(data['patient_dob'], '%Y-%m-%d').date() if data.get('patient_dob') else None,
-            patient_age=data.get('patient_age'),
-            transaction_date=datetime.fromisoformat(data['date'].replace('Z', '+00:00')),
-            patient_type=data.get('type'),
-            total_amount=float(data.get('total', 0)),
-            deposit_amount=float(data.get('deposit_amount', 0)),
-            outstanding_balance=float(data.get('outstanding_balance', 0)),
-            payment_method=data.get('payment_method'),
-            review_status=data.get('review_status'),
-            comment=data.get('comment'),
-            doctor_id=doctor_id,
-            consultant_id=consultant_id,
-            created_by_user_id=current_user.user_id if current_user.is_authenticated else None
-        )
-
-        # จัดการบันทึกลายเซ็น (ตาม Requirement ล่าสุดคือของ Consultant)
-        signature_b64 = data.get('consultant_signature_b64')
-        if signature_b64:
-            filename = save_signature_file(signature_b64, new_transaction.transaction_id)
-            new_transaction.consultant_signature_filename = filename
-
-        patient_sig_b64 = data.get('patient_signature_b64')
-        if patient_sig_b64:
-            filename = save_signature_file(patient_sig_b64, new_transaction.transaction_id)
-            new_transaction.patient_signature_filename = filename
-            
         db.session.add(new_transaction)
-        
-        # บันทึกรายการสินค้าในตะกร้า
-        if 'cartItems' in data and data['cartItems']:
-            for item_data in data['cartItems']:
-                transaction_item = TransactionItem(
-                    transaction_id=new_transaction.transaction_id,
-                    item_code=item_data.get('itemcode'),
-                    quantity=int(item_data.get('quantity', 1)),
-                    price_per_unit=float(item_data.get('price', 0))
-                )
-                db.session.add(transaction_item)
-        
+        db.session.add_all(new_items)
+
+        # อัปเดตตารางสรุปยอดรายวันใน DB transaction เดียวกัน
+        apply_revenue_change(after=revenue_state(new_transaction, new_items))
+
         db.session.commit()
-        return jsonify({'status': 'success', 'message': 'Transaction saved successfully.'})
+        response = {'status': 'success', 'message': 'Transaction saved successfully.'}
+        if price_check and not price_check.ok:
+            log_price_mismatch(new_transaction.transaction_id, price_check)
+            response['price_check'] = price_check.to_dict()
+        return jsonify(response)
 
+    except SignatureStoreBusy as e:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         import traceback
         traceback.print_exc()
         return jsonify({'status': 'error', 'message': str(e)}), 500
-    
+
+
+def log_price_mismatch(transaction_id, price_check):
+    """บันทึก audit log ของบิลที่ราคาไม่ตรงกับ catalog (โหมด flag)"""
+    user_id = current_user.user_id if current_user.is_authenticated else None
+    audit_logger.log(user_id, f"Price mismatch on transaction '{transaction_id}': {describe_mismatches(price_check)}")
+
+
+@main_bp.route('/api/price-quote', methods=['POST'])
+def price_quote():
+    """
+    คำนวณราคาตะกร้าจาก catalog ฝั่ง server: {"type": "opd", "cartItems": [{"itemcode", "quantity", "price"?}]}
+    ใช้ตรวจยอดก่อนบันทึกบิล
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'status': 'error', 'message': 'Invalid data provided.'}), 400
+    try:
+        cart = [(item.get('itemcode'), int(item.get('quantity', 1)), item.get('price')) for item in data.get('cartItems') or []]
+    except (AttributeError, TypeError, ValueError):
+        return jsonify({'status': 'error', 'message': 'Invalid cartItems.'}), 400
+    return jsonify(price_engine.price_cart(data.get('type'), cart).to_dict())
+
+
+@main_bp.route('/api/save-transactions', methods=['POST'])
+def save_transactions_batch():
+    """
+    บันทึกหลายบิลในครั้งเดียว (เช่นเครื่อง POS ส่งบิลที่ค้างไว้ตอน offline)
+    รับ list ของบิล (รูปแบบเดียวกับ /api/save-transaction) หรือ {"transactions": [...]}
+    - บิลที่มี transaction_id อยู่แล้วจะถูกข้าม (ส่งซ้ำได้อย่างปลอดภัย)
+    - header และ items ถูก insert แบบ executemany ใน DB transaction เดียว
+    - ถ้า batch ล้มเหลว จะบันทึกทีละบิลด้วย savepoint เพื่อแยกบิลที่มีปัญหาออก
+    คืนผลลัพธ์ของแต่ละบิล: saved, exists, invalid หรือ error
+    """
+    data = request.get_json(silent=True)
+    bills = data.get('transactions') if isinstance(data, dict) else data
+    if not isinstance(bills, list) or not bills:
+        return jsonify({'status': 'error', 'message': 'Expected a non-empty list of transactions.'}), 400
+    max_batch = current_app.config.get('SAVE_BATCH_MAX', 200)
+    if len(bills) > max_batch:
+        return jsonify({'status': 'error', 'message': f'A batch may contain at most {max_batch} transactions.'}), 400
+
+    results = [None] * len(bills)
+    pending = {} # transaction_id -> (index, Transaction, items)
+    price_checks = {} # transaction_id -> PriceCheck ที่ไม่ผ่าน (โหมด flag)
+    for index, bill in enumerate(bills):
+        transaction_id = bill.get('transaction_id') if isinstance(bill, dict) else None
+        if not transaction_id:
+            results[index] = {'transaction_id': transaction_id, 'status': 'invalid', 'message': 'transaction_id is required.'}
+        elif transaction_id in pending:
+            results[index] = {'transaction_id': transaction_id, 'status': 'exists', 'message': 'Duplicate transaction_id in batch.'}
+        else:
+            try:
+                entry = (index,) + build_transaction(bill)
+            except SignatureStoreBusy as e:
+                # ยังไม่มีบิลใดถูกบันทึก: ทั้ง batch ส่งซ้ำได้อย่างปลอดภัย
+                return jsonify({'status': 'error', 'message': str(e)}), 503, {'Retry-After': '1'}
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                results[index] = {'transaction_id': transaction_id, 'status': 'invalid', 'message': str(e)}
+                continue
+            price_check = check_bill(entry[1], entry[2])
+            if price_check and not price_check.ok:
+                if price_check_mode() == 'enforce':
+                    results[index] = {'transaction_id': transaction_id, 'status': 'invalid',
+                                      'message': f'Price check failed: {describe_mismatches(price_check)}'}
+                    continue
+                price_checks[transaction_id] = price_check
+            pending[transaction_id] = entry
+
+    try:
+        # Idempotency: ข้ามบิลที่เคยบันทึกแล้วด้วย query เดียว
+        if pending:
+            existing = set(db.session.scalars(
+                db.select(Transaction.transaction_id).where(Transaction.transaction_id.in_(list(pending)))
+            ))
+            for transaction_id in existing:
+                index = pending.pop(transaction_id)[0]
+                results[index] = {'transaction_id': transaction_id, 'status': 'exists'}
+
+        if pending:
+            try:
+                insert_transaction_rows(list(pending.values()))
+                db.session.commit()
+                for transaction_id, (index, _, _) in pending.items():
+                    results[index] = {'transaction_id': transaction_id, 'status': 'saved'}
+            except Exception as e:
+                db.session.rollback()
+                print(f"Batch save failed, retrying per transaction: {e}")
+                for transaction_id, entry in pending.items():
+                    results[entry[0]] = save_single_in_savepoint(transaction_id, entry)
+                db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        import traceback
+        traceback.print_exc()
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+    for result in results:
+        price_check = price_checks.get(result['transaction_id'])
+        if price_check and result['status'] == 'saved':
+            log_price_mismatch(result['transaction_id'], price_check)
+            result['price_check'] = price_check.to_dict()
+
+    summary = {status: sum(1 for r in results if r['status'] == status) for status in ('saved', 'exists', 'invalid', 'error')}
+    return jsonify({'status': 'success', **summary, 'results': results})
+
+
+def insert_transaction_rows(entries):
+    """insert header/items ของหลายบิลแบบ executemany (ไม่ผ่าน unit of work) และปรับตารางสรุปยอด"""
+    now = datetime.utcnow()
+    header_columns = [c.key for c in Transaction.__table__.columns]
+    item_columns = [c.key for c in TransactionItem.__table__.columns if not c.primary_key]
+    headers, items, revenue_changes = [], [], []
+    for _, transaction, transaction_items in entries:
+        row = {column: getattr(transaction, column) for column in header_columns}
+        row['created_at'] = row['updated_at'] = now
+        headers.append(row)
+        items.extend({column: getattr(ti, column) for column in item_columns} for ti in transaction_items)
+        revenue_changes.append((None, revenue_state(transaction, transaction_items)))
+
+    db.session.execute(db.insert(Transaction.__table__), headers)
+    if items:
+        db.session.execute(db.insert(TransactionItem.__table__), items)
+    apply_revenue_changes(revenue_changes)
+
+
+def save_single_in_savepoint(transaction_id, entry):
+    """บันทึกบิลเดียวภายใน savepoint คืนผลลัพธ์ของบิลนั้น"""
+    try:
+        with db.session.begin_nested():
+            insert_transaction_rows([entry])
+        return {'transaction_id': transaction_id, 'status': 'saved'}
+    except IntegrityError as e:
+        # อาจถูกบันทึกโดย request อื่นที่ส่งซ้ำมาพร้อมกัน
+        if db.session.get(Transaction, transaction_id) is not None:
+            return {'transaction_id': transaction_id, 'status': 'exists'}
+        return {'transaction_id': transaction_id, 'status': 'error', 'message': str(e.orig)}
+    except Exception as e:
+        return {'transaction_id': transaction_id, 'status': 'error', 'message': str(e)}
+
 @main_bp.route('/edit/<transaction_id>')
 @login_required
 def edit_page(transaction_id):
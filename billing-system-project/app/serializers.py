@@ -0,0 +1,85 @@
+# /app/serializers.py
+# Serializer ของรายการ transaction จำนวนมาก (เช่น /api/transaction-history) ที่อ่าน column ตรงจาก DB
+# - ไม่สร้าง ORM object / relationship: หัวบิล 1 query (JOIN ชื่อแพทย์/ผู้สร้าง) และรายการสินค้า 1 query ต่อ batch
+# - ส่งค่า Numeric (Decimal) และ datetime ออกไปตรงๆ ให้ JSON provider (app/json_provider.py) แปลงเอง
+# ผลลัพธ์มี key เหมือน Transaction.to_dict() ทุกประการ
+from collections import defaultdict
+
+from pytz import utc
+from sqlalchemy.orm import aliased
+
+from .extensions import db
+from .models import Transaction, TransactionItem, Item, Staff, User
+
+# จำนวน transaction_id สูงสุดต่อ WHERE ... IN (...) ตอนโหลดรายการสินค้า
+ITEMS_IN_CHUNK = 500
+
+
+def transaction_select():
+    """SELECT ของ column ที่ Transaction.to_dict() ใช้ (ต่อ .where() / .order_by() ได้)"""
+    doctor = aliased(Staff)
+    consultant = aliased(Staff)
+    return (db.select(
+                Transaction.transaction_id, Transaction.hn, Transaction.patient_fname, Transaction.patient_lname,
+                Transaction.patient_gender, Transaction.patient_age, Transaction.transaction_date, Transaction.patient_type,
+                Transaction.total_amount, Transaction.doctor_id, doctor.name_th.label('doctor_name'),
+                Transaction.consultant_id, consultant.name_th.label('consultant_name'), Transaction.deposit_amount,
+                Transaction.outstanding_balance, Transaction.payment_method, Transaction.review_status, Transaction.comment,
+                User.user_id.label('creator_id'), User.full_name.label('created_by'), Transaction.consultant_signature_filename,
+                Transaction.patient_signature_filename)
+            .outerjoin(doctor, doctor.staff_id == Transaction.doctor_id)
+            .outerjoin(consultant, consultant.staff_id == Transaction.consultant_id)
+            .outerjoin(User, User.user_id == Transaction.created_by_user_id))
+
+
+def products_by_transaction(transaction_ids):
+    """transaction_id -> products_list ของ transaction ที่ระบุ (query ละ ITEMS_IN_CHUNK id)"""
+    products = defaultdict(list)
+    for start in range(0, len(transaction_ids), ITEMS_IN_CHUNK):
+        chunk = transaction_ids[start:start + ITEMS_IN_CHUNK]
+        rows = db.session.execute(
+            db.select(TransactionItem.transaction_id, TransactionItem.item_code, Item.name_th,
+                      TransactionItem.price_per_unit, TransactionItem.quantity)
+            .outerjoin(Item, Item.item_code == TransactionItem.item_code)
+            .where(TransactionItem.transaction_id.in_(chunk))
+            .order_by(TransactionItem.transaction_item_id)
+        )
+        for transaction_id, item_code, name, price, quantity in rows:
+            products[transaction_id].append({'itemcode': item_code, 'name': name, 'price': price, 'quantity': quantity})
+    return products
+
+
+def serialize_transactions(rows):
+    """แปลงแถวจาก transaction_select() เป็น list ของ dict แบบ Transaction.to_dict()"""
+    rows = list(rows)
+    products = products_by_transaction([row.transaction_id for row in rows])
+    result = []
+    for row in rows:
+        transaction_date = row.transaction_date
+        if transaction_date is not None:
+            transaction_date = transaction_date.replace(tzinfo=utc) if transaction_date.tzinfo is None else transaction_date.astimezone(utc)
+        result.append({
+            "transaction_id": row.transaction_id,
+            "patient_hn": row.hn,
+            "fname": row.patient_fname,
+            "lname": row.patient_lname,
+            "gender": row.patient_gender,
+            "patientAge": row.patient_age,
+            "date": transaction_date,
+            "type": row.patient_type.lower() if row.patient_type else "",
+            "products_list": products.get(row.transaction_id, []),
+            "total": row.total_amount,
+            "doctor_id": row.doctor_id,
+            "doctor_name": row.doctor_name or "",
+            "consultant_id": row.consultant_id,
+            "consultant_name": row.consultant_name or "",
+            "deposit_amount": row.deposit_amount,
+            "outstanding_balance": row.outstanding_balance,
+            "payment_method": row.payment_method,
+            "review_status": row.review_status,
+            "comment": row.comment,
+            "created_by": row.created_by if row.creator_id is not None else "N/A",
+            "consultant_signature_filename": row.consultant_signature_filename,
+            "patient_signature_filename": row.patient_signature_filename
+        })
+    return result
@@ -0,0 +1,183 @@
+# /app/signatures.py
+# ที่เก็บไฟล์ลายเซ็นแบบ content-addressed
+# - ชื่อไฟล์มาจาก SHA-256 ของรูป จึงเก็บลายเซ็นที่เหมือนกันเพียงไฟล์เดียว
+# - แบ่งไฟล์เป็น subdirectory ตาม hash (เช่น ab/cd/abcd....png) ไม่ให้โฟลเดอร์เดียวมีไฟล์มากเกินไป
+# - การเขียนไฟล์ทำใน background writer thread (queue มีขนาดจำกัด) เท่านั้น ไม่มีการเขียน/fsync ใน request thread
+#   writer หยิบงานจาก queue ทีละชุด: ทุกไฟล์ยัง fsync ของตัวเอง (os.fsync ต่อไฟล์)
+#   ส่วนที่รวมเป็นชุดคือ fsync ของ directory (ครั้งเดียวต่อ directory ต่อชุด)
+# - queue เต็ม: รอไม่เกิน SIGNATURE_QUEUE_TIMEOUT แล้ว raise SignatureStoreBusy (ตอบ 503 ให้ client ลองใหม่)
+# - SIGNATURE_ASYNC_WRITES=0: request ยังส่งงานให้ writer แต่รอจนไฟล์ถูกเขียนเสร็จก่อนคืนค่า
+import atexit
+import base64
+import binascii
+import hashlib
+import os
+import queue
+import threading
+
+PNG_MAGIC = b'\x89PNG\r\n\x1a\n'
+
+
+class SignatureError(ValueError):
+    """ข้อมูลลายเซ็นไม่ถูกต้องหรือใหญ่เกินกำหนด"""
+
+
+class SignatureStoreBusy(Exception):
+    """queue ของ writer เต็ม หรือรอเขียนไฟล์นานเกินกำหนด (ตอบกลับเป็น 503 ให้ client ลองใหม่)"""
+
+
+class SignatureStore:
+    def __init__(self, app=None):
+        self.folder = None
+        self.max_bytes = 256 * 1024
+        self.async_writes = True
+        self.fsync_batch = 32
+        self.queue_timeout = 0.5
+        self.write_timeout = 10
+        self._queue = None
+        self._pending = {} # digest -> Event ที่ set เมื่อ writer เขียนไฟล์นั้นเสร็จ (หรือล้มเหลว)
+        self._pending_lock = threading.Lock()
+        self._threads = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.folder = app.config.get('SIGNATURE_FOLDER') or os.path.join(app.static_folder, 'signatures')
+        self.max_bytes = app.config.get('SIGNATURE_MAX_BYTES', self.max_bytes)
+        self.async_writes = app.config.get('SIGNATURE_ASYNC_WRITES', True)
+        self.fsync_batch = app.config.get('SIGNATURE_FSYNC_BATCH', self.fsync_batch)
+        self.queue_timeout = app.config.get('SIGNATURE_QUEUE_TIMEOUT', self.queue_timeout)
+        self.write_timeout = app.config.get('SIGNATURE_WRITE_TIMEOUT', self.write_timeout)
+        os.makedirs(self.folder, exist_ok=True)
+        app.extensions['signature_store'] = self
+
+        if not self._threads:
+            self._start_writers(app)
+            atexit.register(self.flush)
+
+    def after_fork(self, app):
+        """เรียกใน worker หลัง fork (gunicorn preload_app): สร้าง queue และ writer thread ของ process นี้ใหม่"""
+        self._pending_lock = threading.Lock()
+        self._pending = {}
+        if self._threads:
+            self._threads = []
+            self._start_writers(app)
+
+    def _start_writers(self, app):
+        self._queue = queue.Queue(maxsize=app.config.get('SIGNATURE_QUEUE_SIZE', 256))
+        for i in range(app.config.get('SIGNATURE_WRITER_THREADS', 1)):
+            thread = threading.Thread(target=self._writer_loop, name=f"signature-writer-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def save(self, b64_data):
+        """
+        รับ data URL แบบ Base64 ('data:image/png;base64,....') แล้วคืนชื่อไฟล์ (path ภายใต้โฟลเดอร์ signatures)
+        ไฟล์จะถูกเขียนภายหลังโดย writer thread (หรือรอจนเขียนเสร็จถ้าปิด SIGNATURE_ASYNC_WRITES)
+        raise SignatureStoreBusy ถ้า queue เต็มนานเกิน SIGNATURE_QUEUE_TIMEOUT
+        """
+        if not b64_data:
+            return None
+        encoded = b64_data.split(",", 1)[1] if "," in b64_data else b64_data
+
+        # ตรวจขนาดก่อน decode (Base64 ใหญ่กว่าข้อมูลจริงประมาณ 4/3 เท่า)
+        if len(encoded) > (self.max_bytes * 4) // 3 + 4:
+            raise SignatureError(f"Signature exceeds {self.max_bytes} bytes.")
+        try:
+            data = base64.b64decode(encoded, validate=True)
+        except (binascii.Error, ValueError):
+            raise SignatureError("Signature is not valid Base64.")
+        if len(data) > self.max_bytes:
+            raise SignatureError(f"Signature exceeds {self.max_bytes} bytes.")
+        if not data.startswith(PNG_MAGIC):
+            raise SignatureError("Signature must be a PNG image.")
+
+        digest = hashlib.sha256(data).hexdigest()
+        filename = f"{digest[:2]}/{digest[2:4]}/{digest}.png"
+        path = os.path.join(self.folder, *filename.split('/'))
+
+        with self._pending_lock:
+            written = self._pending.get(digest)
+            enqueue = written is None
+            if enqueue:
+                if os.path.exists(path):
+                    return filename
+                written = self._pending[digest] = threading.Event()
+
+        if enqueue:
+            try:
+                # รอ writer สั้นๆ เท่านั้น: ไม่เขียนเองใน request thread
+                self._queue.put((digest, path, data), timeout=self.queue_timeout)
+            except queue.Full:
+                with self._pending_lock:
+                    self._pending.pop(digest, None)
+                written.set()
+                raise SignatureStoreBusy('Signature writer is busy, please retry.')
+
+        if not self.async_writes:
+            if not written.wait(self.write_timeout):
+                raise SignatureStoreBusy('Saving the signature is taking too long, please retry.')
+            if not os.path.exists(path):
+                raise OSError(f"Signature file {filename} could not be written.")
+        return filename
+
+    def flush(self):
+        """รอจนกว่าไฟล์ที่อยู่ใน queue จะถูกเขียนครบ (ใช้ตอนปิด worker หรือใน test)"""
+        if self._queue is not None:
+            self._queue.join()
+
+    def _writer_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.fsync_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                print(f"Error saving signature files: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, batch):
+        """เขียนไฟล์ทั้งชุดลง temp file แล้ว fsync ครั้งเดียวต่อไฟล์ และครั้งเดียวต่อ directory"""
+        directories = set()
+        try:
+            for digest, path, data in batch:
+                directory = os.path.dirname(path)
+                os.makedirs(directory, exist_ok=True)
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+                directories.add(directory)
+            for directory in directories:
+                _fsync_directory(directory)
+        finally:
+            with self._pending_lock:
+                for digest, _, _ in batch:
+                    written = self._pending.pop(digest, None)
+                    if written is not None:
+                        written.set()
+
+
+def _fsync_directory(directory):
+    # บาง OS (เช่น Windows) เปิด directory เพื่อ fsync ไม่ได้
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+signature_store = SignatureStore()
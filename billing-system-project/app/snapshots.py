@@ -0,0 +1,130 @@
+# /app/snapshots.py
+# รูปแบบการเก็บ TransactionVersion.transaction_snapshot แบบประหยัดพื้นที่
+# - ทุกๆ SNAPSHOT_KEYFRAME_INTERVAL เวอร์ชันจะเก็บ snapshot เต็ม (keyframe)
+# - เวอร์ชันระหว่างนั้นเก็บเฉพาะส่วนที่ต่างจากเวอร์ชันก่อนหน้า (diff ระดับ key)
+# - ทั้งหมดถูกบีบอัดด้วย zlib แล้วเข้ารหัส Base64 เก็บใน column TEXT เดิม (ขึ้นต้นด้วย 'z1:')
+# แถวเก่าที่เป็น JSON ธรรมดายังอ่านได้ตามปกติ และถือเป็น keyframe
+import base64
+import json
+import zlib
+
+from flask import current_app
+from .extensions import db
+from .models import TransactionVersion
+
+PREFIX = 'z1:'
+
+
+class SnapshotError(ValueError):
+    """ไม่สามารถสร้าง snapshot ของเวอร์ชันที่ต้องการได้"""
+
+
+def encode_snapshot(snapshot, version_number, previous=None):
+    """
+    เข้ารหัส snapshot ของ version_number
+    previous = snapshot (dict) ของเวอร์ชันก่อนหน้า ถ้าไม่มีหรือถึงรอบ keyframe จะเก็บแบบเต็ม
+    """
+    interval = current_app.config.get('SNAPSHOT_KEYFRAME_INTERVAL', 10)
+    if previous is None or interval <= 1 or (version_number - 1) % interval == 0:
+        envelope = {'k': 'full', 'd': snapshot}
+    else:
+        envelope = {'k': 'diff', 'd': diff_snapshot(previous, snapshot)}
+    payload = json.dumps(envelope, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return PREFIX + base64.b64encode(zlib.compress(payload, 9)).decode('ascii')
+
+
+def decode_envelope(raw):
+    """คืนค่า envelope {'k': 'full'|'diff', 'd': ...} ของข้อมูลที่เก็บไว้ (รองรับ JSON แบบเก่า)"""
+    if raw.startswith(PREFIX):
+        return json.loads(zlib.decompress(base64.b64decode(raw[len(PREFIX):])).decode('utf-8'))
+    return {'k': 'full', 'd': json.loads(raw)}
+
+
+def diff_snapshot(old, new):
+    """diff ระดับ key บนสุด: key ที่ค่าเปลี่ยน/เพิ่มใหม่อยู่ใน 'set', key ที่หายไปอยู่ใน 'del'"""
+    changes = {key: value for key, value in new.items() if key not in old or old[key] != value}
+    removed = [key for key in old if key not in new]
+    return {'set': changes, 'del': removed}
+
+
+def apply_diff(base, diff):
+    result = dict(base)
+    result.update(diff.get('set', {}))
+    for key in diff.get('del', []):
+        result.pop(key, None)
+    return result
+
+
+def resolve_snapshots(versions):
+    """
+    รับ list ของ TransactionVersion (transaction เดียวกัน) แล้วคืน dict {version_number: snapshot}
+    โดยไล่จากเวอร์ชันเก่าไปใหม่ครั้งเดียว
+    """
+    resolved = {}
+    current = None
+    for version in sorted(versions, key=lambda v: v.version_number):
+        envelope = decode_envelope(version.transaction_snapshot)
+        if envelope['k'] == 'full':
+            current = envelope['d']
+        elif current is None:
+            raise SnapshotError(f"Missing keyframe before version {version.version_number}.")
+        else:
+            current = apply_diff(current, envelope['d'])
+        resolved[version.version_number] = current
+    return resolved
+
+
+def reconstruct_version(transaction_id, version_number):
+    """
+    สร้าง snapshot ของเวอร์ชันที่ต้องการ โดยอ่านย้อนหลังจนเจอ keyframe
+    คืนค่า None ถ้าไม่มีเวอร์ชันนั้น
+    """
+    query = (TransactionVersion.query
+             .filter(TransactionVersion.transaction_id == transaction_id,
+                     TransactionVersion.version_number <= version_number)
+             .order_by(TransactionVersion.version_number.desc()))
+    # ปกติ keyframe อยู่ไม่เกิน SNAPSHOT_KEYFRAME_INTERVAL เวอร์ชันย้อนหลัง
+    # ถ้าไม่เจอ (เช่นเคยเปลี่ยนค่า interval) ค่อยอ่านทั้งหมด
+    interval = current_app.config.get('SNAPSHOT_KEYFRAME_INTERVAL', 10)
+    candidates = query.limit(max(interval, 1)).all()
+    if candidates and not any(decode_envelope(v.transaction_snapshot)['k'] == 'full' for v in candidates):
+        candidates = query.all()
+    if not candidates or candidates[0].version_number != version_number:
+        return None
+
+    chain = []
+    for version in candidates:
+        chain.append(version)
+        if decode_envelope(version.transaction_snapshot)['k'] == 'full':
+            break
+    return resolve_snapshots(chain)[version_number]
+
+
+def latest_snapshot(transaction_id):
+    """คืนค่า (version_number, snapshot) ของเวอร์ชันล่าสุด หรือ (0, None) ถ้ายังไม่มี"""
+    latest = db.session.query(db.func.max(TransactionVersion.version_number)).filter_by(transaction_id=transaction_id).scalar()
+    if not latest:
+        return 0, None
+    return latest, reconstruct_version(transaction_id, latest)
+
+
+def reencode_transaction_versions(transaction_id):
+    """
+    เข้ารหัสทุกเวอร์ชันของ transaction ใหม่เป็นรูปแบบ keyframe + diff (ใช้โดยเครื่องมือ migrate)
+    คืนค่า (ขนาดเดิม, ขนาดใหม่) เป็นจำนวนตัวอักษร
+    """
+    versions = (TransactionVersion.query
+                .filter_by(transaction_id=transaction_id)
+                .order_by(TransactionVersion.version_number)
+                .all())
+    resolved = resolve_snapshots(versions)
+    before = after = 0
+    previous = None
+    for version in versions:
+        snapshot = resolved[version.version_number]
+        encoded = encode_snapshot(snapshot, version.version_number, previous)
+        before += len(version.transaction_snapshot)
+        after += len(encoded)
+        version.transaction_snapshot = encoded
+        previous = snapshot
+    return before, after
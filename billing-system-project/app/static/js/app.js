@@ -890,7 +890,8 @@ function resetFlow() {
 async function loadTransactionHistory() {
     try {
         // --- เพิ่ม options object ที่มี headers เข้าไปตรงนี้ ---
-        const response = await fetch('/api/transaction-history', {
+        // ?stream=1 ให้ server ส่งข้อมูลทีละส่วนแทนการสร้าง JSON ก้อนใหญ่ใน memory
+        const response = await fetch('/api/transaction-history?stream=1', {
             headers: {
                 'X-Requested-With': 'XMLHttpRequest'
             }
@@ -0,0 +1,59 @@
+# /app/user_cache.py
+# Cache ของ User (พร้อม Role) ต่อ process สำหรับ Flask-Login load_user
+# ทุก request ที่ login แล้วจะเรียก load_user และเกือบทุก handler อ่าน current_user.role.role_name
+# cache นี้เก็บ User แบบ detached (โหลด role มาแล้ว) และคืนค่าผ่าน session.merge(load=False)
+# จึงไม่มี SQL บน hot path จนกว่า entry จะหมดอายุ (USER_CACHE_TTL) หรือถูก invalidate
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy.orm import Session, joinedload
+
+from .extensions import db
+from .models import User
+
+
+class UserCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {} # user_id -> (loaded_at, detached User)
+
+    def get(self, user_id):
+        """คืน User ที่ผูกกับ session ของ request ปัจจุบัน หรือ None ถ้าไม่พบ"""
+        ttl = current_app.config.get('USER_CACHE_TTL', 60)
+        entry = self._entries.get(user_id)
+        if entry is None or time.monotonic() - entry[0] > ttl:
+            user = self._load(user_id)
+            with self._lock:
+                if user is None:
+                    self._entries.pop(user_id, None)
+                    return None
+                # ใช้ entry ที่สร้างเองต่อ: invalidate จาก thread อื่นหลังปล่อย lock ลบ entry ออกจาก dict ได้
+                entry = self._entries[user_id] = (time.monotonic(), user)
+        return db.session.merge(entry[1], load=False)
+
+    def warm(self):
+        """โหลดผู้ใช้ที่ active ทั้งหมด (พร้อม role) เข้า cache ด้วย query เดียว เช่นตอน worker เริ่มทำงาน"""
+        with Session(db.engine) as session:
+            users = session.scalars(db.select(User).options(joinedload(User.role)).where(User.is_active == 1)).unique().all()
+        now = time.monotonic()
+        with self._lock:
+            for user in users:
+                self._entries[user.user_id] = (now, user)
+        return len(users)
+
+    def invalidate(self, user_id=None):
+        """ลบ entry ของผู้ใช้ (หรือทั้งหมดถ้าไม่ระบุ) เช่นหลังแก้ไข/ลบผู้ใช้"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def _load(self, user_id):
+        # โหลดด้วย session แยกแล้วปิด เพื่อให้ได้ object แบบ detached ที่ไม่ผูกกับ request ใด
+        with Session(db.engine) as session:
+            return session.get(User, user_id, options=[joinedload(User.role)])
+
+
+user_cache = UserCache()
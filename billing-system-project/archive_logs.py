@@ -0,0 +1,49 @@
+# /archive_logs.py
+# ย้าย log_entries ที่เก่ากว่า LOG_RETENTION_DAYS ไปเก็บเป็นไฟล์ gzip รายเดือนแล้วลบออกจากตาราง (ดู app/log_archive.py)
+# ควรตั้งให้รันเป็นระยะ เช่น cron วันละครั้ง: docker compose exec billing_app python archive_logs.py
+# รูปแบบการใช้งาน: python archive_logs.py [--days N] [--batch-size N] [--dry-run]
+import sys
+from app import create_app
+from app.models import db, LogEntry
+from app.log_archive import log_archive, retention_cutoff
+
+app = create_app()
+
+USAGE = 'Usage: python archive_logs.py [--days N] [--batch-size N] [--dry-run]'
+
+def archive(days=None, batch_size=None, dry_run=False):
+    """Archives log entries older than the retention horizon and deletes them from log_entries."""
+    with app.app_context():
+        days = app.config['LOG_RETENTION_DAYS'] if days is None else days
+        before = retention_cutoff(days)
+        if dry_run:
+            count = db.session.scalar(db.select(db.func.count()).select_from(LogEntry).where(LogEntry.timestamp < before))
+            print(f"{count} log entries older than {before:%Y-%m-%d} would be archived.")
+            return
+        try:
+            count = log_archive().archive(
+                before,
+                batch_size=batch_size or app.config['LOG_ARCHIVE_BATCH_SIZE'],
+                pause=app.config['LOG_ARCHIVE_PAUSE'],
+            )
+        except Exception as e:
+            print(f"Error archiving log entries: {e}")
+            sys.exit(1)
+        print(f"Archived {count} log entries older than {before:%Y-%m-%d} to {app.config['LOG_ARCHIVE_DIR']}.")
+
+def option(args, name, parse):
+    if name not in args:
+        return None
+    try:
+        return parse(args[args.index(name) + 1])
+    except (IndexError, ValueError):
+        print(USAGE)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    archive(
+        days=option(args, '--days', int),
+        batch_size=option(args, '--batch-size', int),
+        dry_run='--dry-run' in args,
+    )
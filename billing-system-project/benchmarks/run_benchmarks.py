@@ -0,0 +1,378 @@
+# /benchmarks/run_benchmarks.py
+# Microbenchmark ของ hot path หลักในระบบ billing
+# สร้างฐานข้อมูล SQLite ชั่วคราว, ใส่ข้อมูลตามจำนวนที่กำหนด แล้ววัด
+# เวลา (median/min/max), จำนวน SQL statement และหน่วยความจำสูงสุด (tracemalloc) ของแต่ละ benchmark
+# ผลลัพธ์บันทึกเป็น JSON เพื่อเปรียบเทียบระหว่างเวอร์ชัน
+#
+# รูปแบบการใช้งาน (รันจากโฟลเดอร์ billing-system-project):
+#   python benchmarks/run_benchmarks.py [--items N] [--staff N] [--transactions N]
+#       [--lines-per-transaction N] [--versions-per-transaction N] [--import-rows N]
+#       [--repeat N] [--only name1,name2] [--output results.json] [--compare baseline.json]
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+# Config อ่าน DB_* ตอน import จึงต้องตั้งค่าไว้ก่อน (ไม่ได้ใช้จริงเพราะ override URI เป็น SQLite)
+for _key, _value in (('DB_USER', 'bench'), ('DB_PASSWORD', ''), ('DB_HOST', 'localhost'), ('DB_PORT', '3306'), ('DB_NAME', 'bench')):
+    os.environ.setdefault(_key, _value)
+
+from sqlalchemy import event  # noqa: E402
+
+from app import create_app  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.extensions import db, bcrypt  # noqa: E402
+from app.catalog import catalog_cache  # noqa: E402
+from app.models import (Role, User, Staff, Item, Transaction, TransactionItem, TransactionVersion,  # noqa: E402
+                        TRANSACTION_TO_DICT_LOADERS, TRANSACTION_CRUD_LOADERS)
+from app.serializers import transaction_select, serialize_transactions  # noqa: E402
+from app.json_provider import FastJSONProvider  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+AJAX = {'X-Requested-With': 'XMLHttpRequest'}
+BENCH_PASSWORD = 'bench-password'
+# PNG ขนาดเล็กสำหรับลายเซ็น
+SIGNATURE_B64 = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNk'
+                 '+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg==')
+
+
+def make_config(workdir):
+    class BenchConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+        DB_POOL_METRICS = False
+        AUDIT_SYNC = True
+        SIGNATURE_ASYNC_WRITES = False
+        SIGNATURE_FOLDER = os.path.join(workdir, 'signatures')
+        IMPORT_UPLOAD_FOLDER = os.path.join(workdir, 'imports')
+        # วัดการ import แบบ synchronous เสมอ
+        IMPORT_BACKGROUND_THRESHOLD = 1 << 62
+    return BenchConfig
+
+
+# --- Seeding ---
+
+def seed(app, volumes, rng):
+    """ใส่ข้อมูลทดสอบด้วย bulk insert (ไม่นับรวมในผล benchmark)"""
+    with app.app_context():
+        db.create_all()
+        role = Role(role_name='super admin')
+        db.session.add(role)
+        db.session.flush()
+        user = User(username='bench', password_hash=bcrypt.generate_password_hash(BENCH_PASSWORD).decode('utf-8'),
+                    full_name='Benchmark User', role_id=role.role_id, is_active=1)
+        db.session.add(user)
+        db.session.flush()
+        user_id = user.user_id
+
+        staff_ids = [f"S{i:05d}" for i in range(volumes['staff'])]
+        db.session.execute(Staff.__table__.insert(), [
+            {'staff_id': sid, 'name_th': f"แพทย์ {sid}", 'name_en': f"Doctor {sid}", 'staff_role': rng.choice(['Doctor', 'Consultant'])}
+            for sid in staff_ids
+        ])
+
+        item_codes = [f"ITM-{i:06d}" for i in range(volumes['items'])]
+        db.session.execute(Item.__table__.insert(), [
+            {'item_code': code, 'name_th': f"รายการ {code}", 'price_opd': rng.randint(10, 5000), 'price_ipd': rng.randint(10, 5000),
+             'price_foreign_opd': rng.randint(10, 5000), 'price_foreign_ipd': rng.randint(10, 5000), 'price_staff': rng.randint(10, 5000)}
+            for code in item_codes
+        ])
+
+        base_date = datetime(2024, 1, 1)
+        transaction_ids = []
+        batch_size = 1000
+        for start in range(0, volumes['transactions'], batch_size):
+            headers, lines, versions = [], [], []
+            for i in range(start, min(start + batch_size, volumes['transactions'])):
+                txn_id = f"TXN-BENCH-{i:08d}"
+                transaction_ids.append(txn_id)
+                total = 0
+                for _ in range(volumes['lines_per_transaction']):
+                    price = rng.randint(10, 5000)
+                    quantity = rng.randint(1, 3)
+                    total += price * quantity
+                    lines.append({'transaction_id': txn_id, 'item_code': rng.choice(item_codes), 'quantity': quantity, 'price_per_unit': price})
+                headers.append({
+                    'transaction_id': txn_id, 'hn': f"HN{rng.randint(1, 99999):05d}", 'patient_fname': f"ชื่อ{i}",
+                    'patient_lname': f"นามสกุล{i}", 'patient_gender': rng.choice(['male', 'female']), 'patient_age': rng.randint(1, 90),
+                    'transaction_date': base_date + timedelta(minutes=i * 7), 'patient_type': rng.choice(['opd', 'ipd', 'foreign_opd']),
+                    'total_amount': total, 'deposit_amount': 0, 'outstanding_balance': total, 'payment_method': rng.choice(['cash', 'card', 'transfer']),
+                    'review_status': 'pending', 'comment': None, 'doctor_id': rng.choice(staff_ids) if staff_ids else None,
+                    'consultant_id': rng.choice(staff_ids) if staff_ids else None, 'created_by_user_id': user_id,
+                    'created_at': datetime.utcnow(), 'updated_at': datetime.utcnow()
+                })
+                for n in range(1, volumes['versions_per_transaction'] + 1):
+                    versions.append({'transaction_id': txn_id, 'version_number': n, 'transaction_snapshot': json.dumps({'transaction_id': txn_id, 'version': n}),
+                                     'change_reason': 'seed', 'created_by_user_id': user_id, 'created_at': datetime.utcnow()})
+            db.session.execute(Transaction.__table__.insert(), headers)
+            if lines:
+                db.session.execute(TransactionItem.__table__.insert(), lines)
+            if versions:
+                db.session.execute(TransactionVersion.__table__.insert(), versions)
+        db.session.commit()
+    return {'staff_ids': staff_ids, 'item_codes': item_codes, 'transaction_ids': transaction_ids}
+
+
+# --- Measurement ---
+
+@contextmanager
+def count_statements(engine):
+    counter = {'statements': 0}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter['statements'] += 1
+
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def measure(app, name, func, repeat, setup=None):
+    """รัน func ซ้ำ repeat ครั้ง (มี warm-up 1 ครั้ง) คืนค่าสถิติเวลา, จำนวน SQL และ peak memory"""
+    with app.app_context():
+        engine = db.engine
+    if setup:
+        setup()
+    func()  # warm-up
+
+    timings, statements, peaks = [], [], []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        gc.collect()
+        with count_statements(engine) as counter:
+            tracemalloc.start()
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        timings.append(elapsed)
+        statements.append(counter['statements'])
+        peaks.append(peak)
+
+    result = {
+        'name': name,
+        'repeat': repeat,
+        'time_median_ms': round(statistics.median(timings) * 1000, 3),
+        'time_min_ms': round(min(timings) * 1000, 3),
+        'time_max_ms': round(max(timings) * 1000, 3),
+        'sql_statements': max(statements),
+        'peak_memory_kb': round(max(peaks) / 1024, 1),
+    }
+    print(f"  {name:<36} {result['time_median_ms']:>10.2f} ms  {result['sql_statements']:>6} SQL  {result['peak_memory_kb']:>10.1f} KB")
+    return result
+
+
+def build_benchmarks(app, client, seeded, volumes, rng):
+    """คืน list ของ (ชื่อ, function, setup)"""
+    transaction_ids = seeded['transaction_ids']
+    item_codes = seeded['item_codes']
+    staff_ids = seeded['staff_ids']
+    counter = {'save': 0}
+
+    def check(response, status=200):
+        if response.status_code != status:
+            raise RuntimeError(f"Unexpected status {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        return response
+
+    def to_dict_all():
+        with app.app_context():
+            [t.to_dict() for t in Transaction.query.options(*TRANSACTION_TO_DICT_LOADERS).all()]
+
+    def serializer_all():
+        with app.app_context():
+            serialize_transactions(db.session.execute(transaction_select()))
+
+    # รายการ transaction ทั้งหมดแบบเดียวกับ /api/transaction-history สำหรับวัดเฉพาะเวลา encode JSON
+    with app.app_context():
+        history_orm = [t.to_dict() for t in Transaction.query.options(*TRANSACTION_TO_DICT_LOADERS).all()]
+        history_rows = serialize_transactions(db.session.execute(transaction_select()))
+    providers = {'flask': DefaultJSONProvider(app), 'stdlib': FastJSONProvider(app), 'orjson': FastJSONProvider(app)}
+    providers['stdlib']._orjson = None
+
+    def dumps_with(provider_name, payload):
+        provider = providers[provider_name]
+        return lambda: provider.dumps(payload)
+
+    def to_dict_for_crud_all():
+        with app.app_context():
+            [t.to_dict_for_crud() for t in Transaction.query.options(*TRANSACTION_CRUD_LOADERS).all()]
+
+    def initial_data():
+        check(client.get('/api/initial-data', headers=AJAX))
+
+    def transaction_history():
+        check(client.get('/api/transaction-history', headers=AJAX))
+
+    def transaction_history_stream():
+        check(client.get('/api/transaction-history?stream=1', headers=AJAX)).get_data()
+
+    def records_transactions():
+        check(client.get('/api/transactions'))
+
+    def records_transactions_fields():
+        check(client.get('/api/transactions?fields=transaction_id,transaction_date,patient_name,total_amount'))
+
+    def cart():
+        return [{'itemcode': rng.choice(item_codes), 'quantity': rng.randint(1, 3), 'price': rng.randint(10, 5000)}
+                for _ in range(volumes['lines_per_transaction'])]
+
+    def save_transaction():
+        counter['save'] += 1
+        payload = {
+            'transaction_id': f"TXN-SAVE-{counter['save']:08d}", 'patient_hn': 'HN00001', 'fname': 'ทดสอบ', 'lname': 'ระบบ',
+            'gender': 'male', 'patient_age': 30, 'date': datetime.utcnow().isoformat() + 'Z', 'type': 'opd', 'total': 100,
+            'deposit_amount': 0, 'outstanding_balance': 100, 'payment_method': 'cash', 'review_status': 'pending',
+            'doctor_id': staff_ids[0] if staff_ids else None, 'consultant_id': staff_ids[-1] if staff_ids else None,
+            'cartItems': cart(), 'consultant_signature_b64': SIGNATURE_B64
+        }
+        check(client.post('/api/save-transaction', json=payload))
+
+    def update_transaction():
+        txn_id = rng.choice(transaction_ids)
+        payload = {
+            'patient_hn': 'HN00002', 'fname': 'แก้ไข', 'lname': 'ข้อมูล', 'gender': 'female', 'type': 'ipd', 'total': 200,
+            'deposit_amount': 0, 'outstanding_balance': 200, 'payment_method': 'card', 'review_status': 'reviewed',
+            'doctor_id': staff_ids[0] if staff_ids else None, 'cartItems': cart(), 'change_reason': 'benchmark'
+        }
+        check(client.put(f"/api/transaction/{txn_id}", json=payload))
+
+    header = 'item_code,name_th,price_opd,price_ipd,price_foreign_opd,price_foreign_ipd,price_staff\n'
+    half = volumes['import_rows'] // 2
+    # ครึ่งหนึ่งเป็นรายการที่มีอยู่แล้ว (update) อีกครึ่งเป็นรายการใหม่ (insert)
+    import_csv = header + ''.join(
+        f"{code},รายการนำเข้า {code},{i},{i},{i},{i},{i}\n" for i, code in enumerate(item_codes[:half])
+    )
+    import_counter = {'n': 0}
+
+    def csv_import():
+        import_counter['n'] += 1
+        new_rows = ''.join(
+            f"IMP-{import_counter['n']:04d}-{i:06d},รายการใหม่ {i},{i},{i},{i},{i},{i}\n" for i in range(volumes['import_rows'] - half)
+        )
+        data = {'target_table': 'items', 'csv_file': (io.BytesIO((import_csv + new_rows).encode('utf-8')), 'bench.csv')}
+        check(client.post('/import', data=data, content_type='multipart/form-data'), status=302)
+
+    return [
+        ('transaction.to_dict', to_dict_all, None),
+        ('transaction.to_dict_for_crud', to_dict_for_crud_all, None),
+        ('transaction.serializer', serializer_all, None),
+        ('json.transactions.flask', dumps_with('flask', history_orm), None),
+        ('json.transactions.stdlib', dumps_with('stdlib', history_rows), None),
+        ('json.transactions.orjson', dumps_with('orjson', history_rows), None),
+        ('api.initial_data.cold', initial_data, catalog_cache.invalidate),
+        ('api.initial_data.warm', initial_data, None),
+        ('api.transaction_history', transaction_history, None),
+        ('api.transaction_history.stream', transaction_history_stream, None),
+        ('api.records.transactions', records_transactions, None),
+        ('api.records.transactions.fields', records_transactions_fields, None),
+        ('api.save_transaction', save_transaction, None),
+        ('api.update_transaction', update_transaction, None),
+        ('import_page.items_csv', csv_import, None),
+    ]
+
+
+# --- Reporting ---
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {r['name']: r for r in json.load(f)['results']}
+    print(f"\nComparison with {baseline_path}:")
+    for result in results:
+        old = baseline.get(result['name'])
+        if not old:
+            continue
+        ratio = result['time_median_ms'] / old['time_median_ms'] if old['time_median_ms'] else float('inf')
+        print(f"  {result['name']:<36} {old['time_median_ms']:>10.2f} -> {result['time_median_ms']:>10.2f} ms (x{ratio:.2f})"
+              f"  SQL {old['sql_statements']} -> {result['sql_statements']}"
+              f"  mem {old['peak_memory_kb']:.0f} -> {result['peak_memory_kb']:.0f} KB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark billing hot paths against a seeded SQLite database.')
+    parser.add_argument('--items', type=int, default=2000)
+    parser.add_argument('--staff', type=int, default=100)
+    parser.add_argument('--transactions', type=int, default=2000)
+    parser.add_argument('--lines-per-transaction', type=int, default=5)
+    parser.add_argument('--versions-per-transaction', type=int, default=1)
+    parser.add_argument('--import-rows', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--only', help='Comma-separated benchmark names to run')
+    parser.add_argument('--output', default=os.path.join(PROJECT_ROOT, 'benchmarks', 'results', f"bench-{datetime.now():%Y%m%d-%H%M%S}.json"))
+    parser.add_argument('--compare', help='Previous results JSON to compare against')
+    args = parser.parse_args(argv)
+
+    volumes = {
+        'items': args.items, 'staff': args.staff, 'transactions': args.transactions,
+        'lines_per_transaction': args.lines_per_transaction, 'versions_per_transaction': args.versions_per_transaction,
+        'import_rows': min(args.import_rows, args.items * 2),
+    }
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix='billing-bench-')
+    try:
+        app = create_app(make_config(workdir))
+        print(f"Seeding {volumes} ...")
+        seeded = seed(app, volumes, rng)
+
+        client = app.test_client()
+        response = client.post('/api/login', json={'username': 'bench', 'password': BENCH_PASSWORD})
+        if response.status_code != 200:
+            raise RuntimeError('Benchmark login failed.')
+
+        selected = set(args.only.split(',')) if args.only else None
+        results = []
+        print(f"{'benchmark':<38} {'median':>10}     {'SQL':>6}      {'peak mem':>10}")
+        for name, func, setup in build_benchmarks(app, client, seeded, volumes, rng):
+            if selected and name not in selected:
+                continue
+            results.append(measure(app, name, func, args.repeat, setup))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'volumes': volumes,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nResults saved to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
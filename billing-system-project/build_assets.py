@@ -0,0 +1,71 @@
+# /build_assets.py
+# สร้าง static asset สำหรับ production: copy css/js/รูปภาพไปไว้ที่ app/static/dist/ โดยใส่ hash ของเนื้อหาในชื่อไฟล์
+# (เช่น js/app.js -> dist/js/app.3f2a9c1b7d4e.js) พร้อมไฟล์ .gz / .br ที่บีบอัดไว้แล้ว และ manifest.json
+# template เรียกผ่าน asset_url('js/app.js') (app/compression.py) ซึ่งจะใช้ไฟล์ใน manifest ถ้ามี
+# ไม่ต้องเชื่อมต่อ DB (รันตอน docker build ได้) และรันใหม่ทุกครั้งที่แก้ไฟล์ใน static
+# รูปแบบการใช้งาน: python build_assets.py
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app', 'static')
+ASSET_DIR = 'dist'             # ต้องตรงกับ app/compression.py
+MANIFEST_FILE = 'manifest.json'
+SKIP_DIRS = {ASSET_DIR, 'signatures'} # signatures เป็นไฟล์ของผู้ใช้ ไม่ใช่ asset
+HASHED_EXTENSIONS = {'.css', '.js', '.png', '.jpg', '.svg', '.ico', '.woff2'}
+COMPRESSED_EXTENSIONS = {'.css', '.js', '.svg'}
+HASH_LENGTH = 12
+
+def source_files():
+    for root, dirs, files in os.walk(STATIC_FOLDER):
+        dirs[:] = sorted(d for d in dirs if os.path.relpath(os.path.join(root, d), STATIC_FOLDER) not in SKIP_DIRS)
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in HASHED_EXTENSIONS:
+                yield os.path.relpath(os.path.join(root, name), STATIC_FOLDER).replace(os.sep, '/')
+
+def build():
+    """Writes content-hashed (and precompressed) copies of the static assets plus manifest.json."""
+    dist = os.path.join(STATIC_FOLDER, ASSET_DIR)
+    shutil.rmtree(dist, ignore_errors=True)
+    manifest = {}
+    original_bytes = gzip_bytes = 0
+    for filename in source_files():
+        with open(os.path.join(STATIC_FOLDER, filename), 'rb') as f:
+            content = f.read()
+        stem, ext = os.path.splitext(filename)
+        hashed = f"{ASSET_DIR}/{stem}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{ext}"
+        target = os.path.join(STATIC_FOLDER, hashed)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(content)
+        if ext.lower() in COMPRESSED_EXTENSIONS:
+            compressed = gzip.compress(content, compresslevel=9, mtime=0)
+            with open(target + '.gz', 'wb') as f:
+                f.write(compressed)
+            if brotli is not None:
+                with open(target + '.br', 'wb') as f:
+                    f.write(brotli.compress(content, quality=11))
+            original_bytes += len(content)
+            gzip_bytes += len(compressed)
+        manifest[filename] = hashed
+
+    with open(os.path.join(dist, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    print(f"Built {len(manifest)} assets into {dist}.")
+    if original_bytes:
+        print(f"Text assets: {original_bytes} bytes -> {gzip_bytes} bytes gzip"
+              f"{'' if brotli else ' (install brotli for .br files)'}.")
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        print('Usage: python build_assets.py')
+        sys.exit(1)
+    build()
@@ -0,0 +1,52 @@
+# /create_tables.py
+# สร้างตารางและ index ที่ยังไม่มีในฐานข้อมูล (เช่น import_jobs, index ของ transactions) ตาม models ปัจจุบัน
+# db.create_all() จะข้ามตารางที่มีอยู่แล้ว แต่จะไม่เพิ่ม index ให้ตารางเดิม จึงตรวจและสร้าง index แยกอีกขั้น
+# รันซ้ำได้อย่างปลอดภัย
+# รูปแบบการใช้งาน: python create_tables.py [--dry-run]
+import sys
+from app import create_app
+from app.models import db
+
+app = create_app()
+
+def create_missing_tables():
+    """Creates tables defined in the models that do not exist yet."""
+    with app.app_context():
+        existing = set(db.inspect(db.engine).get_table_names())
+        db.create_all()
+        created = set(db.inspect(db.engine).get_table_names()) - existing
+        if created:
+            print(f"Created tables: {', '.join(sorted(created))}")
+        else:
+            print("All tables already exist.")
+
+def create_missing_indexes(dry_run=False):
+    """Creates indexes declared on the models (__table_args__) that are missing from existing tables."""
+    with app.app_context():
+        inspector = db.inspect(db.engine)
+        table_names = set(inspector.get_table_names())
+        missing = []
+        for table in db.metadata.sorted_tables:
+            if table.name not in table_names:
+                continue
+            existing = {index['name'] for index in inspector.get_indexes(table.name)}
+            missing.extend(index for index in sorted(table.indexes, key=lambda i: i.name) if index.name not in existing)
+
+        if not missing:
+            print("All indexes already exist.")
+            return
+        for index in missing:
+            columns = ', '.join(column.name for column in index.columns)
+            if dry_run:
+                print(f"[dry-run] Would create index {index.name} on {index.table.name} ({columns})")
+                continue
+            print(f"Creating index {index.name} on {index.table.name} ({columns})...")
+            index.create(bind=db.engine)
+        if not dry_run:
+            print(f"Created {len(missing)} index(es).")
+
+if __name__ == '__main__':
+    dry_run = '--dry-run' in sys.argv[1:]
+    if not dry_run:
+        create_missing_tables()
+    create_missing_indexes(dry_run=dry_run)
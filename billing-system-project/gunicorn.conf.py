@@ -0,0 +1,90 @@
+# /gunicorn.conf.py
+# ค่าตั้งของ gunicorn สำหรับ production (gunicorn อ่านไฟล์นี้อัตโนมัติเมื่อรันจากโฟลเดอร์นี้ หรือระบุ -c gunicorn.conf.py)
+# รูปแบบการใช้งาน: gunicorn -c gunicorn.conf.py main:app
+#
+# ค่าทั้งหมดปรับได้ผ่าน environment variable (GUNICORN_*)
+# - worker แบบ gthread: request ที่ช้า (import, history) ไม่บล็อก request อื่นใน worker เดียวกัน
+# - จำนวน worker x threads ต่อ worker ไม่ควรเกิน DB_POOL_SIZE + DB_MAX_OVERFLOW (connection ต่อ worker)
+#   และ workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) ต้องไม่เกิน max_connections ของ MySQL
+# - preload_app: import app ครั้งเดียวใน master แล้ว fork (เริ่มเร็ว, ใช้ memory ร่วมกันแบบ copy-on-write)
+#   post_fork จะล้าง connection / thread ที่ copy มาจาก master และ warm up (ดู app/lifecycle.py)
+# - max_requests + jitter: restart worker เป็นระยะ (ไม่พร้อมกัน) เพื่อคุม memory ที่โตขึ้นเรื่อยๆ
+# - graceful_timeout: ตอน reload (HUP) / หยุด (TERM) worker เลิกรับ request ใหม่และรอ request ที่ค้างอยู่จนครบเวลานี้
+# - background import (หน้า Import CSV) รันเป็น thread ใน worker: worker_exit จะรอ import ของ worker นั้น
+#   ไม่เกิน IMPORT_SHUTDOWN_TIMEOUT แล้วหยุดและ mark job ที่ยังไม่จบเป็น failed (ข้อมูลที่ commit แล้วยังอยู่, import ซ้ำได้)
+#   graceful_timeout จึงต้องมากกว่า IMPORT_SHUTDOWN_TIMEOUT + 5 วินาที ไม่เช่นนั้น worker ถูก kill ก่อน mark
+#   ถ้ามี import ที่ใช้เวลานานกว่านั้นเป็นประจำ ให้ตั้ง GUNICORN_MAX_REQUESTS=0 เพื่อไม่ให้ worker ถูก recycle ระหว่าง import
+import os
+
+
+def _cpu_count():
+    # ใช้จำนวน CPU ที่ process ใช้ได้จริง (cgroup / taskset ใน container) ถ้าระบบรองรับ
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+cpus = _cpu_count()
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+if worker_class not in ('gthread', 'sync'):
+    raise ValueError(f"Configuration error: Unsupported GUNICORN_WORKER_CLASS '{worker_class}'. Use 'gthread' or 'sync'.")
+
+if worker_class == 'gthread':
+    # thread รอ I/O ของ DB เป็นส่วนใหญ่ จึงใช้ worker น้อยกว่าแบบ sync และให้ thread รับงานแทน
+    workers = _env_int('GUNICORN_WORKERS', min(cpus + 1, _env_int('GUNICORN_MAX_WORKERS', 8)))
+    threads = _env_int('GUNICORN_THREADS', 4)
+else:
+    workers = _env_int('GUNICORN_WORKERS', min(cpus * 2 + 1, _env_int('GUNICORN_MAX_WORKERS', 8)))
+    threads = 1
+
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+timeout = _env_int('GUNICORN_TIMEOUT', 120)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10)
+# ค่าเดียวกับ Config.IMPORT_SHUTDOWN_TIMEOUT (ใช้ตรวจว่า graceful_timeout พอให้ worker_exit หยุด import ได้ทัน)
+import_shutdown_timeout = _env_int('IMPORT_SHUTDOWN_TIMEOUT', 20)
+
+# heartbeat ของ worker เขียนลง tmpfs แทน overlay filesystem ของ container (ไม่ให้ worker ค้างเพราะ disk)
+worker_tmp_dir = os.getenv('GUNICORN_WORKER_TMP_DIR', '/dev/shm' if os.path.isdir('/dev/shm') else None)
+
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+errorlog = '-'
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+proc_name = 'billing'
+
+
+def _flask_app():
+    # main ถูก import ไปแล้วใน master ถ้าใช้ preload_app (ได้ app ตัวเดียวกัน)
+    from main import app
+    return app
+
+
+def on_starting(server):
+    from app.lifecycle import clear_metrics_dir
+    clear_metrics_dir(os.getenv('METRICS_MULTIPROC_DIR', ''))
+    server.log.info("Starting %s %s worker(s) x %s thread(s), preload=%s, max_requests=%s (+%s jitter)",
+                    workers, worker_class, threads, preload_app, max_requests, max_requests_jitter)
+    if graceful_timeout < import_shutdown_timeout + 5:
+        server.log.warning("GUNICORN_GRACEFUL_TIMEOUT (%s) is shorter than IMPORT_SHUTDOWN_TIMEOUT + 5 (%s): "
+                           "workers may be killed before unfinished imports are marked failed.",
+                           graceful_timeout, import_shutdown_timeout + 5)
+
+
+def post_fork(server, worker):
+    from app.lifecycle import after_fork
+    after_fork(_flask_app())
+
+
+def worker_exit(server, worker):
+    from app.lifecycle import before_exit
+    before_exit(_flask_app())
@@ -0,0 +1,50 @@
+# /migrate_snapshots.py
+# แปลง TransactionVersion.transaction_snapshot แบบเก่า (JSON เต็มทุกเวอร์ชัน)
+# ให้เป็นรูปแบบ keyframe + diff ที่บีบอัดแล้ว (ดู app/snapshots.py)
+# รันซ้ำได้: แถวที่แปลงแล้วจะถูกอ่านกลับและเข้ารหัสใหม่ด้วยค่า SNAPSHOT_KEYFRAME_INTERVAL ปัจจุบัน
+# รูปแบบการใช้งาน: python migrate_snapshots.py [--dry-run] [--batch-size N]
+import sys
+from app import create_app
+from app.models import db, TransactionVersion
+from app.snapshots import reencode_transaction_versions
+
+app = create_app()
+
+def migrate(dry_run=False, batch_size=200):
+    """Re-encodes every transaction's version history, committing every batch_size transactions."""
+    with app.app_context():
+        transaction_ids = [row[0] for row in db.session.query(TransactionVersion.transaction_id).distinct().order_by(TransactionVersion.transaction_id)]
+        print(f"Found {len(transaction_ids)} transactions with version history.")
+
+        total_before = total_after = 0
+        for index, transaction_id in enumerate(transaction_ids, start=1):
+            before, after = reencode_transaction_versions(transaction_id)
+            total_before += before
+            total_after += after
+            if index % batch_size == 0:
+                if dry_run:
+                    db.session.rollback()
+                else:
+                    db.session.commit()
+                print(f"  {index}/{len(transaction_ids)} transactions processed...")
+
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+
+        saved = total_before - total_after
+        ratio = (saved / total_before * 100) if total_before else 0
+        print(f"{'[dry-run] ' if dry_run else ''}Snapshot storage: {total_before} -> {total_after} chars ({ratio:.1f}% saved).")
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    dry_run = '--dry-run' in args
+    batch_size = 200
+    if '--batch-size' in args:
+        try:
+            batch_size = int(args[args.index('--batch-size') + 1])
+        except (IndexError, ValueError):
+            print('Usage: python migrate_snapshots.py [--dry-run] [--batch-size N]')
+            sys.exit(1)
+    migrate(dry_run=dry_run, batch_size=batch_size)
@@ -0,0 +1,43 @@
+# /rebuild_revenue_summary.py
+# คำนวณตารางสรุปรายได้รายวัน (revenue_daily_*) ใหม่จาก transactions (ดู app/revenue.py)
+# ใช้ตอน backfill ครั้งแรกหลังสร้างตาราง (python create_tables.py) หรือเมื่อยอดในรายงานไม่ตรง
+# รูปแบบการใช้งาน: python rebuild_revenue_summary.py [--from YYYY-MM-DD] [--to YYYY-MM-DD] [--batch-size N]
+import sys
+from datetime import date
+from app import create_app
+from app.models import db
+from app.revenue import rebuild_summaries
+
+app = create_app()
+
+USAGE = 'Usage: python rebuild_revenue_summary.py [--from YYYY-MM-DD] [--to YYYY-MM-DD] [--batch-size N]'
+
+def rebuild(date_from=None, date_to=None, batch_size=1000):
+    """Rebuilds the revenue summary tables for the given local date range (all dates if omitted)."""
+    with app.app_context():
+        try:
+            count = rebuild_summaries(date_from, date_to, batch_size=batch_size)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error rebuilding revenue summaries: {e}")
+            sys.exit(1)
+        scope = f"{date_from or 'beginning'} to {date_to or 'today'}"
+        print(f"Rebuilt revenue summaries from {count} transactions ({scope}).")
+
+def option(args, name, parse):
+    if name not in args:
+        return None
+    try:
+        return parse(args[args.index(name) + 1])
+    except (IndexError, ValueError):
+        print(USAGE)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    rebuild(
+        date_from=option(args, '--from', date.fromisoformat),
+        date_to=option(args, '--to', date.fromisoformat),
+        batch_size=option(args, '--batch-size', int) or 1000,
+    )
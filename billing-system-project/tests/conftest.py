@@ -0,0 +1,83 @@
+# /tests/conftest.py
+# fixture กลางของชุดทดสอบ: สร้างแอปบนฐานข้อมูล SQLite ชั่วคราวแทน MySQL
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+# Config อ่าน DB_* ตอน import จึงต้องตั้งค่าไว้ก่อน (ไม่ได้ใช้จริงเพราะ override URI เป็น SQLite)
+for _key, _value in (('DB_USER', 'test'), ('DB_PASSWORD', ''), ('DB_HOST', 'localhost'), ('DB_PORT', '3306'), ('DB_NAME', 'test')):
+    os.environ.setdefault(_key, _value)
+
+from app import create_app  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.extensions import db, bcrypt  # noqa: E402
+from app.models import Role, User, Staff, Item, Transaction, TransactionItem  # noqa: E402
+
+AJAX = {'X-Requested-With': 'XMLHttpRequest'}
+TEST_PASSWORD = 'test-password'
+
+
+@pytest.fixture
+def app(tmp_path):
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+        SQLALCHEMY_BINDS = {}
+        DB_POOL_METRICS = False
+        AUDIT_SYNC = True
+        SIGNATURE_FOLDER = str(tmp_path / 'signatures')
+        IMPORT_UPLOAD_FOLDER = str(tmp_path / 'imports')
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        role = Role(role_name='super admin')
+        db.session.add(role)
+        db.session.flush()
+        db.session.add(User(username='tester', password_hash=bcrypt.generate_password_hash(TEST_PASSWORD).decode('utf-8'),
+                            full_name='Test User', role_id=role.role_id, is_active=1))
+        for i in range(3):
+            db.session.add(Item(item_code=f'I{i}', name_th=f'รายการ {i}', price_opd=100 + i))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    response = client.post('/api/login', json={'username': 'tester', 'password': TEST_PASSWORD})
+    assert response.status_code == 200, response.data
+    return client
+
+
+def add_transactions(app, count, lines_per_transaction=3):
+    """
+    เพิ่ม transaction ทีละ count บิล (บิลละ lines_per_transaction รายการ) ต่อจากที่มีอยู่
+    แต่ละบิลมีแพทย์/ที่ปรึกษาของตัวเอง เพื่อให้ lazy load ที่หลุดมาเห็นเป็น query ต่อบิล (ไม่ถูก identity map ซ่อนไว้)
+    """
+    with app.app_context():
+        user = User.query.filter_by(username='tester').one()
+        start = Transaction.query.count()
+        base = datetime(2025, 1, 1)
+        for n in range(start, start + count):
+            db.session.add(Staff(staff_id=f'D{n}', name_th=f'แพทย์ {n}', staff_role='doctor'))
+            db.session.add(Staff(staff_id=f'C{n}', name_th=f'ที่ปรึกษา {n}', staff_role='consultant'))
+            transaction = Transaction(
+                transaction_id=f'TXN-{n:06d}', hn=f'HN{n % 11}', patient_fname=f'ชื่อ{n}', patient_lname='ทดสอบ',
+                transaction_date=base + timedelta(minutes=n), patient_type='opd', total_amount=100 * lines_per_transaction,
+                deposit_amount=0, outstanding_balance=100 * lines_per_transaction, payment_method='cash',
+                doctor_id=f'D{n}', consultant_id=f'C{n}', created_by_user_id=user.user_id)
+            db.session.add(transaction)
+            for line in range(lines_per_transaction):
+                db.session.add(TransactionItem(transaction_id=transaction.transaction_id, item_code=f'I{line % 3}',
+                                               quantity=1, price_per_unit=100))
+        db.session.commit()
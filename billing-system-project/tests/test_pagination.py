@@ -0,0 +1,14 @@
+# /tests/test_pagination.py
+# ตรวจการแปลงค่าจาก query string/cursor ของ app/pagination.py
+from datetime import datetime
+
+from app.models import Transaction
+from app.pagination import coerce_value
+
+
+def test_datetime_with_offset_is_converted_to_utc():
+    column = Transaction.__table__.c.transaction_date
+    assert coerce_value(column, '2025-01-02T00:00:00+07:00') == datetime(2025, 1, 1, 17, 0)
+    assert coerce_value(column, '2025-01-01T17:00:00Z') == datetime(2025, 1, 1, 17, 0)
+    # ค่าที่ไม่มี offset ถือเป็น UTC อยู่แล้ว
+    assert coerce_value(column, '2025-01-01T17:00:00') == datetime(2025, 1, 1, 17, 0)
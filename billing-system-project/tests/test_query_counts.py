@@ -0,0 +1,76 @@
+# /tests/test_query_counts.py
+# ตรวจว่าจำนวน SQL statement ต่อ request ไม่เพิ่มตามจำนวนแถว (ไม่มี N+1 query)
+# ใช้กับ endpoint ที่ serialize transaction/log พร้อม relationship (doctor/consultant/items/user)
+import json
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event
+
+from app.extensions import db
+from app.models import LogEntry, Role, User
+from conftest import AJAX, add_transactions
+
+
+@contextmanager
+def count_statements(app):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def add_log_entries(app, count):
+    """เพิ่ม log ทีละ count แถว แต่ละแถวเป็นของผู้ใช้คนละคน"""
+    with app.app_context():
+        role = Role.query.first()
+        start = User.query.count()
+        for n in range(start, start + count):
+            user = User(username=f'user{n}', password_hash='-', full_name=f'ผู้ใช้ {n}', role_id=role.role_id, is_active=1)
+            db.session.add(user)
+            db.session.flush()
+            db.session.add(LogEntry(user_id=user.user_id, action=f'test entry {n}'))
+        db.session.commit()
+
+
+def rows_in(response):
+    if response.mimetype == 'application/x-ndjson':
+        return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    body = response.get_json()
+    return body['data'] if isinstance(body, dict) else body
+
+
+@pytest.mark.parametrize('url, seed', [
+    ('/api/transaction-history', add_transactions),
+    ('/api/transaction-history?stream=1', add_transactions),
+    ('/api/transaction-history?format=ndjson', add_transactions),
+    ('/api/transactions', add_transactions),
+    ('/api/transactions?limit=200', add_transactions),
+    ('/api/logs', add_log_entries),
+    ('/api/logs?limit=200', add_log_entries),
+])
+def test_statement_count_does_not_grow_with_rows(app, client, url, seed):
+    # request แรกเติม cache (user, catalog) ก่อน จึงไม่นับ
+    client.get(url, headers=AJAX)
+
+    counts = []
+    previous = len(rows_in(client.get(url, headers=AJAX)))
+    for added in (5, 45):
+        seed(app, added)
+        with count_statements(app) as statements:
+            response = client.get(url, headers=AJAX)
+            rows = rows_in(response)
+        assert response.status_code == 200, response.data
+        assert len(rows) == previous + added
+        previous = len(rows)
+        counts.append(len(statements))
+
+    assert counts[0] == counts[1], f'{url}: {counts[0]} statements for few rows, {counts[1]} for many'
@@ -0,0 +1,45 @@
+# /tests/test_transaction_search.py
+# ตรวจการกรองวันที่ของ /api/transactions/search: date_from/date_to เป็นวันตามเวลา Asia/Bangkok
+# ส่วน transaction_date เก็บเป็น UTC (บิลตอนเช้ามืดของไทยยังเป็นวันก่อนหน้าใน UTC)
+from datetime import datetime
+
+import pytest
+
+from app.extensions import db
+from app.models import Staff, Transaction, User
+from conftest import AJAX
+
+
+@pytest.fixture
+def bills(app):
+    with app.app_context():
+        user = User.query.filter_by(username='tester').one()
+        db.session.add(Staff(staff_id='D1', name_th='แพทย์', staff_role='doctor'))
+        for transaction_id, transaction_date in (
+            ('TXN-LATE', datetime(2025, 1, 1, 16, 30)),   # 23:30 วันที่ 1 ม.ค. เวลาไทย
+            ('TXN-EARLY', datetime(2025, 1, 1, 20, 0)),   # 03:00 วันที่ 2 ม.ค. เวลาไทย
+            ('TXN-NEXT', datetime(2025, 1, 2, 17, 0)),    # 00:00 วันที่ 3 ม.ค. เวลาไทย
+        ):
+            db.session.add(Transaction(
+                transaction_id=transaction_id, hn='HN1', patient_fname='ชื่อ', patient_lname='ทดสอบ',
+                transaction_date=transaction_date, patient_type='opd', total_amount=100, deposit_amount=0,
+                outstanding_balance=100, payment_method='cash', doctor_id='D1', created_by_user_id=user.user_id))
+        db.session.commit()
+
+
+def search_ids(client, query):
+    response = client.get(f'/api/transactions/search?{query}', headers=AJAX)
+    assert response.status_code == 200, response.data
+    return [row['transaction_id'] for row in response.get_json()['data']]
+
+
+def test_date_filter_uses_bangkok_days(client, bills):
+    assert search_ids(client, 'date_from=2025-01-02&date_to=2025-01-02') == ['TXN-EARLY']
+    assert search_ids(client, 'date_from=2025-01-01&date_to=2025-01-01') == ['TXN-LATE']
+    assert search_ids(client, 'date_from=2025-01-02') == ['TXN-NEXT', 'TXN-EARLY']
+    assert search_ids(client, 'transaction_date_to=2025-01-01') == ['TXN-LATE']
+
+
+def test_date_filter_rejects_non_dates(client, bills):
+    response = client.get('/api/transactions/search?date_from=2025-01-02T00:00:00', headers=AJAX)
+    assert response.status_code == 400
@@ -33,6 +33,17 @@ const jwt = require('jsonwebtoken');
 //         res.status(statusCode).json({ message });
 //     }
 // };
+
+// ตั้ง cookie ของ access token (และ refresh token ถ้ามี) ตามอายุที่ Billing API ส่งมา
+// ถ้า API ไม่ได้ส่งอายุมา ใช้ค่าเริ่มต้น: access 2 ชั่วโมง (เหมือนเดิม), refresh 1 วัน (เท่ากับ AUTH_REFRESH_TOKEN_TTL)
+const setTokenCookies = (res, { token, expires_in, refresh_token, refresh_expires_in }) => {
+    const options = { httpOnly: true, secure: process.env.NODE_ENV === 'production' };
+    res.cookie('token', token, { ...options, maxAge: (expires_in || 2 * 60 * 60) * 1000 });
+    if (refresh_token) {
+        res.cookie('refresh_token', refresh_token, { ...options, maxAge: (refresh_expires_in || 24 * 60 * 60) * 1000 });
+    }
+};
+
 const login = async (req, res) => {
     try {
         const { username, password } = req.body;
@@ -41,13 +52,8 @@ const login = async (req, res) => {
             password
         });
 
-        const { token } = response.data;
-
-        res.cookie('token', token, {
-            httpOnly: true,
-            secure: process.env.NODE_ENV === 'production',
-            maxAge: 2 * 60 * 60 * 1000
-        });
+        // access token อายุสั้น + refresh token สำหรับต่ออายุโดยไม่ต้องกรอกรหัสผ่านใหม่
+        setTokenCookies(res, response.data);
 
         // --- START: เพิ่มโค้ดส่วนนี้ ---
         const jsonResponse = { 
@@ -66,29 +72,66 @@ const login = async (req, res) => {
     }
 };
 
-const logout = (req, res) => {
+const logout = async (req, res) => {
+    // ยกเลิก refresh token ที่ Billing API ด้วย (ถ้าไม่สำเร็จก็ยัง logout ได้ตามปกติ)
+    const refreshToken = req.cookies.refresh_token;
+    if (refreshToken) {
+        try {
+            // /api/auth/revoke รับเฉพาะ service ที่ส่ง secret ตรงกับ AUTH_CLIENT_SECRET ของ Billing API
+            await axios.post(`${process.env.BILLING_API_URL}/api/auth/revoke`, { token: refreshToken }, {
+                headers: { 'X-Client-Secret': process.env.AUTH_CLIENT_SECRET || '' }
+            });
+        } catch (error) {
+            console.error('Failed to revoke refresh token:', error.message);
+        }
+    }
     res.clearCookie('token');
+    res.clearCookie('refresh_token');
     res.redirect('/files');
 };
 
-// --- Auth Middleware ---
-const verifySuperadmin = (req, res, next) => {
-    const token = req.cookies.token;
-    if (!token) {
-        return res.redirect('/files');
+// ขอ access token ใหม่ด้วย refresh token (Billing API ตรวจแค่ลายเซ็นและรายการที่ถูกยกเลิก ไม่ตรวจรหัสผ่านซ้ำ)
+const refreshAccessToken = async (req, res) => {
+    const refreshToken = req.cookies.refresh_token;
+    if (!refreshToken) {
+        return null;
     }
+    try {
+        const response = await axios.post(`${process.env.BILLING_API_URL}/api/auth/refresh`, {
+            refresh_token: refreshToken
+        });
+        setTokenCookies(res, response.data);
+        return response.data.token;
+    } catch (error) {
+        return null;
+    }
+};
 
+// --- Auth Middleware ---
+const verifySuperadmin = async (req, res, next) => {
+    let decoded = null;
     try {
-        const decoded = jwt.verify(token, process.env.FLASK_SECRET_KEY);
-        if (decoded.role !== 'super admin') {
-            return res.status(403).redirect('/files');
-        }
-        req.user = decoded;
-        next();
+        decoded = jwt.verify(req.cookies.token, process.env.FLASK_SECRET_KEY);
     } catch (error) {
+        // ไม่มี token หรือหมดอายุ: ลองต่ออายุด้วย refresh token ก่อน
+        const token = await refreshAccessToken(req, res);
+        try {
+            decoded = token ? jwt.verify(token, process.env.FLASK_SECRET_KEY) : null;
+        } catch (verifyError) {
+            decoded = null;
+        }
+    }
+
+    if (!decoded) {
         res.clearCookie('token');
+        res.clearCookie('refresh_token');
         return res.redirect('/files');
     }
+    if (decoded.role !== 'super admin') {
+        return res.status(403).redirect('/files');
+    }
+    req.user = decoded;
+    next();
 };
 
 module.exports = {